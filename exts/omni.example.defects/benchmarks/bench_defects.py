@@ -0,0 +1,310 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Graph setup benchmarks, run with plain Python (numpy and pillow required):
+
+    python benchmarks/bench_defects.py [--quick] [--update-baseline] [--threshold 2.0]
+
+Measures the Defect layer build time and recorded node count against the defect count, the texture
+folder scan / index lookup time against the folder size and the placement planner against the number
+of planned poses. Results are compared with baseline.json and the script exits with 1 when a case is
+slower than `threshold` times its baseline.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import recording_stub
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+DEFECT_COUNTS = [1, 10, 100, 1000]
+FOLDER_SIZES = [10, 1000, 10000, 100000]
+QUICK_DEFECT_COUNTS = [1, 10, 100]
+QUICK_FOLDER_SIZES = [10, 1000]
+# Frames planned with PLANNED_COUNT defects each
+PLANNED_FRAMES = [1000, 100000]
+QUICK_PLANNED_FRAMES = [1000]
+PLANNED_COUNT = 10
+# Procedural texture sets generated at PROCEDURAL_SIZE pixels
+PROCEDURAL_COUNTS = [12, 96]
+QUICK_PROCEDURAL_COUNTS = [12]
+PROCEDURAL_SIZE = 512
+# Modules a window or job loads, which the extension startup no longer imports
+EAGER_MODULES = ("replicator_defect", "headless", "params", "defect_writer")
+# Fresh interpreters the startup is measured in
+STARTUP_RUNS = 5
+# Frames of DEDUP_SIZE pixels hashed and looked up in the near-duplicate index
+DEDUP_FRAMES = [200, 2000]
+QUICK_DEDUP_FRAMES = [200]
+DEDUP_SIZE = 1024
+# Frames of TAR_SIZE pixels written through FrameEncoder into tar shards of TAR_SHARD_SAMPLES frames
+TAR_FRAMES = [100, 1000]
+QUICK_TAR_FRAMES = [100]
+TAR_SIZE = 512
+TAR_SHARD_SAMPLES = 64
+TARGET_PATH = "/World/Target"
+# Cases faster than this are dominated by timer noise and only fail on a node count change
+MIN_COMPARED_TIME = 0.005
+
+def _best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) if repeat < 3 else statistics.median(times)
+
+def bench_graph(modules: dict, counts, repeat: int) -> dict:
+    params = modules["params"]
+    replicator_defect = modules["replicator_defect"]
+    defect_pool = modules["defect_pool"]
+    texture_catalog = modules["texture_catalog"]
+    # Keep the bundled folder's index out of the user cache
+    with tempfile.TemporaryDirectory() as index_dir:
+        texture_catalog.load_catalog(str(params.SCRATCHES_DIR), index_dir=Path(index_dir))
+
+    results = {}
+    # Builds leave the output directory alone, a temporary one keeps a stray write out of the working directory
+    with tempfile.TemporaryDirectory() as output_dir:
+        for count in counts:
+            defect = params.DefectConfig(count=count, texture_resolution=-1)
+            obj = params.ObjectConfig(target_prim=TARGET_PATH)
+            rep_config = params.ReplicatorConfig(output_dir=output_dir)
+            rep_config.writer.metrics = False
+
+            def build():
+                recording_stub.new_stage(TARGET_PATH)
+                defect_pool.clear_pools()
+                replicator_defect.create_defect_layer(defect, obj, rep_config)
+
+            seconds = _best_of(build, repeat)
+            results[f"graph_build/count={count}"] = {"seconds": seconds, "nodes": len(recording_stub.recorder.nodes)}
+    return results
+
+def _make_folder(directory: str, size: int):
+    # Complete D/N/R sets, the scan only looks at names so the files can be empty
+    for i in range(size):
+        suffix = ("_D.png", "_N.png", "_R.png")[i % 3]
+        open(os.path.join(directory, f"defect_{i // 3:06d}{suffix}"), "wb").close()
+
+def bench_textures(modules: dict, sizes, repeat: int) -> dict:
+    texture_catalog = modules["texture_catalog"]
+    results = {}
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix="defects_bench_")
+        try:
+            directory = os.path.join(root, "textures")
+            index_dir = Path(root) / "index"
+            os.makedirs(directory)
+            _make_folder(directory, size)
+            mtime_ns = os.stat(directory).st_mtime_ns
+
+            scan = _best_of(lambda: texture_catalog.scan_directory(directory, mtime_ns), repeat)
+
+            def load_from_index():
+                texture_catalog._catalogs.clear()
+                texture_catalog.load_catalog(directory, index_dir=index_dir)
+            load_from_index()
+            indexed = _best_of(load_from_index, repeat)
+            session = _best_of(lambda: texture_catalog.load_catalog(directory, index_dir=index_dir), repeat)
+            files = len(modules["utils"].get_textures(directory))
+            texture_catalog._catalogs.clear()
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        results[f"texture_scan/files={size}"] = {"seconds": scan, "files": files}
+        results[f"texture_index/files={size}"] = {"seconds": indexed}
+        results[f"texture_session/files={size}"] = {"seconds": session}
+    return results
+
+def bench_placement(modules: dict, frame_counts, repeat: int) -> dict:
+    params = modules["params"]
+    placement = modules["placement"]
+    # 1000 x 1000 plane split into two triangles
+    corners = np.array([[-500, 0, -500], [500, 0, -500], [500, 0, 500], [-500, 0, 500]], dtype=np.float64)
+    surface = placement.TargetSurface(placement.triangulate(corners, [4], [0, 1, 2, 3]))
+    defect = params.DefectConfig()
+    results = {}
+    for frames in frame_counts:
+        plan = None
+        def plan_poses():
+            nonlocal plan
+            plan = placement.plan_placements(surface, frames, PLANNED_COUNT, defect.rot, defect.dim_w, defect.dim_h, seed=0)
+        seconds = _best_of(plan_poses, repeat)
+        results[f"placement/poses={frames * PLANNED_COUNT}"] = {"seconds": seconds, "overlaps": plan.overlaps}
+    return results
+
+def bench_procedural(modules: dict, counts, repeat: int) -> dict:
+    procedural = modules["procedural"]
+    results = {}
+    for count in counts:
+        root = tempfile.mkdtemp(prefix="defects_bench_")
+        try:
+            directory = os.path.join(root, "procedural")
+            # Generation is the cost, every repeat writes into a fresh folder
+            runs = iter(range(repeat))
+            seconds = _best_of(lambda: procedural.generate_textures(os.path.join(directory, str(next(runs))),
+                                                                    procedural.PROCEDURAL_KINDS, count, PROCEDURAL_SIZE, 0), repeat)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        results[f"procedural/sets={count}"] = {"seconds": seconds, "sets_per_second": round(count / seconds, 1)}
+    return results
+
+def bench_dedup(modules: dict, frame_counts, repeat: int) -> dict:
+    dedup = modules["dedup"]
+    rng = np.random.default_rng(0)
+    # Blocky random frames and copies shifted by a few pixels, the near-duplicates
+    frames = [rng.integers(0, 256, (DEDUP_SIZE // 16, DEDUP_SIZE // 16, 4), dtype=np.uint8).repeat(16, 0).repeat(16, 1)
+              for _ in range(8)]
+    frames += [np.roll(frame, 3, axis=1) for frame in frames]
+    results = {}
+    for count in frame_counts:
+        duplicates = 0
+        def check_frames():
+            nonlocal duplicates
+            index = dedup.DuplicateIndex()
+            duplicates = 0
+            for i in range(count):
+                value = dedup.phash(frames[i % len(frames)])
+                if index.find(value) is None:
+                    index.add(i, value)
+                else:
+                    duplicates += 1
+        seconds = _best_of(check_frames, repeat)
+        results[f"dedup/frames={count}"] = {"seconds": seconds, "duplicates": duplicates}
+    return results
+
+def bench_tar_export(modules: dict, frame_counts, repeat: int) -> dict:
+    frame_encoder = modules["frame_encoder"]
+    tar_export = modules["tar_export"]
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (TAR_SIZE // 8, TAR_SIZE // 8, 4), dtype=np.uint8).repeat(8, 0).repeat(8, 1) for _ in range(8)]
+    mask = np.arange(TAR_SIZE * TAR_SIZE, dtype=np.uint32).reshape(TAR_SIZE, TAR_SIZE) % 4
+    boxes = np.array([(1, 10, 10, 50, 50, 0.0)], dtype=[("semanticId", "<u4"), ("x_min", "<i4"), ("y_min", "<i4"),
+                                                        ("x_max", "<i4"), ("y_max", "<i4"), ("occlusionRatio", "<f4")])
+    labels = {"1": {"class": "defect_mesh"}}
+    results = {}
+    for count in frame_counts:
+        shards = 0
+        def export():
+            nonlocal shards
+            with tempfile.TemporaryDirectory() as output_dir:
+                tar = tar_export.TarShardWriter(output_dir, 0, max_samples=TAR_SHARD_SAMPLES)
+                encoder = frame_encoder.FrameEncoder(output_dir, tar=tar)
+                for i in range(count):
+                    encoder.submit(i, rgb=frames[i % len(frames)], semantic_segmentation=mask, segmentation_labels=labels,
+                                   bounding_boxes=boxes, bounding_box_labels=labels)
+                encoder.close()
+                shards = len(tar_export.completed_shards(output_dir))
+        seconds = _best_of(export, repeat)
+        results[f"tar_export/frames={count}"] = {"seconds": seconds, "shards": shards}
+    return results
+
+_STARTUP_SCRIPT = """
+# asyncio is already loaded in Kit
+import asyncio, importlib, sys, time
+sys.path.insert(0, {bench_dir!r})
+import recording_stub
+package = recording_stub.install()
+start = time.perf_counter()
+extension = importlib.import_module(package + ".extension")
+extension.DefectsGenerator().on_startup("omni.example.defects")
+startup = time.perf_counter() - start
+for name in {modules!r}:
+    importlib.import_module(package + "." + name)
+print(startup, time.perf_counter() - start - startup)
+"""
+
+def bench_startup(runs: int) -> dict:
+    """Extension import and on_startup in fresh interpreters, against the modules a window or job imports on top."""
+    script = _STARTUP_SCRIPT.format(bench_dir=str(Path(__file__).resolve().parent), modules=EAGER_MODULES)
+    startup, deferred = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+        values = [float(value) for value in output.split()]
+        startup.append(values[0])
+        deferred.append(values[1])
+    return {"startup/extension": {"seconds": statistics.median(startup)},
+            "startup/deferred_modules": {"seconds": statistics.median(deferred)}}
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    failures = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            print(f"  {name}: no baseline")
+            continue
+        if "nodes" in expected and result.get("nodes") != expected["nodes"]:
+            failures.append(f"{name}: {result.get('nodes')} nodes, baseline {expected['nodes']}")
+        ratio = result["seconds"] / max(expected["seconds"], 1e-9)
+        if ratio > threshold and result["seconds"] > MIN_COMPARED_TIME:
+            failures.append(f"{name}: {result['seconds'] * 1000:.2f} ms is {ratio:.2f}x the baseline {expected['seconds'] * 1000:.2f} ms")
+    return failures
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Skip the largest defect counts and folders")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=2.0, help="Allowed slowdown against the baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    package = recording_stub.install()
+    modules = {name: importlib.import_module(f"{package}.{name}")
+               for name in ("params", "replicator_defect", "defect_pool", "texture_catalog", "utils", "placement", "procedural", "dedup", "frame_encoder", "tar_export")}
+
+    results = {}
+    results.update(bench_graph(modules, QUICK_DEFECT_COUNTS if args.quick else DEFECT_COUNTS, args.repeat))
+    results.update(bench_textures(modules, QUICK_FOLDER_SIZES if args.quick else FOLDER_SIZES, args.repeat))
+    results.update(bench_placement(modules, QUICK_PLANNED_FRAMES if args.quick else PLANNED_FRAMES, args.repeat))
+    results.update(bench_procedural(modules, QUICK_PROCEDURAL_COUNTS if args.quick else PROCEDURAL_COUNTS, args.repeat))
+    results.update(bench_startup(STARTUP_RUNS))
+    results.update(bench_dedup(modules, QUICK_DEDUP_FRAMES if args.quick else DEDUP_FRAMES, args.repeat))
+    results.update(bench_tar_export(modules, QUICK_TAR_FRAMES if args.quick else TAR_FRAMES, args.repeat))
+    for name, result in results.items():
+        extra = "".join(f", {key} {value}" for key, value in result.items() if key != "seconds")
+        print(f"{name}: {result['seconds'] * 1000:.2f} ms{extra}")
+
+    if args.update_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text())
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        return 0
+    failures = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Recording stand-ins for the Kit modules used by the graph builder (carb, omni.usd, omni.replicator.core,
+omni.graph.core, pxr, ...), so the builder can be benchmarked with plain Python. Every Replicator call
+is recorded as a node and prims created by Replicator are tracked on an in-memory stage.
+"""
+
+import contextlib
+import math
+import sys
+import types
+from pathlib import Path
+
+EXT_ROOT = Path(__file__).resolve().parents[1]
+PACKAGE_NAME = "omni.example.defects"
+
+class Recorder:
+    def __init__(self) -> None:
+        self.nodes = []
+
+    def record(self, name: str, *args, **kwargs):
+        self.nodes.append(name)
+        path = args[0] if name == "get.prim_at_path" and args else kwargs.get("path_pattern")
+        return StubItem(name, path)
+
+    def reset(self):
+        self.nodes = []
+
+recorder = Recorder()
+
+# Stage
+
+class StubAttribute:
+    def __init__(self, name: str, value=None) -> None:
+        self._name = name
+        self._value = value
+
+    def GetName(self):
+        return self._name
+
+    def IsValid(self):
+        return True
+
+    def Get(self):
+        return self._value
+
+    def Set(self, value):
+        self._value = value
+        return True
+
+class StubPrim:
+    def __init__(self, stage, path: str) -> None:
+        self._stage = stage
+        self._path = path
+
+    def IsValid(self):
+        return self._path in self._stage.prims
+
+    def IsActive(self):
+        return self._path not in self._stage.inactive
+
+    def GetPath(self):
+        return self._path
+
+    def GetChildren(self):
+        return [StubPrim(self._stage, p) for p in self._stage.children.get(self._path, ())]
+
+    def GetAttributes(self):
+        return list(self._stage.prims.get(self._path, {}).values())
+
+    def GetAttribute(self, name: str):
+        return self._stage.prims.get(self._path, {}).get(name, StubAttribute(name))
+
+    def CreateAttribute(self, name, type_name=None, custom=True):
+        attrs = self._stage.prims.setdefault(self._path, {})
+        return attrs.setdefault(name, StubAttribute(name))
+
+class StubLayer:
+    """Layer holding the paths of the prims defined while it was the edit target."""
+    def __init__(self, name: str, stage=None) -> None:
+        self.identifier = name
+        self._name = name
+        self.stage = stage
+        self.specs = set()
+        self.pseudoRoot = types.SimpleNamespace(nameChildren=_NameChildren(self))
+
+    def GetDisplayName(self):
+        return self._name
+
+    def GetPrimAtPath(self, path: str):
+        return types.SimpleNamespace(path=path) if path in self.specs else None
+
+class _NameChildren:
+    # `del layer.pseudoRoot.nameChildren[name]` removes the root prim spec and the specs below it
+    def __init__(self, layer: StubLayer) -> None:
+        self._layer = layer
+
+    def __delitem__(self, name: str):
+        path = "/" + name
+        self._layer.specs -= {p for p in self._layer.specs if p == path or p.startswith(path + "/")}
+        stage = self._layer.stage
+        if stage is not None and not stage.has_spec(path):
+            stage.remove(path)
+
+class StubNotice:
+    """Usd.Notice.ObjectsChanged with only the resynced paths."""
+    def __init__(self, resynced) -> None:
+        self._resynced = list(resynced)
+
+    def GetResyncedPaths(self):
+        return self._resynced
+
+class StubStage:
+    def __init__(self) -> None:
+        self.prims = {}
+        self.children = {}
+        self.layers = [StubLayer("root.usd", self)]
+        self.edit_layer = self.layers[0]
+        self.inactive = set()
+        self.listeners = []
+
+    def notify(self, *resynced):
+        for listener in list(self.listeners):
+            listener(StubNotice(resynced), self)
+
+    def define(self, path: str, semantics=None):
+        attrs = {}
+        if semantics:
+            for semantic_type, data in semantics:
+                attrs["semantic:Semantics:params:semanticType"] = StubAttribute("semantic:Semantics:params:semanticType", semantic_type)
+                attrs["semantic:Semantics:params:semanticData"] = StubAttribute("semantic:Semantics:params:semanticData", data)
+        if path not in self.prims:
+            self.children.setdefault(path.rsplit("/", 1)[0] or "/", []).append(path)
+        self.prims[path] = attrs
+        self.edit_layer.specs.add(path)
+        self.notify(path)
+        return path
+
+    def unique_child(self, parent: str, name: str) -> str:
+        index = 0
+        while f"{parent}/{name}_{index}" in self.prims:
+            index += 1
+        return f"{parent}/{name}_{index}"
+
+    def GetPrimAtPath(self, path: str):
+        return StubPrim(self, str(path))
+
+    def GetLayerStack(self):
+        return list(self.layers)
+
+    def has_spec(self, path: str) -> bool:
+        return any(path in layer.specs for layer in self.layers)
+
+    @contextlib.contextmanager
+    def edit_context(self, layer: StubLayer):
+        previous, self.edit_layer = self.edit_layer, layer
+        try:
+            yield
+        finally:
+            self.edit_layer = previous
+
+    def remove(self, path: str):
+        for p in [p for p in self.prims if p == path or p.startswith(path + "/")]:
+            del self.prims[p]
+            self.children.pop(p, None)
+            self.inactive.discard(p)
+        siblings = self.children.get(path.rsplit("/", 1)[0] or "/", [])
+        if path in siblings:
+            siblings.remove(path)
+        self.notify(path)
+
+class StubContext:
+    def __init__(self) -> None:
+        self.stage = StubStage()
+
+    def get_stage(self):
+        return self.stage
+
+    def get_selection(self):
+        return types.SimpleNamespace(get_selected_prim_paths=lambda: [])
+
+    def get_stage_event_stream(self):
+        return types.SimpleNamespace(create_subscription_to_pop=lambda *args, **kwargs: object())
+
+context = StubContext()
+
+def new_stage(target_path: str = "/World/Target") -> StubStage:
+    """Fresh in-memory stage holding a single target prim."""
+    context.stage = StubStage()
+    context.stage.define("/World")
+    context.stage.define(target_path)
+    recorder.reset()
+    return context.stage
+
+# Replicator
+
+class StubNode:
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def is_valid(self):
+        return True
+
+    def get_attribute_exists(self, name):
+        return True
+
+    def get_prim_path(self):
+        return f"/Replicator/SDGPipeline/{self._name}"
+
+class StubItem:
+    _scope = []
+
+    def __init__(self, name: str, path: str = None) -> None:
+        self.node = StubNode(name)
+        self.path = path
+
+    def __enter__(self):
+        StubItem._scope.append(self)
+        return self
+
+    def __exit__(self, *args):
+        StubItem._scope.pop()
+
+class _Namespace(types.SimpleNamespace):
+    def __init__(self, prefix: str, **overrides) -> None:
+        super().__init__(**overrides)
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: recorder.record(f"{self._prefix}.{name}", *args, **kwargs)
+
+def _create_cube(*args, parent: str = "/Replicator", semantics=None, **kwargs):
+    context.stage.define(parent)
+    item = recorder.record("create.cube")
+    item.path = context.stage.define(context.stage.unique_child(parent, "Cube"), semantics)
+    return item
+
+def _create_light(*args, **kwargs):
+    context.stage.define("/Replicator")
+    item = recorder.record("create.light")
+    item.path = context.stage.define(context.stage.unique_child("/Replicator", "Light"))
+    return item
+
+def _create_projection_material(proxy, semantics=None, **kwargs):
+    target = StubItem._scope[-1].path if StubItem._scope else "/World"
+    item = recorder.record("create.projection_material")
+    item.path = context.stage.define(context.stage.unique_child(target, "Projection"), semantics)
+    return item
+
+class _Randomizer(_Namespace):
+    def register(self, fn):
+        recorder.nodes.append("randomizer.register")
+        object.__setattr__(self, fn.__name__, fn)
+
+class StubWriter:
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    def initialize(self, **kwargs):
+        recorder.nodes.append("writer.initialize")
+
+    def attach(self, render_products):
+        recorder.nodes.append("writer.attach")
+
+    def detach(self):
+        pass
+
+@contextlib.contextmanager
+def _new_layer(name: str):
+    stage = context.stage
+    layer = StubLayer(name, stage)
+    stage.layers.append(layer)
+    stage.notify("/")
+    with stage.edit_context(layer):
+        stage.define("/Replicator")
+        yield
+
+def _replicator_module():
+    rep = types.ModuleType("omni.replicator.core")
+    rep.create = _Namespace("create", cube=_create_cube, light=_create_light, projection_material=_create_projection_material)
+    rep.get = _Namespace("get")
+    rep.distribution = _Namespace("distribution")
+    rep.modify = _Namespace("modify")
+    rep.trigger = _Namespace("trigger")
+    rep.orchestrator = _Namespace("orchestrator")
+    rep.randomizer = _Randomizer("randomizer")
+    rep.utils = _Namespace("utils")
+    rep.new_layer = _new_layer
+    rep.set_global_seed = lambda seed: None
+    rep.Writer = StubWriter
+    rep.WriterRegistry = types.SimpleNamespace(get=lambda name: StubWriter(), register=lambda cls: None)
+    rep.AnnotatorRegistry = types.SimpleNamespace(get_annotator=lambda *args, **kwargs: None)
+    return rep
+
+# pxr
+
+class _Vec3d(tuple):
+    def __new__(cls, *values):
+        return super().__new__(cls, values)
+
+    def __sub__(self, other):
+        return _Vec3d(*(a - b for a, b in zip(self, other)))
+
+    def GetLength(self):
+        return math.sqrt(sum(v * v for v in self))
+
+class _Imageable:
+    def __init__(self, prim) -> None:
+        self._prim = prim
+
+    def MakeVisible(self):
+        pass
+
+    def MakeInvisible(self):
+        pass
+
+class _BBoxCache:
+    def __init__(self, *args) -> None:
+        pass
+
+    def ComputeWorldBound(self, prim):
+        midpoint = types.SimpleNamespace(GetMidpoint=lambda: _Vec3d(0.0, 0.0, 0.0))
+        return types.SimpleNamespace(ComputeAlignedRange=lambda: midpoint)
+
+def _register_notice(notice_type, callback, stage):
+    # Stub stages only send ObjectsChanged
+    if notice_type == "ObjectsChanged":
+        stage.listeners.append(callback)
+    revoke = lambda: callback in stage.listeners and stage.listeners.remove(callback)
+    return types.SimpleNamespace(Revoke=revoke)
+
+def _pxr_modules():
+    pxr = types.ModuleType("pxr")
+    pxr.__path__ = []
+    pxr.Gf = types.SimpleNamespace(Vec3d=_Vec3d, Vec3f=_Vec3d)
+    pxr.Tf = types.SimpleNamespace(MakeValidIdentifier=lambda s: "".join(c if c.isalnum() else "_" for c in s),
+                                   Notice=types.SimpleNamespace(Register=_register_notice))
+    pxr.Usd = types.SimpleNamespace(Stage=StubStage, Prim=StubPrim, EditContext=lambda stage, layer: stage.edit_context(layer),
+                                    Notice=types.SimpleNamespace(ObjectsChanged="ObjectsChanged", LayerMutingChanged="LayerMutingChanged"),
+                                    TimeCode=types.SimpleNamespace(Default=lambda: 0))
+    pxr.UsdGeom = types.SimpleNamespace(Imageable=_Imageable, BBoxCache=_BBoxCache,
+                                        Tokens=types.SimpleNamespace(default_="default"))
+    pxr.Sdf = types.SimpleNamespace(ValueTypeNames=types.SimpleNamespace(Float3="float3"),
+                                    Path=types.SimpleNamespace(absoluteRootPath="/"), Layer=StubLayer)
+    return pxr
+
+def _execute(command: str, **kwargs):
+    recorder.nodes.append(f"command.{command}")
+    stage = context.stage
+    if command == "DeletePrims":
+        for path in kwargs["paths"]:
+            # Only the specs of the edit target are removed, a prim other layers still define is deactivated
+            stage.edit_layer.specs -= {p for p in stage.edit_layer.specs if p == path or p.startswith(path + "/")}
+            if stage.has_spec(path):
+                stage.inactive.add(path)
+                stage.notify(path)
+            else:
+                stage.remove(path)
+    elif command == "RemoveSublayer":
+        layer = stage.layers.pop(kwargs["sublayer_position"])
+        for path in sorted(p for p in layer.specs if not stage.has_spec(p)):
+            if path in stage.prims:
+                stage.remove(path)
+        stage.notify("/")
+
+def install():
+    """Registers the stand-in modules and the extension package in sys.modules, returns the package name."""
+    noop = lambda *args, **kwargs: None
+    carb = types.ModuleType("carb")
+    carb.log_info = carb.log_warn = carb.log_error = noop
+    carb.settings = types.SimpleNamespace(get_settings=lambda: types.SimpleNamespace(get=noop))
+    carb.tokens = types.SimpleNamespace(get_tokens_interface=lambda: types.SimpleNamespace(resolve=lambda token: token))
+
+    omni = types.ModuleType("omni")
+    omni.__path__ = [str(EXT_ROOT / "omni")]
+    usd = types.ModuleType("omni.usd")
+    usd.get_context = lambda: context
+    usd.StageEventType = types.SimpleNamespace(OPENED=0, CLOSED=1)
+    kit = types.ModuleType("omni.kit")
+    kit.__path__ = []
+    commands = types.ModuleType("omni.kit.commands")
+    commands.execute = _execute
+    app = types.ModuleType("omni.kit.app")
+    stream = types.SimpleNamespace(create_subscription_to_pop=lambda *args, **kwargs: object())
+    ext_manager = types.SimpleNamespace(is_extension_enabled=lambda name: True, set_extension_enabled_immediate=noop)
+    app.get_app = lambda: types.SimpleNamespace(get_pre_update_event_stream=lambda: stream,
+                                                get_post_update_event_stream=lambda: stream,
+                                                get_update_event_stream=lambda: stream,
+                                                get_extension_manager=lambda: ext_manager)
+    # Window menu of the extension startup
+    kit_ui = types.ModuleType("omni.kit.ui")
+    menu = types.SimpleNamespace(add_item=lambda *args, **kwargs: object(), set_value=noop, remove_item=noop)
+    kit_ui.get_editor_menu = lambda: menu
+    ext = types.ModuleType("omni.ext")
+    ext.IExt = type("IExt", (), {})
+    graph = types.ModuleType("omni.graph")
+    graph.__path__ = []
+    graph_core = types.ModuleType("omni.graph.core")
+    graph_core.Controller = types.SimpleNamespace(attribute=lambda name, node: types.SimpleNamespace(set=noop))
+    replicator = types.ModuleType("omni.replicator")
+    replicator.__path__ = []
+
+    pxr = _pxr_modules()
+    modules = {
+        "carb": carb, "carb.settings": carb.settings, "carb.tokens": carb.tokens,
+        "omni": omni, "omni.usd": usd, "omni.kit": kit, "omni.kit.commands": commands, "omni.kit.app": app,
+        "omni.kit.ui": kit_ui, "omni.ext": ext,
+        "omni.graph": graph, "omni.graph.core": graph_core,
+        "omni.replicator": replicator, "omni.replicator.core": _replicator_module(),
+        "pxr": pxr, "pxr.Gf": pxr.Gf, "pxr.Tf": pxr.Tf, "pxr.Usd": pxr.Usd, "pxr.UsdGeom": pxr.UsdGeom, "pxr.Sdf": pxr.Sdf,
+    }
+    sys.modules.update(modules)
+    omni.usd = usd
+    omni.kit = kit
+    kit.commands = commands
+    kit.app = app
+    kit.ui = kit_ui
+    omni.ext = ext
+    omni.graph = graph
+    graph.core = graph_core
+    omni.replicator = replicator
+    replicator.core = modules["omni.replicator.core"]
+
+    # Register the packages without running omni/example/defects/__init__.py, which builds the UI
+    example = types.ModuleType("omni.example")
+    example.__path__ = [str(EXT_ROOT / "omni" / "example")]
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [str(EXT_ROOT / "omni" / "example" / "defects")]
+    sys.modules["omni.example"] = example
+    sys.modules[PACKAGE_NAME] = package
+    return PACKAGE_NAME
@@ -0,0 +1,230 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import struct
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Union
+
+# The .idx file starts with the first frame of the run, followed by one byte offset into the .jsonl
+# file per frame from there on, little-endian uint64s
+OFFSET_FORMAT = "<Q"
+OFFSET_SIZE = struct.calcsize(OFFSET_FORMAT)
+# Offset of frames without a record, dropped or failed
+NO_RECORD = 0xFFFFFFFFFFFFFFFF
+PARTIAL_SUFFIX = ".partial"
+
+def rle_encode(mask: np.ndarray) -> List[int]:
+    """Uncompressed COCO run-length encoding (column-major, starting with a run of zeros)."""
+    pixels = np.asarray(mask, dtype=bool).ravel(order="F")
+    if pixels.size == 0:
+        return []
+    changes = np.flatnonzero(pixels[1:] != pixels[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], changes, [pixels.size])))
+    if pixels[0]:
+        counts = np.concatenate(([0], counts))
+    return counts.tolist()
+
+def _label_ids(id_to_labels: dict, label: str) -> List[int]:
+    ids = []
+    for key, labels in id_to_labels.items():
+        classes = labels.get("class", "") if isinstance(labels, dict) else str(labels)
+        if label in classes.split(","):
+            ids.append(int(key))
+    return ids
+
+class AnnotationSink:
+    """
+    Streams one JSON record per frame, holding the boxes and RLE masks of `label`, into
+    `<name>.jsonl` with a `<name>.idx` index of the record offset of every frame from `first_frame`
+    on, so the record of a frame can be read without parsing the whole file. Both files are written
+    as `.partial` and renamed when finalized.
+    `label` can also be a list of labels, each one is a COCO category.
+    With `coco` a COCO json file is also built from the records when finalizing.
+
+    Records can be encoded and added from several threads in any order, they are written in frame
+    order. Frames without a record are marked with `skip` so the frames after them are not held back.
+    """
+    def __init__(self, output_dir: str, label: Union[str, Sequence[str]], name: str = "annotations", chunk_size: int = 100,
+                 coco: bool = False, first_frame: int = 0) -> None:
+        self.labels = [label] if isinstance(label, str) else list(label)
+        self.chunk_size = max(1, chunk_size)
+        self.coco = coco
+        self.first_frame = first_frame
+        self.records = 0
+        self.jsonl_path = os.path.join(output_dir, name + ".jsonl")
+        self.index_path = os.path.join(output_dir, name + ".idx")
+        self.coco_path = os.path.join(output_dir, name + "_coco.json")
+        self._output_dir = output_dir
+        # Opened with the first record, a run without frames leaves no files behind
+        self._jsonl = None
+        self._index = None
+        self._finalized = False
+        self._lines = []
+        self._offsets = []
+        # Offset of the next line in the .jsonl file, buffered lines included
+        self._end = 0
+        self._next_frame = first_frame
+        # Records that arrived before an earlier frame, None for skipped frames
+        self._pending: Dict[int, Optional[bytes]] = {}
+        self._lock = threading.Lock()
+
+    def encode(self, frame_id: int, width: int, height: int, boxes: np.ndarray = None, box_labels: dict = None,
+               segmentation: np.ndarray = None, segmentation_labels: dict = None) -> bytes:
+        """JSON line of one frame, safe to call from any thread."""
+        record = {"frame": frame_id, "width": width, "height": height, "boxes": [], "masks": []}
+        for label in self.labels:
+            if boxes is not None and box_labels:
+                ids = _label_ids(box_labels, label)
+                has_occlusion = "occlusionRatio" in boxes.dtype.names
+                for box in boxes[np.isin(boxes["semanticId"], ids)]:
+                    record["boxes"].append({
+                        "label": label,
+                        "bbox": [int(box["x_min"]), int(box["y_min"]), int(box["x_max"]), int(box["y_max"])],
+                        "occlusion": float(box["occlusionRatio"]) if has_occlusion else 0.0
+                    })
+            if segmentation is not None and segmentation_labels:
+                mask = np.isin(segmentation, _label_ids(segmentation_labels, label))
+                if mask.any():
+                    rows = np.flatnonzero(mask.any(axis=1))
+                    cols = np.flatnonzero(mask.any(axis=0))
+                    record["masks"].append({
+                        "label": label,
+                        "bbox": [int(cols[0]), int(rows[0]), int(cols[-1]), int(rows[-1])],
+                        "area": int(mask.sum()),
+                        "size": [int(mask.shape[0]), int(mask.shape[1])],
+                        "counts": rle_encode(mask)
+                    })
+        return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def add(self, frame_id: int, line: bytes):
+        """Adds the line returned by `encode` for a frame."""
+        with self._lock:
+            self._pending[frame_id] = line
+            self._drain()
+
+    def skip(self, frame_id: int):
+        """Marks a frame that has no record."""
+        with self._lock:
+            self._pending[frame_id] = None
+            self._drain()
+
+    def add_frame(self, frame_id: int, width: int, height: int, boxes: np.ndarray = None, box_labels: dict = None,
+                  segmentation: np.ndarray = None, segmentation_labels: dict = None):
+        """Encodes and adds the record of a frame on the calling thread."""
+        self.add(frame_id, self.encode(frame_id, width, height, boxes, box_labels, segmentation, segmentation_labels))
+
+    def _drain(self):
+        while self._next_frame in self._pending:
+            self._append(self._pending.pop(self._next_frame))
+            self._next_frame += 1
+
+    def _append(self, line: Optional[bytes]):
+        if line is None:
+            self._offsets.append(NO_RECORD)
+        else:
+            self._offsets.append(self._end)
+            self._lines.append(line)
+            self._end += len(line)
+        if len(self._offsets) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._offsets:
+            return
+        if self._jsonl is None:
+            os.makedirs(self._output_dir, exist_ok=True)
+            self._jsonl = open(self.jsonl_path + PARTIAL_SUFFIX, "wb")
+            self._index = open(self.index_path + PARTIAL_SUFFIX, "wb")
+            self._index.write(struct.pack(OFFSET_FORMAT, self.first_frame))
+        self._jsonl.write(b"".join(self._lines))
+        self._index.write(b"".join(struct.pack(OFFSET_FORMAT, offset) for offset in self._offsets))
+        self.records += len(self._lines)
+        self._lines = []
+        self._offsets = []
+        self._jsonl.flush()
+        self._index.flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def finalize(self):
+        """
+        Writes the remaining records and atomically moves the files to their final names. Records held
+        back behind a frame that never arrived are still written, the missing frames have no record.
+        """
+        with self._lock:
+            if self._finalized:
+                return
+            self._finalized = True
+            for frame_id in sorted(self._pending):
+                while self._next_frame < frame_id:
+                    self._append(None)
+                    self._next_frame += 1
+                self._append(self._pending.pop(frame_id))
+                self._next_frame += 1
+            self._flush()
+            if self._jsonl is None:
+                return
+            self._jsonl.close()
+            self._index.close()
+        os.replace(self.jsonl_path + PARTIAL_SUFFIX, self.jsonl_path)
+        os.replace(self.index_path + PARTIAL_SUFFIX, self.index_path)
+        if self.coco:
+            self._write_coco()
+
+    def _write_coco(self):
+        tmp_path = self.coco_path + PARTIAL_SUFFIX
+        annotation_id = 0
+        category_ids = {label: i + 1 for i, label in enumerate(self.labels)}
+        with open(self.jsonl_path, "r") as records, open(tmp_path, "w") as f:
+            images = []
+            annotations = []
+            for line in records:
+                record = json.loads(line)
+                images.append({"id": record["frame"], "width": record["width"], "height": record["height"], "file_name": f"rgb_{record['frame']:04d}.png"})
+                for box in record["boxes"]:
+                    x_min, y_min, x_max, y_max = box["bbox"]
+                    w, h = x_max - x_min + 1, y_max - y_min + 1
+                    annotations.append({"id": annotation_id, "image_id": record["frame"], "category_id": category_ids[box["label"]],
+                                        "bbox": [x_min, y_min, w, h], "area": w * h, "iscrowd": 0})
+                    annotation_id += 1
+                for mask in record["masks"]:
+                    x_min, y_min, x_max, y_max = mask["bbox"]
+                    annotations.append({"id": annotation_id, "image_id": record["frame"], "category_id": category_ids[mask["label"]],
+                                        "bbox": [x_min, y_min, x_max - x_min + 1, y_max - y_min + 1], "area": mask["area"], "iscrowd": 1,
+                                        "segmentation": {"size": mask["size"], "counts": mask["counts"]}})
+                    annotation_id += 1
+            json.dump({"images": images, "annotations": annotations, "categories": [{"id": i, "name": label} for label, i in category_ids.items()]}, f)
+        os.replace(tmp_path, self.coco_path)
+
+def read_record(jsonl_path: str, frame_id: int, index_path: Optional[str] = None) -> dict:
+    """Reads the record of a frame from a finalized annotation file by seeking through its index."""
+    if index_path is None:
+        index_path = os.path.splitext(jsonl_path)[0] + ".idx"
+    with open(index_path, "rb") as f:
+        first_frame = struct.unpack(OFFSET_FORMAT, f.read(OFFSET_SIZE))[0]
+        data = b""
+        if frame_id >= first_frame:
+            f.seek((1 + frame_id - first_frame) * OFFSET_SIZE)
+            data = f.read(OFFSET_SIZE)
+    if len(data) != OFFSET_SIZE or struct.unpack(OFFSET_FORMAT, data)[0] == NO_RECORD:
+        raise IndexError(f"No record for frame {frame_id} in {jsonl_path}")
+    with open(jsonl_path, "rb") as f:
+        f.seek(struct.unpack(OFFSET_FORMAT, data)[0])
+        return json.loads(f.readline())
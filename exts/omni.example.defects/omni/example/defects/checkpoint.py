@@ -0,0 +1,129 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_VERSION = 1
+# Minimum seconds between two checkpoint writes while frames are being written
+CHECKPOINT_INTERVAL = 5.0
+
+def resume_seed(seed: int, frame: int) -> int:
+    """Seed of a run resumed at `frame`, derived from the seed of the whole run."""
+    digest = hashlib.sha256(f"{seed}:resume:{frame}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "little")
+
+class Checkpoint:
+    """
+    Progress of a run in its output directory. `last_frame` is the last frame such that it and every
+    frame before it, from `first_frame` on, is completely written to disk. `frames` is the frame count the
+    run was started with, planned poses and views depend on it.
+    """
+    def __init__(self, output_dir: str, seed: Optional[int], params_hash: str, first_frame: int, end_frame: int,
+                 last_frame: int = None, complete: bool = False, frames: int = None) -> None:
+        self.output_dir = output_dir
+        self.seed = seed
+        self.params_hash = params_hash
+        self.first_frame = first_frame
+        self.end_frame = end_frame
+        self.last_frame = first_frame - 1 if last_frame is None else last_frame
+        self.complete = complete
+        self.frames = frames
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._last_write = 0.0
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.output_dir, CHECKPOINT_FILE)
+
+    @property
+    def next_frame(self) -> int:
+        """
+        First frame that still has to be written
+
+        :type: int
+        """
+        return max(self.first_frame, self.last_frame + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": CHECKPOINT_VERSION,
+            "seed": self.seed,
+            "params_hash": self.params_hash,
+            "first_frame": self.first_frame,
+            "end_frame": self.end_frame,
+            "last_frame": self.last_frame,
+            "complete": self.complete,
+            "frames": self.frames,
+            "updated": time.time()
+        }
+
+    def mismatch(self, seed: Optional[int], params_hash: str, first_frame: int, frames: int = None) -> Optional[str]:
+        """
+        Why a run with these parameters cannot continue from this checkpoint, None when it can.
+        `frames` is only compared when given, for runs whose frames are planned from their frame count.
+        """
+        if seed != self.seed:
+            return f"seed {seed} differs from the checkpoint seed {self.seed}"
+        if params_hash != self.params_hash:
+            return "the defect, object or replicator parameters changed since the checkpoint"
+        if first_frame != self.first_frame:
+            return f"frame offset {first_frame} differs from the checkpoint frame offset {self.first_frame}"
+        if frames is not None and self.frames is not None and frames != self.frames:
+            return f"the planned run has {frames} frame(s), the checkpoint was planned for {self.frames}"
+        return None
+
+    def write(self):
+        # One write at a time, each from a snapshot taken after the previous one so the file never goes back
+        with self._write_lock:
+            with self._lock:
+                data = self.to_dict()
+                self._last_write = time.monotonic()
+            os.makedirs(self.output_dir, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def advance(self, last_frame: int, interval: float = CHECKPOINT_INTERVAL):
+        """Records that every frame up to `last_frame` is written, the file is rewritten at most every `interval` seconds."""
+        with self._lock:
+            if last_frame <= self.last_frame:
+                return
+            self.last_frame = last_frame
+            now = time.monotonic()
+            due = now - self._last_write >= interval
+            if due:
+                # Claimed under the lock, frames advanced by other threads meanwhile wait for the next interval
+                self._last_write = now
+        if due:
+            self.write()
+
+def read_checkpoint(output_dir: str) -> Optional[Checkpoint]:
+    try:
+        with open(os.path.join(output_dir, CHECKPOINT_FILE), "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CHECKPOINT_VERSION:
+        return None
+    return Checkpoint(output_dir, data["seed"], data["params_hash"], data["first_frame"], data["end_frame"],
+                      data["last_frame"], data.get("complete", False), data.get("frames"))
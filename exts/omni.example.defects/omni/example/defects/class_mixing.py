@@ -0,0 +1,54 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Which defect class each frame of a multi-class run shows, free of Replicator imports like placement.py
+
+import numpy as np
+from typing import List, Optional, Sequence
+
+def check_classes(labels: Sequence[str], weights: Sequence[float]) -> Optional[str]:
+    """Why the classes cannot be mixed, None when they can."""
+    duplicates = sorted({label for label in labels if labels.count(label) > 1})
+    if duplicates:
+        return f"Defect class labels must be unique, {duplicates} are listed more than once"
+    if any(weight < 0 for weight in weights):
+        return f"Defect class weights must not be negative, got {list(weights)}"
+    if sum(weights) <= 0:
+        return "At least one defect class needs a positive weight"
+    return None
+
+def class_frame_counts(weights: Sequence[float], frames: int) -> List[int]:
+    """
+    Frames per class proportional to the weights, summing to `frames`. The frames left over after
+    rounding down go to the classes with the largest remainders, ties to the first class.
+    """
+    shares = np.asarray(weights, dtype=np.float64)
+    shares = shares / shares.sum() * frames
+    counts = np.floor(shares).astype(np.int64)
+    # Stable sort so equal remainders keep the class order
+    order = np.argsort(-(shares - counts), kind="stable")
+    counts[order[:frames - int(counts.sum())]] += 1
+    return counts.tolist()
+
+def class_schedule(weights: Sequence[float], frames: int, seed: Optional[int]) -> np.ndarray:
+    """
+    Class index of every frame of the run: exactly `class_frame_counts` frames per class in an order
+    shuffled with the seed. The schedule only depends on the arguments, so a resumed or regenerated
+    run shows the same class on every frame as the original run.
+    """
+    schedule = np.repeat(np.arange(len(weights)), class_frame_counts(weights, frames))
+    # Unseeded runs still need a repeatable order to be resumed
+    np.random.default_rng(0 if seed is None else seed).shuffle(schedule)
+    return schedule
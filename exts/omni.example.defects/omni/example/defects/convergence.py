@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+from typing import List, Optional
+
+def frame_change(previous: np.ndarray, current: np.ndarray, quantile: float = 0.99) -> float:
+    """
+    Change between two accumulated subframes: the `quantile` of the per-pixel change, where the change of
+    a pixel is its largest RGB channel difference in [0, 1]. A high quantile keeps a small glossy highlight
+    that is still converging from being averaged away by the static rest of the frame.
+    """
+    diff = np.abs(current[..., :3].astype(np.float32) - previous[..., :3].astype(np.float32)).max(axis=-1)
+    scale = 255.0 if np.issubdtype(current.dtype, np.integer) else 1.0
+    return float(np.quantile(diff, quantile)) / scale
+
+class SubframeController:
+    """
+    Decides per frame how many subframes to accumulate. `update` is given the RGB output after every
+    subframe and returns True once the frame is done: when the change since the previous subframe is
+    below `tolerance` after at least `min_subframes`, or when `max_subframes` were rendered.
+    The subframes of every finished frame are kept in `spent`.
+    """
+    def __init__(self, max_subframes: int, tolerance: float = 0.008, min_subframes: int = 1, quantile: float = 0.99) -> None:
+        self.max_subframes = max(1, max_subframes)
+        self.min_subframes = max(1, min(min_subframes, self.max_subframes))
+        self.tolerance = tolerance
+        self.quantile = quantile
+        self.subframes = 0
+        self.last_change: Optional[float] = None
+        self.spent: List[int] = []
+        self._previous: Optional[np.ndarray] = None
+
+    def update(self, rgb: Optional[np.ndarray]) -> bool:
+        self.subframes += 1
+        if rgb is None:
+            # Nothing to compare without an RGB output, the frame gets the configured maximum
+            converged = False
+        else:
+            rgb = np.asarray(rgb)
+            self.last_change = frame_change(self._previous, rgb, self.quantile) if self._previous is not None else None
+            converged = self.last_change is not None and self.last_change < self.tolerance
+            # Annotator buffers are reused between subframes
+            self._previous = rgb[..., :3].copy()
+        if self.subframes >= self.max_subframes or (converged and self.subframes >= self.min_subframes):
+            self.spent.append(self.subframes)
+            self.subframes = 0
+            self._previous = None
+            return True
+        return False
+
+    def summary(self) -> dict:
+        return {
+            "frames": len(self.spent),
+            "mean_subframes": sum(self.spent) / max(1, len(self.spent)),
+            "capped": sum(1 for s in self.spent if s >= self.max_subframes)
+        }
@@ -0,0 +1,213 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Near-duplicate frame detection for DefectWriter, free of Replicator imports like FrameEncoder
+
+import json
+import os
+import queue
+import threading
+import numpy as np
+from collections import deque
+from PIL import Image
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEDUP_MODES = ("", "drop", "flag")
+# Side of the grayscale image the DCT is taken of, and of the low frequency block kept for the hash
+DCT_SIZE = 32
+HASH_SIZE = 8
+# Cells per image side the box centers and sizes are quantized to in the layout signature
+LAYOUT_GRID = 16
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+def phash(rgb: np.ndarray) -> int:
+    """64 bit perceptual hash: the signs of the low frequency DCT coefficients of the downsampled luminance against their median."""
+    if rgb.dtype != np.uint8:
+        rgb = (np.clip(rgb, 0.0, 1.0) * 255).astype(np.uint8)
+    # PIL converts and box filters in C, several times faster than NumPy on a full frame. The alpha
+    # channel is left to the conversion, slicing it off would copy the frame
+    image = Image.fromarray(np.ascontiguousarray(rgb), "RGBA" if rgb.shape[-1] == 4 else "RGB")
+    small = np.asarray(image.convert("L").resize((DCT_SIZE, DCT_SIZE), Image.BOX), dtype=np.float32)
+    low = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term only holds the mean brightness
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def layout_signature(boxes: Optional[np.ndarray], width: int, height: int) -> Tuple:
+    """Sorted semantic ids, centers and sizes of the tight 2D boxes on a LAYOUT_GRID grid, frames only match with the same layout."""
+    if boxes is None or len(boxes) == 0 or width <= 0 or height <= 0:
+        return ()
+    x_min, y_min = boxes["x_min"].astype(np.float64), boxes["y_min"].astype(np.float64)
+    x_max, y_max = boxes["x_max"].astype(np.float64), boxes["y_max"].astype(np.float64)
+    cells = np.stack((boxes["semanticId"].astype(np.int64),
+                      np.floor((x_min + x_max) / 2 / width * LAYOUT_GRID),
+                      np.floor((y_min + y_max) / 2 / height * LAYOUT_GRID),
+                      np.round((x_max - x_min) / width * LAYOUT_GRID),
+                      np.round((y_max - y_min) / height * LAYOUT_GRID)), axis=-1).astype(np.int64)
+    return tuple(sorted(map(tuple, cells.tolist())))
+
+class DuplicateIndex:
+    """
+    Bounded LSH index of (hash, layout) pairs. The hash is split into `max_distance + 1` bands, so two
+    hashes within `max_distance` bits share at least one band and every such match is found. Once
+    `capacity` frames are indexed, the oldest ones are forgotten.
+    """
+    def __init__(self, max_distance: int = 4, capacity: int = 100000, hash_bits: int = HASH_SIZE * HASH_SIZE) -> None:
+        self.max_distance = max_distance
+        self.capacity = max(1, capacity)
+        bands = max_distance + 1
+        edges = np.linspace(0, hash_bits, bands + 1).astype(int)
+        self._masks = [(int(lo), ((1 << int(hi - lo)) - 1) << int(lo)) for lo, hi in zip(edges[:-1], edges[1:])]
+        self._buckets: Dict[tuple, List[int]] = {}
+        self._entries: Dict[int, Tuple[int, Tuple]] = {}
+        self._order = deque()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _keys(self, value: int, layout: Tuple):
+        return [(band, layout, value & mask) for band, (_, mask) in enumerate(self._masks)]
+
+    def find(self, value: int, layout: Tuple = ()) -> Optional[Tuple[int, int]]:
+        """Earliest indexed frame within `max_distance` of the hash with the same layout, as (frame id, distance)."""
+        best = None
+        for key in self._keys(value, layout):
+            for frame_id in self._buckets.get(key, ()):
+                distance = hamming(value, self._entries[frame_id][0])
+                if distance <= self.max_distance and (best is None or frame_id < best[0]):
+                    best = (frame_id, distance)
+        return best
+
+    def add(self, frame_id: int, value: int, layout: Tuple = ()):
+        if len(self._order) >= self.capacity:
+            self._remove(self._order.popleft())
+        self._entries[frame_id] = (value, layout)
+        self._order.append(frame_id)
+        for key in self._keys(value, layout):
+            self._buckets.setdefault(key, []).append(frame_id)
+
+    def _remove(self, frame_id: int):
+        value, layout = self._entries.pop(frame_id)
+        for key in self._keys(value, layout):
+            bucket = self._buckets[key]
+            bucket.remove(frame_id)
+            if not bucket:
+                del self._buckets[key]
+
+class FrameDeduplicator:
+    """
+    Checks frames against the earlier frames of the run on one worker thread, in submission order so
+    the frame kept of a group of near-duplicates does not depend on timing. `on_kept` is called from
+    that thread with the frame id, RGB, boxes and payload of every frame that is not dropped, `on_dropped`
+    with the frame id of every dropped one, and of every frame `on_kept` failed on. With mode "flag" every
+    frame is kept. Duplicates are listed in `duplicates_<first frame>.jsonl`.
+    """
+    def __init__(self, output_dir: str, first_frame: int, on_kept: Callable[[int, Optional[np.ndarray], Optional[np.ndarray], dict], None],
+                 on_dropped: Callable[[int], None] = None,
+                 mode: str = "drop", max_distance: int = 4, capacity: int = 100000, queue_size: int = 16) -> None:
+        self.mode = mode
+        self.index = DuplicateIndex(max_distance, capacity)
+        self.on_kept = on_kept
+        self.on_dropped = on_dropped
+        self.checked = 0
+        self.duplicates = 0
+        self.errors: List[str] = []
+        self.path = os.path.join(output_dir, f"duplicates_{first_frame:04d}.jsonl")
+        self._file = None
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._thread = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, frame_id: int, rgb: np.ndarray, boxes: Optional[np.ndarray], payload: dict):
+        """Queues a frame, the buffers are copied since Replicator reuses them. Blocks when `queue_size` frames are waiting."""
+        rgb = np.array(rgb, copy=True) if rgb is not None else None
+        boxes = np.array(boxes, copy=True) if boxes is not None else None
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, daemon=True)
+            self._thread.start()
+        self._queue.put((frame_id, rgb, boxes, payload))
+
+    def _check(self, frame_id: int, rgb: Optional[np.ndarray], boxes: Optional[np.ndarray]) -> Optional[Tuple[int, int]]:
+        if rgb is None:
+            return None
+        value = phash(rgb)
+        layout = layout_signature(boxes, rgb.shape[1], rgb.shape[0])
+        match = self.index.find(value, layout)
+        if match is None:
+            self.index.add(frame_id, value, layout)
+        return match
+
+    def _record(self, frame_id: int, match: Tuple[int, int]):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps({"frame": frame_id, "duplicate_of": match[0], "distance": match[1],
+                                     "dropped": self.mode == "drop"}) + "\n")
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                frame_id, rgb, boxes, payload = job
+                try:
+                    match = self._check(frame_id, rgb, boxes)
+                except Exception as e:
+                    # A frame that cannot be hashed is kept
+                    self.errors.append(f"Frame {frame_id}: {e}")
+                    match = None
+                self.checked += 1
+                if match is not None:
+                    self.duplicates += 1
+                    self._record(frame_id, match)
+                if match is not None and self.mode == "drop":
+                    if self.on_dropped is not None:
+                        self.on_dropped(frame_id)
+                else:
+                    try:
+                        self.on_kept(frame_id, rgb, boxes, payload)
+                    except Exception as e:
+                        # Handed on like a dropped frame, the frames after it can still be reported as written
+                        self.errors.append(f"Frame {frame_id} was not written: {e}")
+                        if self.on_dropped is not None:
+                            self.on_dropped(frame_id)
+            except Exception as e:
+                self.errors.append(str(e))
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        """Waits for the queued frames to be checked and handed on."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
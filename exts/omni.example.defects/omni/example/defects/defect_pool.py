@@ -0,0 +1,112 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import omni.replicator.core as rep
+import carb
+from pxr import Tf, UsdGeom
+from typing import Dict, List, Tuple
+from .utils import *
+
+POOL_ROOT = "/World/DefectPool"
+# Suffix added to the semantic label of unused entries so the randomizers do not pick them up
+POOLED_SUFFIX = "_pooled"
+
+def _child_paths(path: str) -> List[str]:
+    """Children of the prim in the order they were created."""
+    prim = get_prim(path)
+    if not prim.IsValid():
+        return []
+    return [str(child.GetPath()) for child in prim.GetChildren()]
+
+def _set_class_semantic(path: str, label: str):
+    prim = get_prim(path)
+    for attr in prim.GetAttributes():
+        name = attr.GetName()
+        if not name.startswith("semantic:") or not name.endswith(":params:semanticData"):
+            continue
+        type_attr = prim.GetAttribute(name.replace(":params:semanticData", ":params:semanticType"))
+        if type_attr.IsValid() and type_attr.Get() == "class" and attr.Get() != label:
+            attr.Set(label)
+
+class DefectPool:
+    """
+    Defect cube and projection pairs of one defect class on a target prim. Entries are kept in the
+    Defect layer across rebuilds of the Replicator graph, unused entries are hidden instead of deleted.
+    """
+    def __init__(self, target_path: str, class_index: int = 0) -> None:
+        self.target_path = target_path
+        self.class_index = class_index
+        # The first class keeps the pools of single class layers, the others get their own branch
+        branch = POOL_ROOT if class_index == 0 else f"{POOL_ROOT}/Class{class_index}"
+        self.root = f"{branch}/{Tf.MakeValidIdentifier(target_path)}"
+        # (cube path, projection path)
+        self.entries: List[Tuple[str, str]] = []
+        self.active = 0
+        self.semantic_label = ""
+
+    def _create_entries(self, count: int, semantic_label: str) -> List[Tuple[str, str]]:
+        """
+        Creates `count` entries. The children of the pool root and target are listed once before and once
+        after creating all of them, the new children come in creation order and pair up cube and projection.
+        """
+        cubes = set(_child_paths(self.root))
+        projections = set(_child_paths(self.target_path))
+        for _ in range(count):
+            cube = rep.create.cube(visible=False, semantics=[('class', semantic_label + '_mesh')], position=0, scale=1, rotation=(0, 0, 90), parent=self.root)
+            # Not a path pattern, /World/Part_1 would also match /World/Part_10
+            with rep.get.prim_at_path(self.target_path):
+                rep.create.projection_material(cube, [('class', semantic_label + '_projectmat')])
+        new_cubes = [path for path in _child_paths(self.root) if path not in cubes]
+        new_projections = [path for path in _child_paths(self.target_path) if path not in projections]
+        if len(new_cubes) != count or len(new_projections) != count:
+            carb.log_warn(f"Unexpected prims created for {count} pooled defect(s): {new_cubes} {new_projections}")
+        return list(zip(new_cubes, new_projections))
+
+    def _set_active(self, entry: Tuple[str, str], semantic_label: str, active: bool):
+        cube_path, projection_path = entry
+        suffix = "" if active else POOLED_SUFFIX
+        _set_class_semantic(cube_path, semantic_label + '_mesh' + suffix)
+        _set_class_semantic(projection_path, semantic_label + '_projectmat' + suffix)
+        imageable = UsdGeom.Imageable(get_prim(projection_path))
+        if active:
+            imageable.MakeVisible()
+        else:
+            imageable.MakeInvisible()
+
+    def resize(self, count: int, semantic_label: str):
+        """Creates only the missing entries, then labels the first `count` entries as active and hides the rest."""
+        self.entries = [e for e in self.entries if get_prim(e[0]).IsValid() and get_prim(e[1]).IsValid()]
+        created = max(0, count - len(self.entries))
+        if created:
+            self.entries += self._create_entries(created, semantic_label)
+        for i, entry in enumerate(self.entries):
+            self._set_active(entry, semantic_label, i < count)
+        self.active = count
+        self.semantic_label = semantic_label
+        carb.log_info(f"Defect pool {self.root}: {count} active, {len(self.entries) - count} hidden, {created} created")
+
+_pools: Dict[Tuple[str, int], DefectPool] = {}
+
+def get_pool(target_path: str, class_index: int = 0) -> DefectPool:
+    key = (target_path, class_index)
+    if key not in _pools:
+        _pools[key] = DefectPool(target_path, class_index)
+    return _pools[key]
+
+def get_pools() -> List[DefectPool]:
+    return list(_pools.values())
+
+def clear_pools():
+    _pools.clear()
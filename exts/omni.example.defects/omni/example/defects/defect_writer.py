@@ -0,0 +1,259 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import carb
+import os
+import time
+import numpy as np
+import omni.kit.app
+from omni.replicator.core import AnnotatorRegistry, Writer, WriterRegistry
+from .annotation_sink import AnnotationSink
+from .checkpoint import Checkpoint
+from .convergence import SubframeController
+from .dedup import FrameDeduplicator
+from .frame_encoder import FrameEncoder
+from .instrumentation import FrameMetrics, get_active_metrics, set_active_metrics
+from .profiles import record_profile_fps
+from .tar_export import TarShardWriter
+from typing import List, Union
+
+class DefectWriter(Writer):
+    """
+    Writes RGB, semantic segmentation and tight bounding boxes like BasicWriter, but hands the
+    annotator buffers to a FrameEncoder so encoding happens off the frame loop.
+    Frames are numbered from `frame_offset`.
+
+    With `annotations` set to "jsonl" or "coco", the boxes and masks of `<semantic_label>_mesh`
+    are also streamed into one AnnotationSink file per run. `semantic_label` can be a list of the
+    labels of a multi-class run.
+
+    With `metrics`, per-frame timings are written to `metrics_<first frame>.jsonl`. The time the app
+    spends in its update (graph evaluation, randomization) is measured between the pre- and
+    post-update events and reported as randomize time.
+
+    With `checkpoint` (seed, params_hash, first_frame and end_frame of the run), the last frame
+    whose files are all on disk is recorded in `checkpoint.json` so the run can be resumed.
+
+    The first `skip_frames` frames are rendered but not written, which lets a regenerated frame range
+    replay the randomization from an earlier frame.
+
+    With `adaptive_subframes` (max_subframes, tolerance, min_subframes and quantile), the app is stepped
+    one subframe at a time and a frame is only written once its RGB output converged. The subframes of
+    each frame are added to the metrics.
+
+    With `dedup` set to "drop" or "flag", a perceptual hash of the RGB frame and the layout of its boxes
+    are compared with the earlier frames of the run on a worker thread. Frames within `dedup_distance`
+    bits of an earlier one are listed in `duplicates_<first frame>.jsonl`, and with "drop" not written.
+
+    With `export` set to "tar", every frame is written as one sample of WebDataset-style tar shards
+    (tar_export.py) holding `tar_shard_samples` frames or `tar_shard_mb` MB at most, and the checkpoint
+    only advances when a shard is closed.
+
+    With `profile`, the average fps of the run is folded into the estimate of that generation profile.
+    """
+    def __init__(self, output_dir: str, rgb: bool = True, semantic_segmentation: bool = False, bounding_box_2d_tight: bool = False,
+                 frame_offset: int = 0, png_compression: int = 1, npz_batch_size: int = 0, compress_npz: bool = True,
+                 num_workers: int = 4, queue_size: int = 16, annotations: str = "", semantic_label: Union[str, List[str]] = "defect",
+                 annotation_chunk_size: int = 100, metrics: bool = True, checkpoint: dict = None, skip_frames: int = 0,
+                 profile: str = "", adaptive_subframes: dict = None, dedup: str = "", dedup_distance: int = 4,
+                 dedup_capacity: int = 100000, export: str = "", tar_shard_samples: int = 1000, tar_shard_mb: int = 1024):
+        self.version = "0.1.0"
+        self.annotators = []
+        if rgb:
+            self.annotators.append(AnnotatorRegistry.get_annotator("rgb"))
+        if semantic_segmentation:
+            self.annotators.append(AnnotatorRegistry.get_annotator("semantic_segmentation", init_params={"colorize": False}))
+        if bounding_box_2d_tight:
+            self.annotators.append(AnnotatorRegistry.get_annotator("bounding_box_2d_tight"))
+        self._frame_id = frame_offset
+        self._write_from = frame_offset + skip_frames
+        self._output_dir = output_dir
+        self._sink = None
+        if annotations:
+            labels = [semantic_label] if isinstance(semantic_label, str) else semantic_label
+            # Records are encoded with the frame's files on the encoder threads
+            self._sink = AnnotationSink(output_dir, [label + "_mesh" for label in labels],
+                                        name=f"annotations_{self._write_from:04d}",
+                                        chunk_size=annotation_chunk_size,
+                                        coco=annotations == "coco",
+                                        first_frame=self._write_from)
+        self._metrics_enabled = metrics
+        self._metrics = None
+        self._profile = profile
+        self._subframes = SubframeController(**adaptive_subframes) if adaptive_subframes else None
+        self._update_subs = []
+        self._update_start = None
+        self._update_time = 0.0
+        self._checkpoint = None
+        if checkpoint is not None:
+            self._checkpoint = Checkpoint(output_dir, last_frame=frame_offset - 1, **checkpoint)
+        on_written = self._checkpoint.advance if self._checkpoint is not None else None
+        self._tar = None
+        if export == "tar":
+            # Frames in an open shard are not on disk yet
+            self._tar = TarShardWriter(output_dir, self._write_from, max_samples=tar_shard_samples, max_bytes=tar_shard_mb << 20,
+                                       on_finalized=on_written)
+            on_written = None
+        self._encoder = FrameEncoder(output_dir,
+                                     png_compression=png_compression,
+                                     npz_batch_size=npz_batch_size,
+                                     compress_npz=compress_npz,
+                                     num_workers=num_workers,
+                                     queue_size=queue_size,
+                                     on_written=on_written,
+                                     tar=self._tar,
+                                     sink=self._sink)
+        self._dedup = None
+        if dedup:
+            self._dedup = FrameDeduplicator(output_dir, self._write_from, self._submit_checked, self._encoder.skip,
+                                            mode=dedup, max_distance=dedup_distance, capacity=dedup_capacity,
+                                            queue_size=queue_size)
+
+    @property
+    def frame_id(self) -> int:
+        """
+        Number of the next frame to be written
+
+        :type: int
+        """
+        return self._frame_id
+
+    @property
+    def queue_depth(self) -> int:
+        return self._encoder.queue_depth
+
+    def _submit(self, frame_id: int, rgb, seg: dict, bbox: dict):
+        self._encoder.submit(frame_id,
+                             rgb=rgb,
+                             semantic_segmentation=seg["data"] if seg else None,
+                             segmentation_labels=seg["info"]["idToLabels"] if seg else None,
+                             bounding_boxes=bbox["data"] if bbox else None,
+                             bounding_box_labels=bbox["info"]["idToLabels"] if bbox else None)
+
+    def _submit_checked(self, frame_id: int, rgb, boxes, payload: dict):
+        # Called from the deduplicator thread for the frames it keeps
+        bbox = {"data": boxes, "info": payload["bbox_info"]} if boxes is not None else None
+        self._submit(frame_id, rgb, payload["seg"], bbox)
+
+    def _finalize_annotations(self):
+        if self._sink is not None:
+            self._sink.finalize()
+            carb.log_info(f"DefectWriter: {self._sink.records} annotation record(s) written to {self._sink.jsonl_path}")
+            self._sink = None
+            self._encoder.sink = None
+
+    def _on_pre_update(self, event):
+        self._update_start = time.perf_counter()
+
+    def _on_post_update(self, event):
+        if self._update_start is not None:
+            self._update_time += time.perf_counter() - self._update_start
+            self._update_start = None
+
+    def _start_metrics(self):
+        self._metrics = FrameMetrics(os.path.join(self._output_dir, f"metrics_{self._frame_id:04d}.jsonl"))
+        set_active_metrics(self._metrics)
+        app = omni.kit.app.get_app()
+        self._update_subs = [
+            app.get_pre_update_event_stream().create_subscription_to_pop(self._on_pre_update, name="DefectWriter metrics"),
+            app.get_post_update_event_stream().create_subscription_to_pop(self._on_post_update, name="DefectWriter metrics")
+        ]
+        self._update_time = 0.0
+
+    def _finish_metrics(self):
+        self._update_subs = []
+        if self._metrics is not None:
+            self._metrics.close()
+            if self._dedup is not None:
+                self._metrics.duplicates = self._dedup.duplicates
+            summary = self._metrics.summary()
+            carb.log_info(f"DefectWriter: {summary['frames']} frame(s) at {summary['fps']:.2f} fps, {summary['duplicates']} near-duplicate(s), "
+                          f"randomize {summary['randomize_ms']:.1f} ms, render {summary['render_ms']:.1f} ms, write {summary['write_ms']:.1f} ms")
+            if self._profile:
+                frame_ms = summary["randomize_ms"] + summary["render_ms"] + summary["write_ms"]
+                record_profile_fps(self._profile, summary["frames"], 1000.0 / max(frame_ms, 1e-6))
+            # A writer of a later run may already have replaced them
+            if get_active_metrics() is self._metrics:
+                set_active_metrics(None)
+            self._metrics = None
+
+    def write(self, data: dict):
+        if self._frame_id < self._write_from:
+            self._frame_id += 1
+            self._update_time = 0.0
+            return
+        if self._subframes is not None and not self._subframes.update(data.get("rgb")):
+            return
+        write_start = time.perf_counter()
+        if self._metrics_enabled and self._metrics is None:
+            self._start_metrics()
+        seg = data.get("semantic_segmentation")
+        bbox = data.get("bounding_box_2d_tight")
+        if self._dedup is not None:
+            seg = {"data": np.array(seg["data"], copy=True), "info": seg["info"]} if seg else None
+            self._dedup.submit(self._frame_id, data.get("rgb"), bbox["data"] if bbox else None,
+                               {"seg": seg, "bbox_info": bbox["info"] if bbox else None})
+        else:
+            self._submit(self._frame_id, data.get("rgb"), seg, bbox)
+        if self._metrics is not None:
+            extra = {"subframes": self._subframes.spent[-1]} if self._subframes is not None else None
+            if self._dedup is not None:
+                self._metrics.duplicates = self._dedup.duplicates
+            self._metrics.record(self._frame_id, self._update_time, time.perf_counter() - write_start, self._encoder.queue_depth, extra)
+            self._update_time = 0.0
+        self._frame_id += 1
+
+    def _write_checkpoint(self):
+        # A writer that never wrote a frame must not replace the checkpoint of an earlier run
+        if self._checkpoint is None or self._encoder.frames_submitted == 0:
+            return
+        self._checkpoint.complete = self._checkpoint.next_frame >= self._checkpoint.end_frame
+        self._checkpoint.write()
+
+    def _close_encoder(self):
+        # Kept frames are handed to the encoder by the deduplicator, it is drained first
+        if self._dedup is not None:
+            self._dedup.close()
+        self._encoder.close()
+
+    def detach(self):
+        super().detach()
+        self._close_encoder()
+        self._finalize_annotations()
+        self._finish_metrics()
+        self._write_checkpoint()
+
+    def on_final_frame(self):
+        self._close_encoder()
+        self._finalize_annotations()
+        self._finish_metrics()
+        self._write_checkpoint()
+        if self._subframes is not None and self._subframes.spent:
+            summary = self._subframes.summary()
+            carb.log_info(f"DefectWriter: {summary['mean_subframes']:.1f} subframe(s) per frame on average, "
+                          f"{summary['capped']} of {summary['frames']} frame(s) did not converge")
+        if self._dedup is not None:
+            action = "dropped" if self._dedup.mode == "drop" else "flagged"
+            carb.log_info(f"DefectWriter: {self._dedup.duplicates} of {self._dedup.checked} frame(s) {action} as near-duplicates, "
+                          f"see {self._dedup.path}")
+            for error in self._dedup.errors:
+                carb.log_error(f"DefectWriter: {error}")
+        for error in self._encoder.errors:
+            carb.log_error(f"DefectWriter: {error}")
+        if self._tar is not None:
+            carb.log_info(f"DefectWriter: {self._tar.samples} sample(s) in {self._tar.shards} tar shard(s), see {self._tar.list_path}")
+        carb.log_info(f"DefectWriter: {self._encoder.frames_submitted} frame(s) written to {self._encoder.output_dir}")
+
+WriterRegistry.register(DefectWriter)
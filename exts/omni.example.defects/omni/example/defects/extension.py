@@ -13,8 +13,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import carb.settings
 import omni.ext
-from .window import DefectsWindow
+import omni.kit.app
+import omni.kit.ui
+
+SETTINGS_PATH = "/exts/omni.example.defects"
+# Enabled on first use instead of as dependencies, so Kit apps that never open the window or run a job
+# do not load Replicator at startup
+DEFERRED_EXTENSIONS = ("omni.graph", "omni.replicator.core", "omni.kit.window.file_importer", "omni.kit.notification_manager")
+
+def enable_deferred_extensions():
+    ext_manager = omni.kit.app.get_app().get_extension_manager()
+    for ext_name in DEFERRED_EXTENSIONS:
+        if not ext_manager.is_extension_enabled(ext_name):
+            ext_manager.set_extension_enabled_immediate(ext_name, True)
 
 class DefectsGenerator(omni.ext.IExt):
     WINDOW_NAME = "Defects Sample Extension"
@@ -23,35 +37,50 @@ class DefectsGenerator(omni.ext.IExt):
     def __init__(self) -> None:
         super().__init__()
         self._window = None
+        self._menu = None
 
     def on_startup(self, ext_id):
+        settings = carb.settings.get_settings()
+        job_file = settings.get(f"{SETTINGS_PATH}/job_file")
+        if job_file:
+            # Headless batch job, the window is not needed
+            enable_deferred_extensions()
+            from .headless import run_job_file_async
+            asyncio.ensure_future(run_job_file_async(job_file))
+            return
+
+        # Only the menu entry is registered, the window and Replicator are loaded when it is first shown
+        show = bool(settings.get(f"{SETTINGS_PATH}/show_window_on_startup"))
         self._menu = omni.kit.ui.get_editor_menu().add_item(
-            DefectsGenerator.MENU_PATH, self.show_window, toggle=True, value=True
+            DefectsGenerator.MENU_PATH, self.show_window, toggle=True, value=show
         )
-        self.show_window(None, True)
+        if show:
+            self.show_window(None, True)
     
     def on_shutdown(self):
         if self._menu:
             omni.kit.ui.get_editor_menu().remove_item(DefectsGenerator.MENU_PATH)
-            self._menu
+            self._menu = None
         if self._window:
             self._window.destroy()
             self._window = None
+        from .stage_cache import release_stage_cache
+        release_stage_cache()
 
     def _set_menu(self, value):
         omni.kit.ui.get_editor_menu().set_value(DefectsGenerator.MENU_PATH, value)
 
     def _visibility_changed_fn(self, visible):
         self._set_menu(visible)
-        if not visible:
-            self._window = None
 
     def show_window(self, menu, value):
         self._set_menu(value)
         if value:
-            self._set_menu(True)
-            self._window = DefectsWindow(DefectsGenerator.WINDOW_NAME, width=450, height=700)
-            self._window.set_visibility_changed_fn(self._visibility_changed_fn)
+            if self._window is None:
+                enable_deferred_extensions()
+                from .window import DefectsWindow
+                self._window = DefectsWindow(DefectsGenerator.WINDOW_NAME, width=450, height=700)
+                self._window.set_visibility_changed_fn(self._visibility_changed_fn)
+            self._window.visible = True
         elif self._window:
             self._window.visible = False
-
@@ -0,0 +1,248 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Writer core of DefectWriter, free of Replicator imports so it can be fed synthetic numpy frames
+
+import json
+import os
+import queue
+import threading
+import numpy as np
+from PIL import Image
+from typing import Callable, Dict, List, Optional, Sequence
+from .annotation_sink import AnnotationSink
+from .tar_export import TarShardWriter, encode_sample
+
+class FrameEncoder:
+    """
+    Encodes annotator buffers on a pool of worker threads. `submit` only blocks the caller
+    when `queue_size` frames are already waiting to be encoded.
+
+    With `npz_batch_size` > 0, segmentation and bounding box arrays of that many frames are
+    stored together in one `.npz` file instead of one `.npy`/`.json` pair per frame.
+
+    `on_written` is called from a worker thread with the last frame id such that every frame
+    submitted up to it has all of its files written. Frames are expected to be submitted in order.
+
+    With `tar`, every frame is encoded into one sample of that TarShardWriter instead of separate
+    files, and `npz_batch_size` is ignored.
+
+    With `sink`, the annotation record of every frame is also encoded on the workers and added to
+    that AnnotationSink, the record counts as one of the frame's files.
+    """
+    def __init__(self, output_dir: str, png_compression: int = 1, npz_batch_size: int = 0, compress_npz: bool = True,
+                 num_workers: int = 4, queue_size: int = 16, frame_padding: int = 4,
+                 on_written: Optional[Callable[[int], None]] = None, tar: Optional[TarShardWriter] = None,
+                 sink: Optional[AnnotationSink] = None) -> None:
+        self.output_dir = output_dir
+        self.png_compression = png_compression
+        self.npz_batch_size = npz_batch_size
+        self.compress_npz = compress_npz
+        self.frame_padding = frame_padding
+        self.tar = tar
+        self.sink = sink
+        self.errors: List[str] = []
+        self.frames_submitted = 0
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._batch = {}
+        self._batch_first = None
+        self._batch_frames = []
+        self.on_written = on_written
+        # Files still to be written per submitted frame, and the frames completed after a gap
+        self._remaining: Dict[int, int] = {}
+        self._done = set()
+        self._next_frame = None
+        self.written_through = None
+        self._lock = threading.Lock()
+        # Serializes on_written so a worker never reports an older frame after another worker reported a newer one
+        self._report_lock = threading.Lock()
+        self._reported = None
+        self._num_workers = max(1, num_workers)
+        self._workers = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _path(self, name: str, frame_id: int, ext: str) -> str:
+        return os.path.join(self.output_dir, f"{name}_{frame_id:0{self.frame_padding}d}{ext}")
+
+    def _frames_written(self, frame_ids: Sequence[int]):
+        with self._lock:
+            for frame_id in frame_ids:
+                self._remaining[frame_id] -= 1
+                if self._remaining[frame_id] == 0:
+                    del self._remaining[frame_id]
+                    self._done.add(frame_id)
+            advanced = False
+            while self._next_frame in self._done:
+                self._done.remove(self._next_frame)
+                self.written_through = self._next_frame
+                self._next_frame += 1
+                advanced = True
+            written_through = self.written_through
+        if advanced and self.on_written is not None:
+            with self._report_lock:
+                if self._reported is None or written_through > self._reported:
+                    self._reported = written_through
+                    self.on_written(written_through)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                fn, frame_ids = job
+                fn()
+                # Frames with a failed file are never reported as written
+                self._frames_written(frame_ids)
+            except Exception as e:
+                with self._lock:
+                    self.errors.append(str(e))
+            finally:
+                self._queue.task_done()
+
+    def _put(self, job: Callable, frame_ids: Sequence[int] = ()):
+        # Workers are (re)started lazily so the encoder can be reused after close
+        if not self._workers:
+            self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(self._num_workers)]
+            for worker in self._workers:
+                worker.start()
+        # Blocks when the queue is full, back-pressure for the frame loop
+        self._queue.put((job, frame_ids))
+
+    def _write_png(self, name: str, frame_id: int, image: np.ndarray):
+        Image.fromarray(image).save(self._path(name, frame_id, ".png"), compress_level=self.png_compression)
+
+    def _write_arrays(self, name: str, frame_id: int, array: np.ndarray, labels: Optional[dict]):
+        np.save(self._path(name, frame_id, ".npy"), array)
+        if labels is not None:
+            with open(self._path(f"{name}_labels", frame_id, ".json"), "w") as f:
+                json.dump(labels, f)
+
+    def _write_batch(self, first_frame: int, batch: dict):
+        arrays = {}
+        for key, (array, labels) in batch.items():
+            arrays[key] = array
+            if labels is not None:
+                arrays[key + "_labels"] = np.array(json.dumps(labels))
+        save = np.savez_compressed if self.compress_npz else np.savez
+        save(self._path("annotations_batch", first_frame, ".npz"), **arrays)
+
+    def _add_to_batch(self, name: str, frame_id: int, array: np.ndarray, labels: Optional[dict]):
+        if self._batch_first is None:
+            self._batch_first = frame_id
+        self._batch[f"{name}_{frame_id}"] = (array, labels)
+
+    def flush_batch(self):
+        if not self._batch:
+            return
+        batch, first, frame_ids = self._batch, self._batch_first, self._batch_frames
+        self._batch, self._batch_first, self._batch_frames = {}, None, []
+        self._put(lambda: self._write_batch(first, batch), frame_ids)
+
+    def _write_sample(self, frame_id: int, sample: dict):
+        try:
+            members = encode_sample(frame_id, png_compression=self.png_compression, **sample)
+        except Exception:
+            # The shard writer would otherwise hold back every later frame
+            self.tar.skip(frame_id, failed=True)
+            raise
+        self.tar.add(frame_id, members)
+
+    def _write_record(self, frame_id: int, shape: tuple, boxes: Optional[np.ndarray], box_labels: Optional[dict],
+                      segmentation: Optional[np.ndarray], segmentation_labels: Optional[dict]):
+        height, width = shape
+        try:
+            line = self.sink.encode(frame_id, width, height, boxes, box_labels, segmentation, segmentation_labels)
+        except Exception:
+            # The sink would otherwise hold back every later record
+            self.sink.skip(frame_id)
+            raise
+        self.sink.add(frame_id, line)
+
+    def submit(self, frame_id: int, rgb: np.ndarray = None, semantic_segmentation: np.ndarray = None, segmentation_labels: dict = None,
+               bounding_boxes: np.ndarray = None, bounding_box_labels: dict = None):
+        """Queues one frame. Buffers are copied since Replicator reuses them for the next frame."""
+        arrays = []
+        if semantic_segmentation is not None:
+            arrays.append(("semantic_segmentation", np.array(semantic_segmentation, copy=True), segmentation_labels))
+        if bounding_boxes is not None:
+            arrays.append(("bounding_box_2d_tight", np.array(bounding_boxes, copy=True), bounding_box_labels))
+        batched = self.npz_batch_size > 0 and self.tar is None
+        if self.tar is not None:
+            files = 1
+        else:
+            files = (rgb is not None) + (bool(arrays) if batched else len(arrays))
+        if self.sink is not None:
+            files += 1
+        with self._lock:
+            if self._next_frame is None:
+                self._next_frame = frame_id
+            # One more than the files, released once every job of the frame is queued
+            self._remaining[frame_id] = files + 1
+
+        copies = {name: array for name, array, _ in arrays}
+        if self.sink is not None:
+            shape = np.shape(rgb)[:2] if rgb is not None else (0, 0)
+            self._put(lambda: self._write_record(frame_id, shape, copies.get("bounding_box_2d_tight"), bounding_box_labels,
+                                                 copies.get("semantic_segmentation"), segmentation_labels), (frame_id,))
+        if self.tar is not None:
+            sample = {"rgb": np.array(rgb, copy=True) if rgb is not None else None,
+                      "semantic_segmentation": copies.get("semantic_segmentation"), "segmentation_labels": segmentation_labels,
+                      "bounding_boxes": copies.get("bounding_box_2d_tight"), "bounding_box_labels": bounding_box_labels}
+            self._put(lambda: self._write_sample(frame_id, sample), (frame_id,))
+        elif rgb is not None:
+            rgb = np.array(rgb, copy=True)
+            self._put(lambda: self._write_png("rgb", frame_id, rgb), (frame_id,))
+
+        if batched:
+            for name, array, labels in arrays:
+                self._add_to_batch(name, frame_id, array, labels)
+            if arrays:
+                self._batch_frames.append(frame_id)
+                if frame_id - self._batch_first + 1 >= self.npz_batch_size:
+                    self.flush_batch()
+        elif self.tar is None:
+            for name, array, labels in arrays:
+                self._put(lambda name=name, array=array, labels=labels: self._write_arrays(name, frame_id, array, labels), (frame_id,))
+        self._frames_written((frame_id,))
+        self.frames_submitted += 1
+
+    def skip(self, frame_id: int):
+        """Marks a frame that is not written, the frames after it can still be reported as written."""
+        with self._lock:
+            if self._next_frame is None:
+                self._next_frame = frame_id
+            self._remaining[frame_id] = 1
+        if self.tar is not None:
+            self.tar.skip(frame_id)
+        if self.sink is not None:
+            self.sink.skip(frame_id)
+        self._frames_written((frame_id,))
+
+    def close(self):
+        """Writes the last partial batch and waits for every queued frame to be written."""
+        self.flush_batch()
+        if self._workers:
+            for _ in self._workers:
+                self._queue.put(None)
+            for worker in self._workers:
+                worker.join()
+            self._workers = []
+        if self.tar is not None:
+            self.tar.close()
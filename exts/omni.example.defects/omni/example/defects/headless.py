@@ -0,0 +1,126 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import carb
+import carb.settings
+import carb.tokens
+import dataclasses
+import json
+import os
+import sys
+import omni.kit.app
+import omni.usd
+from .extension import SETTINGS_PATH
+from .params import JobConfig, ShardingConfig, load_job
+from .sharding import SHARDS_DIR, ShardRunner, merge_shards, plan_shards
+from .replicator_defect import (does_defect_layer_exist, is_run_complete, rep_run, resolve_targets, sync_defect_layer,
+                                wait_until_run_complete_async)
+
+
+def run_job(job: JobConfig) -> bool:
+    """Builds the Defect layer from a job on the current stage and starts the orchestrator."""
+    if job.replicator.frames <= 0:
+        carb.log_error(f"Number of frames is {job.replicator.frames}. Input value needs to be greater than 0.")
+        return False
+    if not resolve_targets(job.object):
+        carb.log_error("The job has no valid target prim, set object.target_prim, object.targets or object.target_pattern")
+        return False
+    if not job.replicator.regenerate and is_run_complete(job.defect, job.object, job.replicator):
+        carb.log_info(f"Every frame of the job is already written to {job.replicator.output_dir}")
+        return True
+
+    sync_defect_layer(job.defect, job.object, job.replicator)
+    if not does_defect_layer_exist():
+        return False
+    rep_run()
+    return True
+
+async def run_job_async(job: JobConfig) -> bool:
+    if job.stage:
+        carb.log_info(f"Opening stage: {job.stage}")
+        result, error = await omni.usd.get_context().open_stage_async(job.stage)
+        if not result:
+            carb.log_error(f"Unable to open stage {job.stage}: {error}")
+            return False
+
+    if not run_job(job):
+        return False
+    await wait_until_run_complete_async()
+    carb.log_info(f"Defect job finished: {job.replicator.frames} frame(s) written to {job.replicator.output_dir}")
+    return True
+
+def _worker_command() -> list:
+    kit_dir = carb.tokens.get_tokens_interface().resolve("${kit}")
+    kit_exe = os.path.join(kit_dir, "kit.exe" if sys.platform == "win32" else "kit")
+    ext_manager = omni.kit.app.get_app().get_extension_manager()
+    ext_folder = os.path.dirname(ext_manager.get_extension_path_by_module(__name__))
+    return [kit_exe, "--no-window",
+            "--ext-folder", ext_folder,
+            "--enable", "omni.example.defects",
+            f"--{SETTINGS_PATH}/job_file={{job_file}}",
+            f"--{SETTINGS_PATH}/quit_on_finish=true"]
+
+async def run_sharded_job_async(job: JobConfig) -> bool:
+    """Splits the job into shards, runs each shard in its own Kit process and merges their outputs."""
+    base_seed = job.replicator.seed if job.replicator.seed is not None else 0
+    shards = plan_shards(job.replicator.frames, job.sharding.shards, job.replicator.output_dir, base_seed)
+    jobs_dir = os.path.join(job.replicator.output_dir, SHARDS_DIR)
+    os.makedirs(jobs_dir, exist_ok=True)
+
+    job_files = []
+    for shard in shards:
+        shard_job = dataclasses.replace(job,
+                                        sharding=ShardingConfig(),
+                                        replicator=dataclasses.replace(job.replicator,
+                                                                       frames=shard.frames,
+                                                                       output_dir=shard.output_dir,
+                                                                       seed=shard.seed,
+                                                                       frame_offset=shard.frame_offset))
+        job_file = os.path.join(jobs_dir, f"{shard.name}.json")
+        with open(job_file, "w") as f:
+            json.dump(shard_job.to_dict(), f, indent=2)
+        job_files.append(job_file)
+
+    command = job.sharding.command or _worker_command()
+    carb.log_info(f"Running {len(shards)} shard(s) of {job.replicator.frames} frame(s)")
+    runner = ShardRunner(shards, job_files, command, job.sharding.max_workers)
+    while not runner.poll():
+        await asyncio.sleep(1.0)
+    if runner.failed:
+        carb.log_error(f"Defect shard(s) {runner.failed} failed, see the logs in {jobs_dir}")
+        return False
+
+    # DefectWriter already numbers the frames from the shard's frame offset
+    moved = merge_shards(shards, job.replicator.output_dir, renumber=job.replicator.writer.name == "BasicWriter")
+    carb.log_info(f"Merged {moved} file(s) from {len(shards)} shard(s) into {job.replicator.output_dir}")
+    return True
+
+async def run_job_file_async(path: str):
+    """Entry point used by the extension when `job_file` is set, quits Kit once the job is done if `quit_on_finish` is set."""
+    settings = carb.settings.get_settings()
+    success = False
+    try:
+        job = load_job(path)
+    except (OSError, ValueError) as e:
+        carb.log_error(f"Unable to load defect job {path}: {e}")
+    else:
+        if job.sharding.shards > 1:
+            success = await run_sharded_job_async(job)
+        else:
+            success = await run_job_async(job)
+
+    if settings.get(f"{SETTINGS_PATH}/quit_on_finish"):
+        omni.kit.app.get_app().post_quit(0 if success else 1)
@@ -0,0 +1,121 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+class PhaseTimer:
+    """Accumulates wall time per named phase, in the order the phases were first entered."""
+    def __init__(self) -> None:
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.phases.items())
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"phases": self.phases, "total": self.total}, f, indent=2)
+
+class FrameMetrics:
+    """
+    Per-frame timings appended as JSON lines. `record` is called once per written frame with the
+    time spent updating the app (graph evaluation and randomization) and writing since the
+    previous frame; the rest of the frame interval is attributed to rendering.
+    """
+    def __init__(self, path: str, window: int = 30) -> None:
+        self.path = path
+        self.frames = 0
+        self.totals = {"randomize": 0.0, "render": 0.0, "write": 0.0}
+        self.queue_depth = 0
+        # Near-duplicate frames found so far, set by the writer
+        self.duplicates = 0
+        self._intervals = deque(maxlen=window)
+        self._last_frame = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a")
+
+    @property
+    def fps(self) -> float:
+        if not self._intervals:
+            return 0.0
+        return len(self._intervals) / max(sum(self._intervals), 1e-9)
+
+    def record(self, frame_id: int, randomize_time: float, write_time: float, queue_depth: int, extra: Optional[dict] = None):
+        now = time.perf_counter()
+        frame_time = now - self._last_frame if self._last_frame is not None else randomize_time + write_time
+        self._last_frame = now
+        self._intervals.append(frame_time)
+        render_time = max(0.0, frame_time - randomize_time - write_time)
+
+        self.frames += 1
+        self.totals["randomize"] += randomize_time
+        self.totals["render"] += render_time
+        self.totals["write"] += write_time
+        self.queue_depth = queue_depth
+        record = {
+            "frame": frame_id,
+            "frame_time": frame_time,
+            "randomize_time": randomize_time,
+            "render_time": render_time,
+            "write_time": write_time,
+            "fps": self.fps,
+            "queue_depth": queue_depth
+        }
+        if extra:
+            record.update(extra)
+        self._file.write(json.dumps(record) + "\n")
+
+    def summary(self) -> dict:
+        frames = max(1, self.frames)
+        return {
+            "frames": self.frames,
+            "fps": self.fps,
+            "randomize_ms": self.totals["randomize"] / frames * 1000,
+            "render_ms": self.totals["render"] / frames * 1000,
+            "write_ms": self.totals["write"] / frames * 1000,
+            "queue_depth": self.queue_depth,
+            "duplicates": self.duplicates
+        }
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+# Metrics of the run currently being written, read by the window for its live summary
+_active_metrics: Optional[FrameMetrics] = None
+
+def set_active_metrics(metrics: Optional[FrameMetrics]):
+    global _active_metrics
+    _active_metrics = metrics
+
+def get_active_metrics() -> Optional[FrameMetrics]:
+    return _active_metrics
@@ -0,0 +1,104 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+import json
+import os
+import time
+from typing import List, Optional
+from .params import DefectConfig, ObjectConfig, ReplicatorConfig, config_hash
+
+MANIFEST_FILE = "run_manifest.json"
+MANIFEST_VERSION = 1
+
+class RunManifest:
+    """
+    What produced the frames of a run: the seed, the parameter hashes, the texture catalog and the full
+    parameters. Every build of the run adds a segment with the first frame it rendered and the seed
+    Replicator was set to, a resumed run continues on another seed.
+    """
+    def __init__(self, output_dir: str, seed: Optional[int], params_hash: str, defect_hash: str, object_hash: str,
+                 catalog_hash: str, first_frame: int, end_frame: int, parameters: dict, segments: List[dict] = None) -> None:
+        self.output_dir = output_dir
+        self.seed = seed
+        self.params_hash = params_hash
+        self.defect_hash = defect_hash
+        self.object_hash = object_hash
+        self.catalog_hash = catalog_hash
+        self.first_frame = first_frame
+        self.end_frame = end_frame
+        self.parameters = parameters
+        self.segments = segments or []
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.output_dir, MANIFEST_FILE)
+
+    def segment_at(self, frame: int) -> Optional[dict]:
+        """Last segment starting at or before `frame`, the one that rendered it."""
+        segments = [s for s in self.segments if s["first_frame"] <= frame]
+        return max(segments, key=lambda s: s["first_frame"]) if segments else None
+
+    def add_segment(self, first_frame: int, seed: Optional[int]):
+        # A segment restarted at the same frame replaces the earlier one
+        self.segments = [s for s in self.segments if s["first_frame"] < first_frame]
+        self.segments.append({"first_frame": first_frame, "seed": seed, "started": time.time()})
+
+    def to_dict(self) -> dict:
+        return {
+            "version": MANIFEST_VERSION,
+            "seed": self.seed,
+            "params_hash": self.params_hash,
+            "defect_hash": self.defect_hash,
+            "object_hash": self.object_hash,
+            "catalog_hash": self.catalog_hash,
+            "first_frame": self.first_frame,
+            "end_frame": self.end_frame,
+            "parameters": self.parameters,
+            "segments": self.segments
+        }
+
+    def write(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def create_manifest(output_dir: str, defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig,
+                    catalog_hash: str, frames: int) -> RunManifest:
+    """Manifest of a run of `frames` frames, the writer configuration is part of the stored parameters."""
+    parameters = {"defect": dataclasses.asdict(defect_params),
+                  "object": dataclasses.asdict(object_params),
+                  "replicator": dataclasses.asdict(rep_params)}
+    return RunManifest(output_dir, rep_params.seed,
+                       config_hash(defect_params, object_params, rep_params),
+                       config_hash(defect_params),
+                       config_hash(object_params),
+                       catalog_hash,
+                       rep_params.frame_offset,
+                       rep_params.frame_offset + frames,
+                       parameters)
+
+def read_manifest(output_dir: str) -> Optional[RunManifest]:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != MANIFEST_VERSION:
+        return None
+    return RunManifest(output_dir, data["seed"], data["params_hash"], data["defect_hash"], data["object_hash"],
+                       data["catalog_hash"], data["first_frame"], data["end_frame"], data["parameters"], data["segments"])
@@ -0,0 +1,298 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+import hashlib
+import json
+import typing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+from .procedural import PROCEDURAL_KINDS, procedural_catalog
+from .profiles import apply_profile
+from .texture_catalog import load_catalog
+
+TEXTURE_DIR = Path(__file__).parent / "data"
+SCRATCHES_DIR = TEXTURE_DIR / "scratches"
+PLACEMENTS = ("scatter", "planned")
+CAMERA_MODES = ("fixed", "planned")
+# Fields that do not change the generated frames, a run can be resumed with different values
+UNHASHED_FIELDS = {"frames", "output_dir", "frame_offset", "resume", "regenerate", "profile", "png_compression", "num_workers", "queue_size",
+                   "annotation_chunk_size", "metrics", "tar_shard_samples", "tar_shard_mb"}
+
+# UI-free Parameter Objects, mirroring the widgets in rep_widgets.py
+
+@dataclass
+class Range:
+    min_value: float = 0.0
+    max_value: float = 1.0
+
+@dataclass
+class ProceduralConfig:
+    # Generate the D/N/R textures instead of reading them from texture_dir
+    enabled: bool = False
+    kinds: List[str] = field(default_factory=lambda: list(PROCEDURAL_KINDS))
+    count: int = 32
+    size: int = 512
+    seed: int = 0
+    num_workers: int = 4
+
+def _texture_catalog(texture_dir: str, procedural: ProceduralConfig):
+    if procedural.enabled:
+        p = procedural
+        return procedural_catalog(p.kinds, p.count, p.size, p.seed, p.num_workers)
+    return load_catalog(texture_dir)
+
+@dataclass
+class DefectClassConfig:
+    semantic_label: str = "defect"
+    # Share of the frames showing this class, relative to the weights of the other classes
+    weight: float = 1.0
+    count: int = 1
+    texture_dir: str = SCRATCHES_DIR.as_posix()
+    dim_w: Range = field(default_factory=lambda: Range(0.1, 1.0))
+    dim_h: Range = field(default_factory=lambda: Range(0.1, 1.0))
+    rot: Range = field(default_factory=Range)
+    procedural: ProceduralConfig = field(default_factory=ProceduralConfig)
+
+    @property
+    def texture_catalog(self):
+        """
+        Indexed D/N/R texture sets of the class
+
+        :type: TextureCatalog
+        """
+        return _texture_catalog(self.texture_dir, self.procedural)
+
+@dataclass
+class DefectConfig:
+    semantic_label: str = "defect"
+    count: int = 1
+    texture_dir: str = SCRATCHES_DIR.as_posix()
+    dim_w: Range = field(default_factory=lambda: Range(0.1, 1.0))
+    dim_h: Range = field(default_factory=lambda: Range(0.1, 1.0))
+    rot: Range = field(default_factory=Range)
+    # Resolution the textures are downsampled to, 0 picks it from the render product and dimensions, -1 uses the source textures
+    texture_resolution: int = 0
+    # "scatter" samples the poses on the target every frame, "planned" precomputes non-overlapping poses for the whole run
+    placement: str = "scatter"
+    procedural: ProceduralConfig = field(default_factory=ProceduralConfig)
+    # Defect classes mixed in one graph, every frame shows the defects of one class picked by weight.
+    # Empty makes the label, count, textures, dimensions and rotation above the only class
+    classes: List[DefectClassConfig] = field(default_factory=list)
+
+    @property
+    def texture_catalog(self):
+        """
+        Indexed D/N/R texture sets of the texture folder, or the generated ones with procedural textures
+
+        :type: TextureCatalog
+        """
+        return _texture_catalog(self.texture_dir, self.procedural)
+
+    def defect_classes(self) -> List[DefectClassConfig]:
+        """The defect classes of the graph, the fields of this config as one class when no classes are listed."""
+        if self.classes:
+            return list(self.classes)
+        return [DefectClassConfig(self.semantic_label, 1.0, self.count, self.texture_dir, self.dim_w, self.dim_h, self.rot, self.procedural)]
+
+@dataclass
+class ObjectConfig:
+    target_prim: str = ""
+    # More targets, listed or matched by a regular expression on the prim paths like rep.get.prims(path_pattern=...).
+    # With several targets, each frame shows one of them in turn
+    targets: List[str] = field(default_factory=list)
+    target_pattern: str = ""
+
+@dataclass
+class WriterConfig:
+    # "DefectWriter" or "BasicWriter", the remaining options only apply to DefectWriter
+    name: str = "DefectWriter"
+    png_compression: int = 1
+    # Frames of segmentation/bounding box arrays stored per .npz file, 0 writes one .npy per frame
+    npz_batch_size: int = 0
+    compress_npz: bool = True
+    num_workers: int = 4
+    queue_size: int = 16
+    # Stream the defect boxes/masks into one file per run: "" (off), "jsonl" or "coco" (jsonl plus a COCO json)
+    annotations: str = ""
+    annotation_chunk_size: int = 100
+    # Per-frame timings in metrics_<first frame>.jsonl
+    metrics: bool = True
+    # Near-duplicate frames: "" (off), "drop" (not written) or "flag" (only listed in duplicates_<first frame>.jsonl).
+    # Frames within dedup_distance bits of the perceptual hash of one of the last dedup_capacity frames with the same box layout
+    dedup: str = ""
+    dedup_distance: int = 4
+    dedup_capacity: int = 100000
+    # "tar" writes every frame as one sample (RGB, mask and box JSON) of WebDataset-style tar shards instead of
+    # separate files. A shard is closed after tar_shard_samples frames or before it grows past tar_shard_mb MB
+    export: str = ""
+    tar_shard_samples: int = 1000
+    tar_shard_mb: int = 1024
+
+@dataclass
+class CameraConfig:
+    # "fixed" keeps the camera where it is, "planned" picks a view per frame on the hemisphere around the target
+    mode: str = "fixed"
+    distance: Range = field(default_factory=lambda: Range(1000.0, 2000.0))
+    # Elevation range in degrees above the plane perpendicular to the stage up axis
+    min_elevation: float = 20.0
+    max_elevation: float = 90.0
+    # Frames whose defects cover fewer pixels get a new view, and are dropped after max_attempts views
+    min_visible_pixels: float = 64.0
+    max_attempts: int = 8
+
+@dataclass
+class SubframeConfig:
+    # Render subframes until the RGB output converges instead of rt_subframes for every frame, rt_subframes is the cap.
+    # Requires DefectWriter
+    adaptive: bool = False
+    # Largest per-pixel change between two subframes (quantile of the pixels, RGB in [0, 1]) of a converged frame,
+    # two 8-bit levels by default
+    tolerance: float = 0.008
+    quantile: float = 0.99
+    min_subframes: int = 1
+
+@dataclass
+class ReplicatorConfig:
+    # Generation profile (profiles.py) the resolution, annotators, rt_subframes and PNG compression were taken from.
+    # Its measured fps is recorded at the end of the run
+    profile: str = ""
+    frames: int = 1
+    output_dir: str = "_defects"
+    resolution: List[int] = field(default_factory=lambda: [1024, 1024])
+    rt_subframes: int = 0
+    use_seg: bool = False
+    use_bb: bool = True
+    # Seed of the Replicator randomizers, None leaves Replicator unseeded
+    seed: Optional[int] = None
+    # Index of the first frame of this run within the whole dataset, set by the shard coordinator
+    frame_offset: int = 0
+    # Continue from the checkpoint in output_dir instead of starting again from the first frame
+    resume: bool = False
+    # [first, last] frame numbers of the run in output_dir to render again into output_dir/regenerated_<first>_<last>,
+    # empty renders the whole run
+    regenerate: List[int] = field(default_factory=list)
+    writer: WriterConfig = field(default_factory=WriterConfig)
+    subframes: SubframeConfig = field(default_factory=SubframeConfig)
+    camera: CameraConfig = field(default_factory=CameraConfig)
+
+@dataclass
+class ShardingConfig:
+    shards: int = 1
+    # Maximum number of worker processes running at once, 0 runs every shard at once
+    max_workers: int = 0
+    # Worker command line, `{job_file}` is replaced by the shard job. Empty uses the running Kit executable
+    command: List[str] = field(default_factory=list)
+
+@dataclass
+class JobConfig:
+    # Stage to open before building the Defect layer, empty uses the current stage
+    stage: str = ""
+    defect: DefectConfig = field(default_factory=DefectConfig)
+    object: ObjectConfig = field(default_factory=ObjectConfig)
+    replicator: ReplicatorConfig = field(default_factory=ReplicatorConfig)
+    sharding: ShardingConfig = field(default_factory=ShardingConfig)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "JobConfig":
+        replicator = data.get("replicator", {})
+        if isinstance(replicator, dict) and replicator.get("profile"):
+            data = {**data, "replicator": apply_profile(replicator["profile"], replicator)}
+        return _from_dict(cls, data)
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+def changed_fields(old, new) -> List[str]:
+    """Names of the fields that differ between two parameter objects of the same type."""
+    return [f.name for f in dataclasses.fields(new) if getattr(old, f.name) != getattr(new, f.name)]
+
+def config_hash(*configs) -> str:
+    """Hash of the parameters that shape the generated frames, stored in run checkpoints."""
+    def strip(value):
+        if isinstance(value, dict):
+            return {k: strip(v) for k, v in value.items() if k not in UNHASHED_FIELDS}
+        # Defect classes are tables in a list
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+    data = [strip(dataclasses.asdict(config)) for config in configs]
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _convert(label: str, hint, value):
+    """`value` of the field or list item `label` as the type `hint`, raises ValueError naming it when it does not fit."""
+    # typing.get_origin/get_args are not available on the Python 3.7 of Kit 104
+    origin = getattr(hint, "__origin__", None)
+    if dataclasses.is_dataclass(hint):
+        return _from_dict(hint, value)
+    if origin is typing.Union and type(None) in hint.__args__:
+        if value is None:
+            return None
+        return _convert(label, next(arg for arg in hint.__args__ if arg is not type(None)), value)
+    if origin is list:
+        item = hint.__args__[0]
+        if not isinstance(value, (list, tuple)):
+            if dataclasses.is_dataclass(item):
+                raise ValueError(f"Expected a list of {item.__name__} tables for {label}, got: {value!r}")
+            raise ValueError(f"Expected a list for {label}, got: {value!r}")
+        return [_convert(f"{label}[{i}]", item, v) for i, v in enumerate(value)]
+    if hint is bool:
+        # bool("false") is True, only real booleans are accepted
+        if not isinstance(value, bool):
+            raise ValueError(f"Expected true or false for {label}, got: {value!r}")
+    elif hint in (int, float):
+        # int(2.7) would truncate, and true is an int
+        if isinstance(value, bool) or hint is int and isinstance(value, float) and not value.is_integer():
+            kind = "a whole number" if hint is int else "a number"
+            raise ValueError(f"Expected {kind} for {label}, got: {value!r}")
+        try:
+            value = hint(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Expected a number for {label}, got: {value!r}") from None
+    elif hint is str:
+        if not isinstance(value, str):
+            raise ValueError(f"Expected a string for {label}, got: {value!r}")
+    return value
+
+def _from_dict(cls, data):
+    if cls is Range and isinstance(data, (list, tuple)):
+        if len(data) != 2:
+            raise ValueError(f"Expected [min, max] for Range, got: {data!r}")
+        data = {"min_value": data[0], "max_value": data[1]}
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a table for {cls.__name__}, got: {data!r}")
+
+    hints = typing.get_type_hints(cls)
+    names = {f.name for f in dataclasses.fields(cls)}
+    unknown = set(data) - names
+    if unknown:
+        raise ValueError(f"Unknown {cls.__name__} field(s): {sorted(unknown)}")
+    return cls(**{name: _convert(f"{cls.__name__}.{name}", hints[name], value) for name, value in data.items()})
+
+def load_job(path: str) -> JobConfig:
+    """Reads a job file, TOML when the file ends with `.toml` and JSON otherwise."""
+    if str(path).endswith(".toml"):
+        try:
+            import tomllib
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        except ImportError:
+            import toml
+            data = toml.load(path)
+    else:
+        with open(path, "r") as f:
+            data = json.load(f)
+    return JobConfig.from_dict(data)
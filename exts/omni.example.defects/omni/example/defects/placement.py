@@ -0,0 +1,225 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import carb
+import itertools
+import numpy as np
+from pxr import Usd, UsdGeom
+from typing import List, Optional, Tuple
+from .utils import get_prim
+
+# Poses sampled and checked for overlaps at once, bounds the memory of a batch
+BATCH_POSES = 1 << 16
+# Overlapping defects are moved to a new position up to this many times
+MAX_ITERATIONS = 16
+# Upper bound of grid cells per axis, keeps the cell keys within int64
+MAX_CELLS = 1 << 12
+
+def triangulate(points: np.ndarray, face_vertex_counts: np.ndarray, face_vertex_indices: np.ndarray) -> np.ndarray:
+    """Fan triangulation of a polygon mesh, returns (T, 3, 3) triangle vertices."""
+    counts = np.asarray(face_vertex_counts, dtype=np.int64)
+    indices = np.asarray(face_vertex_indices, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    triangles_per_face = np.maximum(counts - 2, 0)
+    face = np.repeat(np.arange(len(counts)), triangles_per_face)
+    corner = np.arange(len(face)) - np.repeat(np.cumsum(triangles_per_face) - triangles_per_face, triangles_per_face)
+    first = starts[face]
+    corners = np.stack((indices[first], indices[first + corner + 1], indices[first + corner + 2]), axis=1)
+    return np.asarray(points, dtype=np.float64)[corners]
+
+class TargetSurface:
+    """Triangles of the target in world space, sampled uniformly by area."""
+    def __init__(self, triangles: np.ndarray) -> None:
+        v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        cross = np.cross(v1 - v0, v2 - v0)
+        double_areas = np.linalg.norm(cross, axis=1)
+        keep = double_areas > 0
+        self.origins = v0[keep]
+        self.edges = np.stack((v1[keep] - v0[keep], v2[keep] - v0[keep]), axis=1)
+        self.normals = cross[keep] / double_areas[keep, None]
+        self._cdf = np.cumsum(double_areas[keep] * 0.5)
+
+    def __len__(self) -> int:
+        return len(self._cdf)
+
+    @property
+    def area(self) -> float:
+        """
+        Total surface area
+
+        :type: float
+        """
+        return float(self._cdf[-1]) if len(self._cdf) else 0.0
+
+    def sample(self, n: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns `n` positions and their face normals, uniformly distributed over the surface."""
+        triangle = np.minimum(np.searchsorted(self._cdf, rng.random(n) * self._cdf[-1], side="right"), len(self._cdf) - 1)
+        u, v = rng.random((2, n))
+        # Reflect the samples of the far half of the parallelogram back into the triangle
+        flip = u + v > 1
+        u[flip] = 1 - u[flip]
+        v[flip] = 1 - v[flip]
+        edges = self.edges[triangle]
+        positions = self.origins[triangle] + u[:, None] * edges[:, 0] + v[:, None] * edges[:, 1]
+        return positions, self.normals[triangle]
+
+def load_target_surface(target_path: str) -> Optional[TargetSurface]:
+    """World space triangles of every mesh at or below the target prim, None when there is no mesh."""
+    prim = get_prim(target_path)
+    if not prim.IsValid():
+        return None
+    xform_cache = UsdGeom.XformCache(Usd.TimeCode.Default())
+    triangles = []
+    for mesh_prim in Usd.PrimRange(prim):
+        if not mesh_prim.IsA(UsdGeom.Mesh):
+            continue
+        mesh = UsdGeom.Mesh(mesh_prim)
+        points = mesh.GetPointsAttr().Get()
+        counts = mesh.GetFaceVertexCountsAttr().Get()
+        indices = mesh.GetFaceVertexIndicesAttr().Get()
+        if not points or not counts or not indices:
+            continue
+        # USD matrices transform row vectors
+        matrix = np.array(xform_cache.GetLocalToWorldTransform(mesh_prim), dtype=np.float64)
+        world_points = np.asarray(points, dtype=np.float64) @ matrix[:3, :3] + matrix[3, :3]
+        mesh_triangles = triangulate(world_points, counts, indices)
+        if mesh.GetOrientationAttr().Get() == UsdGeom.Tokens.leftHanded:
+            # Keep the normals pointing outwards
+            mesh_triangles = mesh_triangles[:, ::-1]
+        triangles.append(mesh_triangles)
+    if not triangles:
+        return None
+    surface = TargetSurface(np.concatenate(triangles))
+    return surface if len(surface) else None
+
+def find_overlaps(positions: np.ndarray, radii: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    Indices of the entries whose bounding sphere overlaps an earlier entry of the same group.
+    Entries are bucketed in a uniform grid with cells as large as the biggest sphere, so only
+    the 27 neighbouring cells of each entry are compared.
+    """
+    n = len(positions)
+    if n < 2:
+        return np.empty(0, dtype=np.int64)
+    lower = positions.min(axis=0)
+    cell_size = max(2.0 * float(radii.max()), float((positions.max(axis=0) - lower).max()) / MAX_CELLS, 1e-9)
+    # Pad by one cell on both sides so neighbour keys never wrap into another row or group
+    cells = np.floor((positions - lower) / cell_size).astype(np.int64) + 1
+    dims = cells.max(axis=0) + 2
+    keys = ((groups.astype(np.int64) * dims[0] + cells[:, 0]) * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    cell_keys, cell_starts, cell_inverse, cell_counts = np.unique(keys[order], return_index=True, return_inverse=True, return_counts=True)
+    cell_of = np.empty(n, dtype=np.int64)
+    cell_of[order] = cell_inverse
+
+    overlapping = np.zeros(n, dtype=bool)
+    for dx, dy, dz in itertools.product((-1, 0, 1), repeat=3):
+        # Look up the neighbouring cell once per occupied cell, the keys are sorted so this stays cheap
+        neighbours = cell_keys + (dx * dims[1] + dy) * dims[2] + dz
+        found = np.minimum(np.searchsorted(cell_keys, neighbours), len(cell_keys) - 1)
+        occupied = cell_keys[found] == neighbours
+        lo = np.where(occupied, cell_starts[found], 0)[cell_of]
+        counts = np.where(occupied, cell_counts[found], 0)[cell_of]
+        if not counts.any():
+            continue
+        i = np.repeat(np.arange(n), counts)
+        j = order[np.repeat(lo, counts) + np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts, counts)]
+        earlier = j < i
+        i, j = i[earlier], j[earlier]
+        distances = np.einsum("ij,ij->i", positions[i] - positions[j], positions[i] - positions[j])
+        overlapping[i[distances < (radii[i] + radii[j]) ** 2]] = True
+    return np.flatnonzero(overlapping)
+
+class PlacementPlan:
+    """
+    Defect poses of a whole run, `count` consecutive poses per frame. Rotations and scales use the
+    same axes as the uniform distributions of the scatter placement.
+    """
+    def __init__(self, frames: int, count: int, positions: np.ndarray, normals: np.ndarray,
+                 rotations: np.ndarray, scales: np.ndarray, overlaps: int) -> None:
+        self.frames = frames
+        self.count = count
+        self.positions = positions
+        self.normals = normals
+        self.rotations = rotations
+        self.scales = scales
+        self.overlaps = overlaps
+
+    def __len__(self) -> int:
+        return self.frames
+
+    def frame_slice(self, start: int, stop: int = None) -> "PlacementPlan":
+        """Poses of frames [start, stop)."""
+        stop = self.frames if stop is None else min(stop, self.frames)
+        start = min(max(0, start), stop)
+        poses = slice(start * self.count, stop * self.count)
+        return PlacementPlan(stop - start, self.count, self.positions[poses], self.normals[poses],
+                             self.rotations[poses], self.scales[poses], self.overlaps)
+
+    def select(self, frames: np.ndarray) -> "PlacementPlan":
+        """Poses of the given frames, in that order."""
+        frames = np.asarray(frames, dtype=np.int64)
+        poses = (frames[:, None] * self.count + np.arange(self.count)).ravel()
+        return PlacementPlan(len(frames), self.count, self.positions[poses], self.normals[poses],
+                             self.rotations[poses], self.scales[poses], self.overlaps)
+
+    def sequences(self) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+        """Positions, rotations and scales as lists of tuples for `rep.distribution.sequence`."""
+        return ([tuple(p) for p in self.positions.tolist()],
+                [tuple(r) for r in self.rotations.tolist()],
+                [tuple(s) for s in self.scales.tolist()])
+
+def plan_placements(surface: TargetSurface, frames: int, count: int, rot, dim_w, dim_h, seed: Optional[int] = None,
+                    proxy_size: float = 100.0, max_iterations: int = MAX_ITERATIONS) -> PlacementPlan:
+    """
+    Samples `count` defects per frame for `frames` frames over the target surface. Defects of the same
+    frame whose footprints overlap are moved until they are apart or `max_iterations` is reached.
+    The plan only depends on the arguments, so the same seed always gives the same poses.
+    """
+    rng = np.random.default_rng(seed)
+    total = frames * count
+    positions = np.empty((total, 3), dtype=np.float32)
+    normals = np.empty((total, 3), dtype=np.float32)
+    rotations = np.zeros((total, 3), dtype=np.float32)
+    scales = np.ones((total, 3), dtype=np.float32)
+    rotations[:, 2] = 90
+    overlaps = 0
+
+    batch_frames = max(1, BATCH_POSES // count)
+    for first_frame in range(0, frames, batch_frames):
+        batch = slice(first_frame * count, min(frames, first_frame + batch_frames) * count)
+        n = batch.stop - batch.start
+        batch_positions, batch_normals = surface.sample(n, rng)
+        rotations[batch, 0] = rng.uniform(rot.min_value, rot.max_value, n)
+        scales[batch, 1] = rng.uniform(dim_h.min_value, dim_h.max_value, n)
+        scales[batch, 2] = rng.uniform(dim_w.min_value, dim_w.max_value, n)
+
+        # The projection footprint is the proxy cube's face scaled by length and width
+        radii = 0.5 * proxy_size * np.hypot(scales[batch, 1], scales[batch, 2]).astype(np.float64)
+        groups = np.arange(n) // count
+        moved = find_overlaps(batch_positions, radii, groups)
+        for _ in range(max_iterations):
+            if not len(moved):
+                break
+            batch_positions[moved], batch_normals[moved] = surface.sample(len(moved), rng)
+            moved = find_overlaps(batch_positions, radii, groups)
+        overlaps += len(moved)
+        positions[batch] = batch_positions
+        normals[batch] = batch_normals
+
+    if overlaps:
+        carb.log_warn(f"{overlaps} of {total} planned defect(s) still overlap after {max_iterations} attempts, "
+                      "reduce the defect count or dimensions for a denser placement")
+    return PlacementPlan(frames, count, positions, normals, rotations, scales, overlaps)
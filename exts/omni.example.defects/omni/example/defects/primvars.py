@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pxr import Gf, Sdf, Usd, UsdGeom
+from typing import Iterable, List
+from .utils import find_prims, get_current_stage
+
+# Primvars read by the projection material
+PRIMVARS = ("primvars:d1_forward_vector", "primvars:d1_right_vector", "primvars:d1_up_vector",
+            "primvars:d1_position", "primvars:v3_scale")
+
+def collect_prims(paths: Iterable[str] = (), path_pattern: str = "", subtrees: Iterable[str] = (), stage: Usd.Stage = None) -> List[str]:
+    """
+    Paths of the prims to apply the primvars to: the given paths, the prims matching `path_pattern`
+    and every geometry prim at or below the `subtrees` roots. Invalid paths are skipped.
+    """
+    stage = stage or get_current_stage()
+    found = list(paths)
+    if path_pattern:
+        found += find_prims(path_pattern, stage=stage)
+    for subtree in subtrees:
+        root = stage.GetPrimAtPath(subtree)
+        if root.IsValid():
+            found += [str(prim.GetPath()) for prim in Usd.PrimRange(root) if prim.IsA(UsdGeom.Gprim)]
+    return [path for path in dict.fromkeys(found) if stage.GetPrimAtPath(path).IsValid()]
+
+def apply_primvars(paths: Iterable[str], stage: Usd.Stage = None) -> int:
+    """
+    Authors the projection primvars on every prim in the stage's edit target. The specs are written
+    with the Sdf API inside one Sdf.ChangeBlock, so the stage recomposes and notifies once.
+    Returns the number of prims.
+    """
+    stage = stage or get_current_stage()
+    edit_target = stage.GetEditTarget()
+    layer = edit_target.GetLayer()
+    value = Gf.Vec3f(0, 0, 0)
+    count = 0
+    with Sdf.ChangeBlock():
+        for path in paths:
+            prim_spec = Sdf.CreatePrimInLayer(layer, edit_target.MapToSpecPath(Sdf.Path(path)))
+            for name in PRIMVARS:
+                attr_spec = prim_spec.attributes.get(name)
+                if attr_spec is None:
+                    attr_spec = Sdf.AttributeSpec(prim_spec, name, Sdf.ValueTypeNames.Float3, declaresCustom=True)
+                attr_spec.default = value
+            count += 1
+    return count
@@ -0,0 +1,165 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import carb
+import json
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from typing import Optional, Sequence, Tuple
+from .texture_catalog import CACHE_DIR, TextureCatalog, load_catalog
+
+PROCEDURAL_DIR = CACHE_DIR / "procedural"
+PROCEDURAL_KINDS = ("scratch", "dent", "pit")
+MARKER_NAME = "procedural.json"
+PNG_COMPRESSION = 6
+# Roughness of the undamaged surface, matching the bundled scratch textures
+BASE_ROUGHNESS = 176
+# Normal map tilt per unit of height slope, for a 512 pixel texture
+NORMAL_STRENGTH = 4.0
+
+def _value_noise(size: int, rng: np.random.Generator, cells: int) -> np.ndarray:
+    """Smooth noise in [-1, 1]: random values on a `cells` grid, bilinearly interpolated to `size` pixels."""
+    grid = rng.uniform(-1.0, 1.0, (cells + 1, cells + 1))
+    coords = np.linspace(0.0, cells, size, endpoint=False)
+    i = coords.astype(np.int64)
+    f = coords - i
+    # Smoothstep hides the grid lines
+    f = f * f * (3.0 - 2.0 * f)
+    rows = grid[i] * (1.0 - f)[:, None] + grid[i + 1] * f[:, None]
+    return rows[:, i] * (1.0 - f)[None, :] + rows[:, i + 1] * f[None, :]
+
+def _bezier(control: np.ndarray, t: np.ndarray) -> np.ndarray:
+    u = 1.0 - t
+    return ((u ** 3)[:, None] * control[0] + (3 * u * u * t)[:, None] * control[1]
+            + (3 * u * t * t)[:, None] * control[2] + (t ** 3)[:, None] * control[3])
+
+def _stamp(depth: np.ndarray, centers: np.ndarray, radii: np.ndarray, depths: np.ndarray, power: float = 1.0):
+    """Carves parabolic cavities of the given radii and depths into the depth map, keeping the deepest value per pixel."""
+    size = depth.shape[0]
+    reach = int(np.ceil(radii.max()))
+    offsets = np.arange(-reach, reach + 1)
+    dy, dx = np.meshgrid(offsets, offsets, indexing="ij")
+    dy, dx = dy.ravel(), dx.ravel()
+    pixels = np.floor(centers).astype(np.int64)
+    ys = pixels[:, 0, None] + dy
+    xs = pixels[:, 1, None] + dx
+    distance = np.hypot(ys + 0.5 - centers[:, 0, None], xs + 0.5 - centers[:, 1, None]) / radii[:, None]
+    values = depths[:, None] * np.maximum(0.0, 1.0 - distance ** 2) ** power
+    inside = (ys >= 0) & (ys < size) & (xs >= 0) & (xs < size) & (values > 0)
+    np.maximum.at(depth, (ys[inside], xs[inside]), values[inside])
+
+def _scratch_depth(size: int, rng: np.random.Generator) -> np.ndarray:
+    depth = np.zeros((size, size))
+    for _ in range(rng.integers(1, 4)):
+        control = rng.uniform(0.1, 0.9, (4, 2)) * size
+        length = np.linalg.norm(np.diff(control, axis=0), axis=1).sum()
+        t = np.linspace(0.0, 1.0, max(2, int(length * 2)))
+        # Width and depth vary smoothly along the stroke
+        profile = np.interp(t, np.linspace(0.0, 1.0, 6), rng.uniform(0.4, 1.0, 6))
+        width = rng.uniform(0.004, 0.012) * size * (0.5 + 0.5 * profile)
+        _stamp(depth, _bezier(control, t), np.maximum(width, 1.0), rng.uniform(0.5, 1.0) * profile)
+    return depth
+
+def _dent_depth(size: int, rng: np.random.Generator) -> np.ndarray:
+    y, x = (np.mgrid[0:size, 0:size] + 0.5) / size - rng.uniform(0.35, 0.65, (2, 1, 1))
+    angle = rng.uniform(0.0, np.pi)
+    u = x * np.cos(angle) + y * np.sin(angle)
+    v = -x * np.sin(angle) + y * np.cos(angle)
+    sigma = rng.uniform(0.08, 0.22, 2)
+    depth = np.exp(-0.5 * ((u / sigma[0]) ** 2 + (v / sigma[1]) ** 2))
+    return depth * (1.0 + 0.15 * _value_noise(size, rng, 8))
+
+def _pit_depth(size: int, rng: np.random.Generator) -> np.ndarray:
+    depth = np.zeros((size, size))
+    count = rng.integers(5, 40)
+    spread = rng.uniform(0.05, 0.25) * size
+    centers = np.clip(rng.normal(0.5 * size, spread, (count, 2)), 0, size - 1)
+    radii = np.maximum(rng.uniform(0.004, 0.02, count) * size, 1.0)
+    _stamp(depth, centers, radii, rng.uniform(0.4, 1.0, count), power=1.5)
+    return depth
+
+_DEPTH_FUNCTIONS = {"scratch": _scratch_depth, "dent": _dent_depth, "pit": _pit_depth}
+
+def height_to_normal(height: np.ndarray, strength: float) -> np.ndarray:
+    """Tangent space normals of a height map, (H, W, 3) unit vectors with +Y up in the image."""
+    dy, dx = np.gradient(height)
+    normals = np.stack((-dx * strength, dy * strength, np.ones_like(height)), axis=-1)
+    return normals / np.linalg.norm(normals, axis=-1, keepdims=True)
+
+def generate_maps(kind: str, size: int, seed: int, index: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Diffuse, normal and roughness RGBA maps of one procedural defect. The defect covers the alpha of
+    the diffuse and normal maps like the bundled textures. The maps only depend on the arguments.
+    """
+    rng = np.random.default_rng((seed, PROCEDURAL_KINDS.index(kind), index))
+    depth = _DEPTH_FUNCTIONS[kind](size, rng)
+    depth /= max(float(depth.max()), 1e-6)
+    mask = np.clip(depth * 4.0, 0.0, 1.0)
+    # Fine grain inside the damage
+    height = -depth + 0.03 * _value_noise(size, rng, max(4, size // 8)) * mask
+    alpha = np.round(mask * 255).astype(np.uint8)
+
+    diffuse = np.full((size, size, 4), 255, dtype=np.uint8)
+    diffuse[..., 3] = alpha
+    normal = np.empty((size, size, 4), dtype=np.uint8)
+    normal[..., :3] = np.round((height_to_normal(height, NORMAL_STRENGTH * size / 512) + 1.0) * 127.5)
+    normal[..., 3] = alpha
+    roughness = np.full((size, size, 4), 255, dtype=np.uint8)
+    damaged = rng.uniform(40, 140)
+    roughness[..., :3] = np.round(BASE_ROUGHNESS + (damaged - BASE_ROUGHNESS) * mask)[..., None]
+    return diffuse, normal, roughness
+
+def _write_set(directory: str, kind: str, size: int, seed: int, index: int):
+    stem = f"{kind}_{index:04d}"
+    for suffix, pixels in zip(("_D.png", "_N.png", "_R.png"), generate_maps(kind, size, seed, index)):
+        path = os.path.join(directory, stem + suffix)
+        tmp_path = path + ".tmp"
+        Image.fromarray(pixels, "RGBA").save(tmp_path, format="PNG", compress_level=PNG_COMPRESSION)
+        os.replace(tmp_path, path)
+
+def generate_textures(directory: str, kinds: Sequence[str], count: int, size: int, seed: int, num_workers: int = 4):
+    """Writes `count` D/N/R texture sets to `directory`, cycling through the kinds, on a pool of worker threads."""
+    os.makedirs(directory, exist_ok=True)
+    jobs = [(kinds[i % len(kinds)], i) for i in range(count)]
+    # NumPy and the PNG encoder release the GIL for the heavy parts
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        list(executor.map(lambda job: _write_set(directory, job[0], size, seed, job[1]), jobs))
+
+def procedural_catalog(kinds: Sequence[str], count: int, size: int, seed: int, num_workers: int = 4,
+                       cache_dir: Path = PROCEDURAL_DIR) -> Optional[TextureCatalog]:
+    """Catalog of procedural textures, generated into the cache on first use and read back afterwards."""
+    unknown = [kind for kind in kinds if kind not in PROCEDURAL_KINDS]
+    if unknown or not kinds:
+        carb.log_error(f"Unknown procedural defect kind(s) {unknown}, expected some of {PROCEDURAL_KINDS}")
+        return None
+    settings = {"kinds": list(kinds), "count": count, "size": size, "seed": seed}
+    directory = Path(cache_dir) / f"{'-'.join(kinds)}_{count}_{size}_{seed}"
+    marker = directory / MARKER_NAME
+    try:
+        complete = json.loads(marker.read_text()) == settings
+    except (OSError, ValueError):
+        complete = False
+    if not complete:
+        try:
+            generate_textures(str(directory), kinds, count, size, seed, num_workers)
+            marker.write_text(json.dumps(settings))
+        except OSError as e:
+            carb.log_error(f"Unable to write procedural textures to {directory}: {e}")
+            return None
+        carb.log_info(f"Generated {count} procedural texture set(s) in {directory}")
+    return load_catalog(directory.as_posix())
@@ -0,0 +1,115 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import carb
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+from .texture_catalog import CACHE_DIR
+
+PROFILE_STATS_FILE = CACHE_DIR / "profile_fps.json"
+# Runs shorter than this are dominated by warm-up and are not counted in the estimate
+MIN_MEASURED_FRAMES = 10
+# Frames of earlier runs weighed against a new run, so the estimate follows hardware and scene changes
+MAX_WEIGHTED_FRAMES = 1000
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    name: str
+    description: str
+    resolution: List[int]
+    use_seg: bool
+    use_bb: bool
+    rt_subframes: int
+    png_compression: int
+
+    def replicator_values(self) -> dict:
+        """ReplicatorConfig values set by the profile, in the layout of the `[replicator]` table of a job."""
+        return {
+            "resolution": list(self.resolution),
+            "use_seg": self.use_seg,
+            "use_bb": self.use_bb,
+            "rt_subframes": self.rt_subframes,
+            "writer": {"png_compression": self.png_compression}
+        }
+
+PROFILES: Dict[str, GenerationProfile] = {p.name: p for p in (
+    GenerationProfile("detection", "512x512 bounding boxes only, for detector training",
+                      [512, 512], use_seg=False, use_bb=True, rt_subframes=0, png_compression=1),
+    GenerationProfile("default", "1024x1024 bounding boxes, the window defaults",
+                      [1024, 1024], use_seg=False, use_bb=True, rt_subframes=0, png_compression=1),
+    GenerationProfile("segmentation", "1024x1024 segmentation and bounding boxes",
+                      [1024, 1024], use_seg=True, use_bb=True, rt_subframes=1, png_compression=1),
+    GenerationProfile("high_quality", "2048x2048 segmentation and bounding boxes with 8 subframes, smaller PNGs",
+                      [2048, 2048], use_seg=True, use_bb=True, rt_subframes=8, png_compression=6),
+)}
+
+def get_profile(name: str) -> GenerationProfile:
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown generation profile {name!r}, expected one of {sorted(PROFILES)}")
+    return profile
+
+def apply_profile(name: str, replicator: dict) -> dict:
+    """
+    `[replicator]` job table with the values of the profile, values set in the table take precedence. A table
+    that changes a value of the profile is no longer measured as that profile.
+    """
+    values = get_profile(name).replicator_values()
+    profile_writer = values.pop("writer")
+    writer = {**profile_writer, **replicator.get("writer", {})}
+    result = {**values, **replicator, "writer": writer}
+    changed = [key for key in values if result[key] != values[key]]
+    changed += [f"writer.{key}" for key in profile_writer if writer[key] != profile_writer[key]]
+    if changed:
+        carb.log_warn(f"Job overrides {changed} of generation profile {name!r}, its fps is not recorded for the profile")
+        result["profile"] = ""
+    return result
+
+def _read_stats(path: Path) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def record_profile_fps(name: str, frames: int, fps: float, path: Path = PROFILE_STATS_FILE):
+    """Folds the average fps of a finished run into the estimate of its profile, weighted by frames."""
+    if name not in PROFILES or frames < MIN_MEASURED_FRAMES or fps <= 0:
+        return
+    stats = _read_stats(path)
+    entry = stats.get(name, {"fps": 0.0, "frames": 0})
+    weight = min(entry["frames"], MAX_WEIGHTED_FRAMES)
+    stats[name] = {"fps": (entry["fps"] * weight + fps * frames) / (weight + frames),
+                   "frames": entry["frames"] + frames}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(stats, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        carb.log_warn(f"Unable to write profile statistics {path}: {e}")
+
+def estimate_fps(name: str, path: Path = PROFILE_STATS_FILE) -> Optional[float]:
+    """Frames per second measured for the profile on this machine, None before a run of it was measured."""
+    entry = _read_stats(path).get(name)
+    return entry["fps"] if entry else None
+
+def profile_label(name: str, path: Path = PROFILE_STATS_FILE) -> str:
+    fps = estimate_fps(name, path)
+    return f"{name} (~{fps:.1f} fps)" if fps is not None else f"{name} (not measured)"
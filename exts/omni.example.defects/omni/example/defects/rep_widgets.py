@@ -16,13 +16,11 @@
 import omni.ui as ui
 from .widgets import MinMaxWidget, CustomDirectory, PathWidget
 from .utils import *
-from pxr import Sdf
-from pathlib import Path
+from .params import DefectConfig, ObjectConfig, ProceduralConfig, Range, SCRATCHES_DIR
+from .primvars import apply_primvars, collect_prims
+from .replicator_defect import resolve_targets
 import omni.kit.notification_manager as nm
 
-TEXTURE_DIR = Path(__file__).parent / "data"
-SCRATCHES_DIR = TEXTURE_DIR / "scratches" 
-
 # Parameter Objects
 
 class DefectParameters:
@@ -33,7 +31,11 @@ class DefectParameters:
         self.defect_text = CustomDirectory("Defect Texture Folder",
                                            default_dir=str(SCRATCHES_DIR.as_posix()), 
                                            tooltip="A folder location containing a single or set of textures (.png)",
-                                           file_types=[("*.png", "PNG"), ("*", "All Files")])
+                                           file_types=[("*.png", "PNG"), ("*", "All Files")],
+                                           validate_textures=True)
+        self.procedural = ui.SimpleBoolModel(False)
+        self.procedural_count = ui.SimpleIntModel(32, min=1)
+        self._build_procedural()
             
         self.dim_w = MinMaxWidget("Defect Dimensions Width",
                                   min_value=0.1,
@@ -44,14 +46,50 @@ class DefectParameters:
 
         self.rot = MinMaxWidget("Defect Rotation", 
                                 tooltip="Defining the Minimum and Maximum Rotation of the Defect")
+        self.planned_placement = ui.SimpleBoolModel(False)
+        self._build_placement()
     
+    @property
+    def texture_catalog(self):
+        """
+        Indexed D/N/R texture sets of the Defect Texture Folder, or the generated ones with procedural textures
+
+        :type: TextureCatalog
+        """
+        return self.to_config().texture_catalog
+
+    def to_config(self) -> DefectConfig:
+        return DefectConfig(semantic_label=self.semantic_label.as_string,
+                            count=self.count.as_int,
+                            texture_dir=self.defect_text.directory,
+                            dim_w=Range(self.dim_w.min_value, self.dim_w.max_value),
+                            dim_h=Range(self.dim_h.min_value, self.dim_h.max_value),
+                            rot=Range(self.rot.min_value, self.rot.max_value),
+                            placement="planned" if self.planned_placement.as_bool else "scatter",
+                            procedural=ProceduralConfig(enabled=self.procedural.as_bool, count=self.procedural_count.as_int))
+
     def _build_semantic_label(self):
         with ui.HStack(height=0, tooltip="The label that will be associated with the defect"):
             ui.Label("Defect Semantic")
             ui.StringField(model=self.semantic_label)
     
+    def _build_procedural(self):
+        with ui.HStack(height=0, tooltip="Generate scratch, dent and pit textures instead of reading the Defect Texture Folder"):
+            ui.Label("Procedural Textures")
+            ui.CheckBox(model=self.procedural, width=0)
+            ui.Spacer(width=10)
+            ui.IntField(model=self.procedural_count, tooltip="Number of generated texture sets")
+
+    def _build_placement(self):
+        with ui.HStack(height=0, tooltip="Precompute non-overlapping defect poses on the target mesh for every frame of the run"):
+            ui.Label("Plan Defect Placement")
+            ui.CheckBox(model=self.planned_placement)
+
     def destroy(self):
         self.semantic_label = None
+        self.planned_placement = None
+        self.procedural = None
+        self.procedural_count = None
         self.defect_text.destroy()
         self.defect_text = None
         self.dim_w.destroy()
@@ -64,37 +102,55 @@ class DefectParameters:
 class ObjectParameters():
     def __init__(self) -> None:
         self.target_prim = PathWidget("Target Prim")
+        self.target_pattern = ui.SimpleStringModel()
+        self._build_target_pattern()
 
-        def apply_primvars(prim):
-            # Apply prim vars
-            prim.CreateAttribute('primvars:d1_forward_vector', Sdf.ValueTypeNames.Float3, custom=True).Set((0,0,0))
-            prim.CreateAttribute('primvars:d1_right_vector', Sdf.ValueTypeNames.Float3, custom=True).Set((0,0,0))
-            prim.CreateAttribute('primvars:d1_up_vector', Sdf.ValueTypeNames.Float3, custom=True).Set((0,0,0))
-            prim.CreateAttribute('primvars:d1_position', Sdf.ValueTypeNames.Float3, custom=True).Set((0,0,0))
-            prim.CreateAttribute('primvars:v3_scale', Sdf.ValueTypeNames.Float3, custom=True).Set((0,0,0))
-            nm.post_notification(f"Applied Primvars to: {prim.GetPath()}", hide_after_timeout=True, duration=5, status=nm.NotificationStatus.INFO)
+        def notify(paths):
+            if not paths:
+                nm.post_notification("No valid prim to apply the primvars to", hide_after_timeout=True, duration=5, status=nm.NotificationStatus.WARNING)
+                return
+            count = apply_primvars(paths)
+            nm.post_notification(f"Applied Primvars to {count} prim(s): {paths[0]}{' ...' if count > 1 else ''}",
+                                 hide_after_timeout=True, duration=5, status=nm.NotificationStatus.INFO)
 
         def apply():
+            config = self.to_config()
             # Check Paths
-            if not check_path(self.target_prim.path_value):
+            if not config.target_pattern and not check_path(config.target_prim):
                 return 
             
-            # Check if prim is valid
-            prim = is_valid_prim(self.target_prim.path_value)
-            if prim is None:
-                return
-    
-            apply_primvars(prim)
+            # Every valid target gets the primvars
+            notify(resolve_targets(config))
+
+        def apply_selection():
+            selection = omni.usd.get_context().get_selection().get_selected_prim_paths()
+            # Selected assemblies apply to every mesh below them
+            notify(collect_prims(subtrees=selection))
         
-        ui.Button("Apply",  
-            style={"padding": 5}, 
-            clicked_fn=lambda: apply(), 
-            tooltip="Apply Primvars and Material to selected Prim."
-        )
+        with ui.HStack(height=0):
+            ui.Button("Apply",  
+                style={"padding": 5}, 
+                clicked_fn=lambda: apply(), 
+                tooltip="Apply Primvars and Material to the target prims."
+            )
+            ui.Button("Apply to Selection",
+                style={"padding": 5},
+                clicked_fn=lambda: apply_selection(),
+                tooltip="Apply Primvars to every geometry prim at or below the selected prims."
+            )
+
+    def _build_target_pattern(self):
+        with ui.HStack(height=0, tooltip="Regular expression on prim paths, e.g. /World/Parts/Part_.*. Every matching prim becomes a target and each frame shows one target in turn"):
+            ui.Label("Target Pattern")
+            ui.StringField(model=self.target_pattern)
+
+    def to_config(self) -> ObjectConfig:
+        return ObjectConfig(target_prim=self.target_prim.path_value, target_pattern=self.target_pattern.get_value_as_string())
 
     def destroy(self):
         self.target_prim.destroy()
         self.target_prim = None
+        self.target_pattern = None
 
 class MaterialParameters():
     def __init__(self) -> None:
@@ -14,111 +14,782 @@
 # limitations under the License.
 
 import omni.replicator.core as rep
+import omni.graph.core as og
+import asyncio
 import carb
-from .rep_widgets import DefectParameters, ObjectParameters
+import copy
+import dataclasses
+import math
+import os
+from pxr import Gf, Usd, UsdGeom
+from typing import List
+from .checkpoint import read_checkpoint, resume_seed
+from .class_mixing import check_classes, class_frame_counts, class_schedule
+from .dedup import DEDUP_MODES
+from .defect_pool import POOL_ROOT, clear_pools, get_pool, get_pools
+# Imported for its WriterRegistry registration, rep.WriterRegistry.get("DefectWriter") needs it
+from .defect_writer import DefectWriter  # noqa: F401
+from .instrumentation import PhaseTimer
+from .manifest import create_manifest, read_manifest
+from .params import CAMERA_MODES, PLACEMENTS, DefectClassConfig, DefectConfig, ObjectConfig, ReplicatorConfig, changed_fields, config_hash
+from .placement import PlacementPlan, load_target_surface, plan_placements
+from .stage_cache import DEFECT_LAYER_NAME, get_stage_cache
+from .tar_export import EXPORT_MODES
+from .texture_cache import choose_resolution, get_texture_cache
+from .texture_catalog import combined_hash
+from .view_planning import plan_views
 from .utils import *
 
 
 camera_path = "/World/Camera"
+camera_position = (1000, 1000, 1000)
+# Horizontal field of view of a Replicator camera with its default 24mm focal length and 20.955mm aperture
+camera_hfov = 2 * math.atan(20.955 / (2 * 24.0))
+# Edge length of the proxy cube before the defect dimensions are applied
+defect_proxy_size = 100.0
+
+# Changing any of these requires the Defect layer to be rebuilt, every other parameter is updated in place
+STRUCTURAL_DEFECT_FIELDS = {"semantic_label", "texture_dir", "texture_resolution", "placement", "procedural", "classes"}
+STRUCTURAL_REPLICATOR_FIELDS = {"seed", "resolution", "camera", "resume", "regenerate", "subframes"}
+# Planned poses are sampled from these, changing them requires a new plan
+PLANNED_DEFECT_FIELDS = {"count", "rot", "dim_w", "dim_h"}
+PLANNED_REPLICATOR_FIELDS = {"frames"}
+# The checkpoint of the writer records where the run ends
+WRITER_FIELDS = {"frames", "output_dir", "use_seg", "use_bb", "frame_offset", "writer", "profile"}
+BUILD_TIMINGS_FILE = "build_timings.json"
+REGENERATED_DIR = "regenerated_{first:04d}_{last:04d}"
+# Extra frames planned for planned camera views, replacing the frames without a view that shows the defects
+VIEW_SPARE_FRAMES = 0.25
+TRIGGER_INPUTS = {"frames": "inputs:numFrames", "rt_subframes": "inputs:rtSubframes"}
+# Custom event that randomizes the next frame of a run with adaptive subframes
+RANDOMIZE_EVENT = "omni.example.defects.randomize"
+
+class DefectGraph:
+    """Parameters the Defect layer was built with and handles to the nodes that can be updated in place."""
+    def __init__(self, defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig, catalog_mtimes: List[int],
+                 texture_resolution: int) -> None:
+        self.defect_params = copy.deepcopy(defect_params)
+        self.object_params = copy.deepcopy(object_params)
+        self.rep_params = copy.deepcopy(rep_params)
+        # Modification times of the texture catalogs, one per defect class
+        self.catalog_mtimes = catalog_mtimes
+        # Content hash of the texture catalogs recorded in the run manifest
+        self.catalog_hash = ""
+        self.texture_resolution = texture_resolution
+        self.nodes = {}
+        self.render_product = None
+        self.writer = None
+        # The writer was handed to a run, its annotations and checkpoint are finished after it
+        self.writer_used = False
+        self.build_timer = None
+        self.targets: List[str] = []
+        self.plan = None
+        self.views = None
+        # Frames of the run already written when the layer was built to resume it
+        self.start_frame = 0
+        # Frames the trigger fires for
+        self.run_frames = 0
+        # Defect class shown on every frame of a multi-class run, from start_frame on
+        self.schedule = None
+
+    @property
+    def adaptive(self) -> bool:
+        return self.rep_params.subframes.adaptive
+
+_defect_graph = None
+_adaptive_run = None
 
 def rep_preview():
+    if _defect_graph is not None and _defect_graph.adaptive:
+        rep.utils.send_og_event(event_name=RANDOMIZE_EVENT)
     rep.orchestrator.preview()
 
+async def run_adaptive_async(graph: DefectGraph):
+    """
+    Frame loop of a run with adaptive subframes: randomizes a frame, then steps the orchestrator one
+    subframe at a time until DefectWriter accepted the frame as converged and wrote it.
+    """
+    writer = graph.writer
+    for _ in range(graph.run_frames):
+        frame_id = writer.frame_id
+        rep.utils.send_og_event(event_name=RANDOMIZE_EVENT)
+        while writer.frame_id == frame_id:
+            await rep.orchestrator.step_async(rt_subframes=1)
+    writer.on_final_frame()
+
+def write_build_timings(graph: DefectGraph):
+    """Records the build phases of the graph in the output directory of its run."""
+    if graph.build_timer is None or not graph.rep_params.writer.metrics:
+        return
+    path = os.path.join(graph.rep_params.output_dir, BUILD_TIMINGS_FILE)
+    try:
+        graph.build_timer.write(path)
+    except OSError as e:
+        carb.log_warn(f"Unable to write the build timings to {path}: {e}")
+
 def rep_run():
-    rep.orchestrator.run()
+    global _adaptive_run
+    if _defect_graph is not None:
+        _defect_graph.writer_used = True
+        # Previews and graph builds leave the output directory alone
+        write_run_manifest(_defect_graph)
+        write_build_timings(_defect_graph)
+    if _defect_graph is not None and _defect_graph.adaptive:
+        if _adaptive_run is not None and not _adaptive_run.done():
+            carb.log_warn("A run with adaptive subframes is already in progress")
+            return
+        _adaptive_run = asyncio.ensure_future(run_adaptive_async(_defect_graph))
+    else:
+        rep.orchestrator.run()
+
+async def wait_until_run_complete_async():
+    if _adaptive_run is not None:
+        await _adaptive_run
+    else:
+        await rep.orchestrator.wait_until_complete_async()
 
 def does_defect_layer_exist() -> bool:
-    stage = get_current_stage()
-    for layer in stage.GetLayerStack():
-        if layer.GetDisplayName() == "Defect":
-            return True
-    return False
+    return get_defect_layer() is not None
 
 def get_defect_layer():
-    stage = get_current_stage()
-    pos = 0
-    for layer in stage.GetLayerStack():
-        if layer.GetDisplayName() == "Defect":
-            return layer, pos
-        pos = pos + 1
-    return None
-
-def create_randomizers(defect_params: DefectParameters, object_params: ObjectParameters):
-    diffuse_textures = get_textures(defect_params.defect_text.directory, "_D.png")
-    normal_textures = get_textures(defect_params.defect_text.directory, "_N.png")
-    roughness_textures = get_textures(defect_params.defect_text.directory, "_R.png")
+    return get_stage_cache().defect_layer
+
+def defect_layer_context():
+    """Edit context of the existing Defect layer, or a new Defect layer when there is none."""
+    defect_layer = get_defect_layer()
+    if defect_layer is None:
+        return rep.new_layer(DEFECT_LAYER_NAME)
+    return Usd.EditContext(get_current_stage(), defect_layer[0])
+
+def remove_replicator_graph(keep_pool: bool = False):
+    """
+    Removes the Replicator graph. With `keep_pool` the Defect layer, projection material and
+    pooled defects are kept so the next build can reuse them.
+    """
+    global _defect_graph
+    if keep_pool and _defect_graph is not None:
+        _defect_graph.writer.detach()
+        if get_defect_layer() is not None:
+            # DeletePrims only edits the root layer, where it would deactivate the graph, camera and light the Defect layer defines
+            layer, _ = get_defect_layer()
+            if layer.GetPrimAtPath('/Replicator'):
+                del layer.pseudoRoot.nameChildren['Replicator']
+    elif get_defect_layer() is not None:
+        layer, pos = get_defect_layer()
+        omni.kit.commands.execute('RemoveSublayer',
+            layer_identifier=layer.identifier,
+            sublayer_position=pos)
+        if is_valid_prim('/World/Looks/ProjectPBRMaterial'):
+            delete_prim('/World/Looks/ProjectPBRMaterial')
+        for pool in get_pools():
+            for _, projection_path in pool.entries:
+                if get_prim(projection_path).IsValid():
+                    delete_prim(projection_path)
+            if is_valid_prim(pool.target_path + "/Projection"):
+                delete_prim(pool.target_path + "/Projection")
+        clear_pools()
+    if is_valid_prim('/Replicator'):
+        delete_prim('/Replicator')
+    _defect_graph = None
+
+def _set_node_inputs(node, values: dict) -> bool:
+    if node is None or not node.is_valid():
+        return False
+    for name, value in values.items():
+        if not node.get_attribute_exists(name):
+            carb.log_warn(f"{node.get_prim_path()} has no attribute {name}")
+            return False
+    for name, value in values.items():
+        og.Controller.attribute(name, node).set(value)
+    return True
+
+def _rotation_bounds(defect_class: DefectClassConfig):
+    return (defect_class.rot.min_value, 0, 90), (defect_class.rot.max_value, 0, 90)
+
+def _scale_bounds(defect_class: DefectClassConfig):
+    return ((1, defect_class.dim_h.min_value, defect_class.dim_w.min_value),
+            (1, defect_class.dim_h.max_value, defect_class.dim_w.max_value))
+
+def load_catalogs(defect_params: DefectConfig):
+    """Texture catalog of every defect class, None when one of them has no complete texture sets."""
+    catalogs = []
+    for defect_class in defect_params.defect_classes():
+        catalog = defect_class.texture_catalog
+        if catalog is None or len(catalog) == 0:
+            source = "the procedural textures" if defect_class.procedural.enabled else defect_class.texture_dir
+            carb.log_error(f"No complete _D/_N/_R texture sets found in {source}")
+            return None
+        catalogs.append(catalog)
+    return catalogs
+
+def resolve_targets(object_params: ObjectConfig) -> List[str]:
+    """Valid target prim paths: the Target Prim, the listed targets, then the prims matching the target pattern."""
+    paths = [path for path in [object_params.target_prim, *object_params.targets] if path]
+    if object_params.target_pattern:
+        paths += find_prims(object_params.target_pattern, exclude=(POOL_ROOT, "/Replicator"))
+    return [path for path in dict.fromkeys(paths) if is_valid_prim(path) is not None]
+
+def get_target_center(target_path: str):
+    """World space center of the target's bounding box, None when the prim is not valid."""
+    prim = get_prim(target_path)
+    if not prim.IsValid():
+        return None
+    bbox_cache = UsdGeom.BBoxCache(Usd.TimeCode.Default(), [UsdGeom.Tokens.default_])
+    return bbox_cache.ComputeWorldBound(prim).ComputeAlignedRange().GetMidpoint()
+
+def get_texture_resolution(defect_params: DefectConfig, targets: List[str], rep_params: ReplicatorConfig) -> int:
+    """Texture resolution for the defects, estimated from how large the biggest defect of any class appears in the render product."""
+    if defect_params.texture_resolution != 0:
+        return defect_params.texture_resolution
+    center = get_target_center(targets[0]) if targets else None
+    if center is None:
+        return -1
+    if rep_params.camera.mode == "planned":
+        distance = rep_params.camera.distance.min_value
+    else:
+        distance = (Gf.Vec3d(*camera_position) - center).GetLength()
+    view_extent = 2 * distance * math.tan(camera_hfov / 2)
+    max_size = max(max(c.dim_w.max_value, c.dim_h.max_value) for c in defect_params.defect_classes()) * defect_proxy_size
+    return choose_resolution(rep_params.resolution, max_size, view_extent)
+
+def prepare_textures(catalog, resolution: int):
+    if resolution < 0:
+        return catalog
+    return get_texture_cache().prepare(catalog, resolution)
+
+def checkpoint_params(defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig, frames: int) -> dict:
+    """Run identity stored in the checkpoint written by DefectWriter, `frames` is the length of the whole run."""
+    return {"seed": rep_params.seed,
+            "params_hash": config_hash(defect_params, object_params, rep_params),
+            "first_frame": rep_params.frame_offset,
+            "end_frame": rep_params.frame_offset + frames,
+            "frames": rep_params.frames}
+
+def _resume_mismatch(checkpoint, defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig):
+    # Planned poses and views are sampled for the frame count of the run, another count plans other frames
+    frames = rep_params.frames if defect_params.placement == "planned" else None
+    return checkpoint.mismatch(rep_params.seed, config_hash(defect_params, object_params, rep_params), rep_params.frame_offset, frames)
+
+def is_run_complete(defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig) -> bool:
+    """
+    True when resuming and the checkpoint in the output directory records this run as fully written. A
+    checkpoint past the last frame of its run that was not marked complete is finalized.
+    """
+    if not rep_params.resume:
+        return False
+    checkpoint = read_checkpoint(rep_params.output_dir)
+    if checkpoint is None or _resume_mismatch(checkpoint, defect_params, object_params, rep_params) is not None:
+        return False
+    if not checkpoint.complete and checkpoint.next_frame >= checkpoint.end_frame:
+        # The run stopped after its last frame was written but before the writer finished
+        checkpoint.complete = True
+        try:
+            checkpoint.write()
+        except OSError as e:
+            carb.log_warn(f"Unable to finalize the checkpoint in {rep_params.output_dir}: {e}")
+    return checkpoint.complete
+
+def get_resume_frame(defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig):
+    """
+    Number of frames of the run already written according to the checkpoint in the output directory,
+    0 when not resuming and None when the checkpoint belongs to a run with other parameters.
+    """
+    if not rep_params.resume:
+        return 0
+    checkpoint = read_checkpoint(rep_params.output_dir)
+    if checkpoint is None:
+        carb.log_info(f"No checkpoint in {rep_params.output_dir}, starting from the first frame")
+        return 0
+    mismatch = _resume_mismatch(checkpoint, defect_params, object_params, rep_params)
+    if mismatch is not None:
+        carb.log_error(f"Cannot resume the run in {rep_params.output_dir}: {mismatch}")
+        return None
+    return min(rep_params.frames, checkpoint.next_frame - rep_params.frame_offset)
+
+def write_run_manifest(graph: DefectGraph):
+    """
+    Records the run of the graph in the manifest of its output directory, a resumed run adds a segment to
+    the run's manifest. Regenerated ranges leave the manifest alone.
+    """
+    rep_params = graph.rep_params
+    if rep_params.regenerate:
+        return
+    start_frame = graph.start_frame
+    manifest = create_manifest(rep_params.output_dir, graph.defect_params, graph.object_params, rep_params, graph.catalog_hash,
+                               start_frame + graph.run_frames)
+    if start_frame:
+        previous = read_manifest(rep_params.output_dir)
+        if previous is not None and previous.params_hash == manifest.params_hash and previous.catalog_hash == manifest.catalog_hash:
+            manifest.segments = previous.segments
+        else:
+            carb.log_warn(f"The run manifest in {rep_params.output_dir} does not match the resumed run, starting a new one")
+    seed = rep_params.seed
+    if seed is not None and start_frame:
+        seed = resume_seed(seed, start_frame)
+    manifest.add_segment(rep_params.frame_offset + start_frame, seed)
+    try:
+        manifest.write()
+    except OSError as e:
+        carb.log_warn(f"Unable to write the run manifest to {rep_params.output_dir}: {e}")
+
+def get_regenerate_range(defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig, catalogs):
+    """
+    Frames to render for regenerating the frame range of the run in the output directory, as
+    (run parameters, start frame, first written frame, stop frame, seed) with frames relative to the
+    run's first frame. None when the range cannot be regenerated.
+    """
+    if len(rep_params.regenerate) != 2 or rep_params.regenerate[0] > rep_params.regenerate[1]:
+        carb.log_error(f"Expected the [first, last] frames to regenerate, got {rep_params.regenerate}")
+        return None
+    manifest = read_manifest(rep_params.output_dir)
+    if manifest is None:
+        carb.log_error(f"No run manifest in {rep_params.output_dir}, cannot regenerate frames")
+        return None
+    if manifest.params_hash != config_hash(defect_params, object_params, rep_params):
+        carb.log_error(f"The defect, object or replicator parameters differ from the run in {rep_params.output_dir}")
+        return None
+    if manifest.catalog_hash != combined_hash(catalogs):
+        sources = [c.texture_dir for c in defect_params.defect_classes()]
+        carb.log_error(f"The textures in {', '.join(sources)} differ from the ones the run in {rep_params.output_dir} used")
+        return None
+    first, last = rep_params.regenerate
+    if first < manifest.first_frame or last >= manifest.end_frame:
+        carb.log_error(f"Frames {first}..{last} are outside of the run's frames {manifest.first_frame}..{manifest.end_frame - 1}")
+        return None
+    # The plan of the run depends on its frame count, the frames are numbered from its first frame
+    run_params = dataclasses.replace(rep_params, frames=manifest.parameters["replicator"]["frames"], frame_offset=manifest.first_frame)
+    if defect_params.placement == "planned":
+        # Planned poses and texture sequences can start at any frame
+        return run_params, first - manifest.first_frame, first - manifest.first_frame, last + 1 - manifest.first_frame, None
+    segment = manifest.segment_at(first)
+    if segment is None or segment["seed"] is None:
+        carb.log_error("Scattered frames can only be regenerated for seeded runs")
+        return None
+    if rep_params.writer.name != "DefectWriter" and segment["first_frame"] != first:
+        carb.log_error(f"Regenerating scattered frames after the start of a run needs DefectWriter, not {rep_params.writer.name}")
+        return None
+    # Replicator's random stream is replayed from the start of the segment, the frames before the range are not written
+    carb.log_info(f"Replaying {first - segment['first_frame']} frame(s) from frame {segment['first_frame']} before frame {first}")
+    return (run_params, segment["first_frame"] - manifest.first_frame, first - manifest.first_frame,
+            last + 1 - manifest.first_frame, segment["seed"])
+
+def _adaptive_subframes(rep_params: ReplicatorConfig):
+    subframes = rep_params.subframes
+    if not subframes.adaptive:
+        return None
+    return {"max_subframes": rep_params.rt_subframes, "tolerance": subframes.tolerance,
+            "min_subframes": subframes.min_subframes, "quantile": subframes.quantile}
+
+def attach_writer(render_product, rep_params: ReplicatorConfig, semantic_labels: List[str], checkpoint: dict = None, skip_frames: int = 0):
+    writer_params = rep_params.writer
+    writer = rep.WriterRegistry.get(writer_params.name)
+    if writer_params.name == "BasicWriter":
+        writer.initialize(output_dir=rep_params.output_dir, rgb=True, semantic_segmentation=rep_params.use_seg, bounding_box_2d_tight=rep_params.use_bb)
+    else:
+        writer.initialize(output_dir=rep_params.output_dir,
+                          rgb=True,
+                          semantic_segmentation=rep_params.use_seg,
+                          bounding_box_2d_tight=rep_params.use_bb,
+                          frame_offset=rep_params.frame_offset,
+                          png_compression=writer_params.png_compression,
+                          npz_batch_size=writer_params.npz_batch_size,
+                          compress_npz=writer_params.compress_npz,
+                          num_workers=writer_params.num_workers,
+                          queue_size=writer_params.queue_size,
+                          annotations=writer_params.annotations,
+                          semantic_label=semantic_labels,
+                          annotation_chunk_size=writer_params.annotation_chunk_size,
+                          metrics=writer_params.metrics,
+                          checkpoint=checkpoint,
+                          skip_frames=skip_frames,
+                          profile=rep_params.profile,
+                          adaptive_subframes=_adaptive_subframes(rep_params),
+                          dedup=writer_params.dedup,
+                          dedup_distance=writer_params.dedup_distance,
+                          dedup_capacity=writer_params.dedup_capacity,
+                          export=writer_params.export,
+                          tar_shard_samples=writer_params.tar_shard_samples,
+                          tar_shard_mb=writer_params.tar_shard_mb)
+    # Attach render_product to the writer
+    writer.attach([render_product])
+    return writer
+
+def update_defect_layer(defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig) -> bool:
+    """
+    Updates the distributions, trigger and writer of the existing Defect layer in place.
+    Returns False when the layer does not exist or a structural parameter changed and the layer has to be rebuilt.
+    """
+    graph = _defect_graph
+    if graph is None or not does_defect_layer_exist() or not get_prim('/Replicator').IsValid():
+        return False
+
+    catalogs = load_catalogs(defect_params)
+    defect_changes = set(changed_fields(graph.defect_params, defect_params))
+    rep_changes = set(changed_fields(graph.rep_params, rep_params))
+    if (changed_fields(graph.object_params, object_params)
+            or defect_changes & STRUCTURAL_DEFECT_FIELDS
+            or rep_changes & STRUCTURAL_REPLICATOR_FIELDS
+            or catalogs is None or [c.mtime_ns for c in catalogs] != graph.catalog_mtimes):
+        return False
+    if graph.plan is not None and (defect_changes & PLANNED_DEFECT_FIELDS or rep_changes & PLANNED_REPLICATOR_FIELDS):
+        return False
+    # The class schedule spans the run, and the top level defect fields are not used by the classes
+    if graph.schedule is not None and (defect_changes or rep_changes & PLANNED_REPLICATOR_FIELDS):
+        return False
+    # A resumed layer starts part way into the run, any change or another run starts it over. Regenerated ranges are always rebuilt
+    if graph.start_frame and (defect_changes or rep_changes or graph.writer_used) or graph.rep_params.regenerate:
+        return False
+
+    if "count" in defect_changes:
+        with defect_layer_context():
+            create_defects(defect_params, graph.targets)
+    defect_class = defect_params.defect_classes()[0]
+    if "rot" in defect_changes:
+        lower, upper = _rotation_bounds(defect_class)
+        for node in graph.nodes.get("rotation", []):
+            if not _set_node_inputs(node, {"inputs:lower": lower, "inputs:upper": upper}):
+                return False
+    if defect_changes & {"dim_w", "dim_h"}:
+        if get_texture_resolution(defect_params, graph.targets, rep_params) != graph.texture_resolution:
+            return False
+        lower, upper = _scale_bounds(defect_class)
+        for node in graph.nodes.get("scale", []):
+            if not _set_node_inputs(node, {"inputs:lower": lower, "inputs:upper": upper}):
+                return False
+    writer_fields = WRITER_FIELDS
+    if "frames" in rep_changes:
+        graph.run_frames = rep_params.frames
+    if graph.adaptive:
+        # The run loop counts the frames and the writer caps the subframes
+        writer_fields = WRITER_FIELDS | {"rt_subframes"}
+    else:
+        trigger_inputs = {TRIGGER_INPUTS[name]: getattr(rep_params, name) for name in rep_changes & TRIGGER_INPUTS.keys()}
+        if trigger_inputs and not _set_node_inputs(graph.nodes.get("trigger"), trigger_inputs):
+            return False
+    # A writer that ran is finished, the next run numbers its frames from the start again with a new one
+    if rep_changes & writer_fields or graph.writer_used:
+        graph.writer.detach()
+        frames = graph.plan.frames if graph.plan is not None else rep_params.frames
+        graph.writer = attach_writer(graph.render_product, rep_params, [c.semantic_label for c in defect_params.defect_classes()],
+                                     checkpoint_params(defect_params, object_params, rep_params, frames))
+        graph.writer_used = False
+
+    graph.defect_params = copy.deepcopy(defect_params)
+    graph.rep_params = copy.deepcopy(rep_params)
+    return True
+
+def plan_defect_placement(defect_params: DefectConfig, targets: List[str], rep_params: ReplicatorConfig):
+    """
+    Defect poses of every frame for the planned placement and, for planned camera views, the camera
+    of every frame. Returns (None, None) for the scatter placement.
+    """
+    plan_camera = rep_params.camera.mode == "planned"
+    if defect_params.placement != "planned":
+        if plan_camera:
+            carb.log_warn("Planned camera views need the planned defect placement, keeping the camera fixed")
+        return None, None
+    if len(targets) > 1:
+        carb.log_warn(f"Planned placement supports a single target, scattering the defects over {len(targets)} targets")
+        return None, None
+    classes = defect_params.defect_classes()
+    if len(classes) > 1:
+        carb.log_warn(f"Planned placement supports a single defect class, scattering the defects of {len(classes)} classes")
+        return None, None
+    defect_class = classes[0]
+    surface = load_target_surface(targets[0])
+    if surface is None:
+        carb.log_warn(f"No mesh found at {targets[0]}, falling back to scatter placement")
+        return None, None
+
+    frames = rep_params.frames
+    if plan_camera:
+        frames += math.ceil(frames * VIEW_SPARE_FRAMES)
+    plan = plan_placements(surface, frames, max(1, defect_class.count), defect_class.rot,
+                           defect_class.dim_w, defect_class.dim_h, rep_params.seed, defect_proxy_size)
+    carb.log_info(f"Planned {plan.frames * plan.count} defect pose(s) over {plan.frames} frame(s)")
+    if not plan_camera:
+        return plan, None
+
+    camera = rep_params.camera
+    axis = (0, 0, 1) if UsdGeom.GetStageUpAxis(get_current_stage()) == UsdGeom.Tokens.z else (0, 1, 0)
+    views = plan_views(plan, get_target_center(targets[0]), axis, camera.distance, camera_hfov, rep_params.resolution,
+                       camera.min_elevation, camera.max_elevation, camera.min_visible_pixels, camera.max_attempts,
+                       rep_params.seed, defect_proxy_size)
+    views = views.select(slice(0, rep_params.frames))
+    if len(views) < rep_params.frames:
+        carb.log_warn(f"Only {len(views)} of {rep_params.frames} frame(s) show at least {camera.min_visible_pixels} defect pixels, "
+                      "the run is shortened to those frames")
+    carb.log_info(f"Planned {len(views)} camera view(s), {views.dropped} frame(s) without a visible defect dropped")
+    return plan.select(views.frames), views
+
+def get_build_timer():
+    """Phase timings of the last Defect layer build, None when there is no layer."""
+    if _defect_graph is None:
+        return None
+    return _defect_graph.build_timer
+
+def sync_defect_layer(defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig = None):
+    """Updates the Defect layer in place when only non-structural parameters changed, otherwise rebuilds it."""
+    if rep_params is None:
+        rep_params = ReplicatorConfig()
+    if update_defect_layer(defect_params, object_params, rep_params):
+        carb.log_info("Updated Replicator graph in place")
+        return
+
+    # Pools are per target, they can be kept as long as the targets are the same
+    remove_replicator_graph(keep_pool=_defect_graph is not None and _defect_graph.object_params == object_params)
+    create_defect_layer(defect_params, object_params, rep_params)
+
+def create_randomizers(defect_params: DefectConfig, targets: List[str], catalogs: list, nodes: dict, plan: PlacementPlan = None,
+                       start_frame: int = 0, schedule=None):
+    classes = defect_params.defect_classes()
     def move_defect():
-        defects = rep.get.prims(semantics=[('class', defect_params.semantic_label.as_string + '_mesh')])
-        plane = rep.get.prim_at_path(object_params.target_prim.path_value)
-        with defects:
-            rep.randomizer.scatter_2d(plane)
-            rep.modify.pose(
-                rotation=rep.distribution.uniform(
-                    (defect_params.rot.min_value, 0, 90), 
-                    (defect_params.rot.max_value, 0, 90)
-                ),
-                scale=rep.distribution.uniform(
-                    (1, defect_params.dim_h.min_value,defect_params.dim_w.min_value),
-                    (1, defect_params.dim_h.max_value, defect_params.dim_w.max_value)
-                )
-            )
+        if plan is not None:
+            defects = rep.get.prims(semantics=[('class', classes[0].semantic_label + '_mesh')])
+            # The sequences advance once per defect, so every frame takes the next `count` planned poses
+            positions, rotations, scales = plan.sequences()
+            with defects:
+                rep.modify.pose(position=rep.distribution.sequence(positions),
+                                rotation=rep.distribution.sequence(rotations),
+                                scale=rep.distribution.sequence(scales))
+            return defects.node
+
+        nodes["rotation"] = []
+        nodes["scale"] = []
+        for i, defect_class in enumerate(classes):
+            for target in targets:
+                # Every target scatters its own pool, hidden targets hide their projections with them
+                defects = rep.get.prims(path_pattern=f"{get_pool(target, i).root}/.*",
+                                        semantics=[('class', defect_class.semantic_label + '_mesh')])
+                with defects:
+                    rep.randomizer.scatter_2d(rep.get.prim_at_path(target))
+                    rotation = rep.distribution.uniform(*_rotation_bounds(defect_class))
+                    scale = rep.distribution.uniform(*_scale_bounds(defect_class))
+                    rep.modify.pose(rotation=rotation, scale=scale)
+                nodes["rotation"].append(rotation.node)
+                nodes["scale"].append(scale.node)
 
         return defects.node
     
     def change_defect_image():
-        projections = rep.get.prims(semantics=[('class', defect_params.semantic_label.as_string + '_projectmat')])
-        with projections:
-            rep.modify.projection_material(
-                diffuse=rep.distribution.sequence(diffuse_textures),
-                normal=rep.distribution.sequence(normal_textures),
-                roughness=rep.distribution.sequence(roughness_textures))
+        for defect_class, catalog in zip(classes, catalogs):
+            # Texture sequences advance once per defect, a resumed run continues where the written frames stopped
+            start = start_frame * max(1, defect_class.count) * len(targets) % len(catalog)
+            projections = rep.get.prims(semantics=[('class', defect_class.semantic_label + '_projectmat')])
+            with projections:
+                rep.modify.projection_material(
+                    diffuse=rep.distribution.sequence(catalog.diffuse[start:] + catalog.diffuse[:start]),
+                    normal=rep.distribution.sequence(catalog.normal[start:] + catalog.normal[:start]),
+                    roughness=rep.distribution.sequence(catalog.roughness[start:] + catalog.roughness[:start]))
+        return projections.node
+
+    def show_class():
+        # Only the defects of the scheduled class are visible, the sequences advance once per projection
+        for i, defect_class in enumerate(classes):
+            projections = rep.get.prims(semantics=[('class', defect_class.semantic_label + '_projectmat')])
+            defects = max(1, defect_class.count) * len(targets)
+            with projections:
+                rep.modify.visibility(rep.distribution.sequence([bool(c == i) for c in schedule for _ in range(defects)]))
         return projections.node
 
+    def rotate_target():
+        # One target is visible per frame, in turn
+        offset = start_frame % len(targets)
+        for i, target in enumerate(targets):
+            prim = rep.get.prim_at_path(target)
+            with prim:
+                rep.modify.visibility(rep.distribution.sequence([(i - offset) % len(targets) == frame for frame in range(len(targets))]))
+        return prim.node
+
     rep.randomizer.register(move_defect)
     rep.randomizer.register(change_defect_image)
+    if schedule is not None:
+        rep.randomizer.register(show_class)
+    if len(targets) > 1:
+        rep.randomizer.register(rotate_target)
+
+def follow_targets(camera, targets: List[str], start_frame: int = 0):
+    """Moves the camera with the active target, keeping the offset it has from the first target."""
+    centers = [get_target_center(target) for target in targets]
+    offset = Gf.Vec3d(*camera_position) - centers[0]
+    start = start_frame % len(targets)
+    centers = centers[start:] + centers[:start]
+    with camera:
+        rep.modify.pose(position=rep.distribution.sequence([tuple(center + offset) for center in centers]),
+                        look_at=rep.distribution.sequence([tuple(center) for center in centers]))
 
 def create_camera(target_path):
     if is_valid_prim(camera_path) is None:
-        camera = rep.create.camera(position=1000, look_at=rep.get.prim_at_path(target_path))
+        camera = rep.create.camera(position=camera_position, look_at=rep.get.prim_at_path(target_path))
         carb.log_info(f"Creating Camera: {camera}")
     else:
         camera = rep.get.prim_at_path(camera_path)
     return camera
 
-def create_defects(defect_params: DefectParameters, object_params: ObjectParameters):
-    target_prim = rep.get.prims(path_pattern=object_params.target_prim.path_value)
-    count = 1
-    if defect_params.count.as_int > 1:
-        count = defect_params.count.as_int
-    for i in range(count):
-        cube = rep.create.cube(visible=False, semantics=[('class', defect_params.semantic_label.as_string + '_mesh')], position=0, scale=1, rotation=(0, 0, 90))
-        with target_prim:
-            rep.create.projection_material(cube, [('class', defect_params.semantic_label.as_string + '_projectmat')])
-
-def create_defect_layer(defect_params: DefectParameters, object_params: ObjectParameters, frames: int = 1, output_dir: str = "_defects", rt_subframes: int = 0, use_seg: bool = False, use_bb: bool = True):
-    if len(defect_params.defect_text.directory) <= 0:
+def create_defects(defect_params: DefectConfig, targets: List[str]):
+    classes = defect_params.defect_classes()
+    for i, defect_class in enumerate(classes):
+        count = 1
+        if defect_class.count > 1:
+            count = defect_class.count
+        for target in targets:
+            get_pool(target, i).resize(count, defect_class.semantic_label)
+    # Pools of classes a previous build had are hidden
+    for pool in get_pools():
+        if pool.class_index >= len(classes) and pool.active:
+            pool.resize(0, pool.semantic_label)
+
+def create_defect_layer(defect_params: DefectConfig, object_params: ObjectConfig, rep_params: ReplicatorConfig = None):
+    if rep_params is None:
+        rep_params = ReplicatorConfig()
+    classes = defect_params.defect_classes()
+    if any(len(c.texture_dir) <= 0 and not c.procedural.enabled for c in classes):
         carb.log_error("No directory selected")
         return
+    error = check_classes([c.semantic_label for c in classes], [c.weight for c in classes])
+    if error is not None:
+        carb.log_error(error)
+        return
+    if defect_params.placement not in PLACEMENTS:
+        carb.log_error(f"Unknown defect placement {defect_params.placement!r}, expected one of {PLACEMENTS}")
+        return
+    if rep_params.writer.dedup not in DEDUP_MODES:
+        carb.log_error(f"Unknown dedup mode {rep_params.writer.dedup!r}, expected one of {DEDUP_MODES}")
+        return
+    if rep_params.writer.export not in EXPORT_MODES:
+        carb.log_error(f"Unknown export mode {rep_params.writer.export!r}, expected one of {EXPORT_MODES}")
+        return
+    if rep_params.writer.export and rep_params.writer.name != "DefectWriter":
+        carb.log_error("Tar shard export requires DefectWriter")
+        return
+    if rep_params.subframes.adaptive and rep_params.writer.name != "DefectWriter":
+        carb.log_error("Adaptive subframes require DefectWriter")
+        return
+    if rep_params.subframes.adaptive and rep_params.rt_subframes < 2:
+        carb.log_warn(f"rt_subframes {rep_params.rt_subframes} caps adaptive subframes at one subframe per frame")
+    if rep_params.camera.mode not in CAMERA_MODES:
+        carb.log_error(f"Unknown camera mode {rep_params.camera.mode!r}, expected one of {CAMERA_MODES}")
+        return
+
+    timer = PhaseTimer()
+    with timer.phase("texture_discovery"):
+        catalogs = load_catalogs(defect_params)
+    if catalogs is None:
+        return
+    targets = resolve_targets(object_params)
+    if not targets:
+        carb.log_error("No valid target prim given")
+        return
+    regenerate = None
+    if rep_params.regenerate:
+        regenerate = get_regenerate_range(defect_params, object_params, rep_params, catalogs)
+        if regenerate is None:
+            return
+        run_params, start_frame, write_from, stop_frame, seed = regenerate
+        output_dir = os.path.join(rep_params.output_dir, REGENERATED_DIR.format(first=rep_params.regenerate[0], last=rep_params.regenerate[1]))
+        carb.log_info(f"Regenerating frames {rep_params.regenerate[0]}..{rep_params.regenerate[1]} into {output_dir}")
+        rep_params = dataclasses.replace(run_params, output_dir=output_dir)
+    else:
+        if is_run_complete(defect_params, object_params, rep_params):
+            carb.log_warn(f"Every frame of the run is already written to {rep_params.output_dir}, nothing to resume")
+            return
+        start_frame = get_resume_frame(defect_params, object_params, rep_params)
+        if start_frame is None:
+            return
+        write_from = start_frame
+        seed = rep_params.seed
+        if seed is not None and start_frame:
+            # Replicator's random stream cannot be fast-forwarded, a resumed run continues on a seed derived from the resume frame
+            seed = resume_seed(seed, start_frame)
     
-    with rep.new_layer("Defect"):
-        create_defects(defect_params, object_params)
-        create_randomizers(defect_params=defect_params, object_params=object_params)        
-        
-        # Create / Get camera
-        camera = create_camera(object_params.target_prim.path_value)
+    if seed is not None:
+        rep.set_global_seed(seed)
+
+    with timer.phase("texture_preparation"):
+        texture_resolution = get_texture_resolution(defect_params, targets, rep_params)
+        textures = [prepare_textures(catalog, texture_resolution) for catalog in catalogs]
+
+    global _defect_graph
+    graph = DefectGraph(defect_params, object_params, rep_params, [c.mtime_ns for c in catalogs], texture_resolution)
+    graph.catalog_hash = combined_hash(catalogs)
+    graph.targets = targets
+    if len(targets) > 1:
+        carb.log_info(f"Rotating {len(targets)} targets, one per frame")
+    with timer.phase("placement"):
+        graph.plan, graph.views = plan_defect_placement(defect_params, targets, rep_params)
+    run_frames = graph.plan.frames if graph.plan is not None else rep_params.frames
+    if regenerate is None and start_frame and start_frame >= run_frames:
+        # A trigger for no frames would not stop
+        carb.log_warn(f"Every frame of the run is already written to {rep_params.output_dir}, nothing to resume")
+        return
+    if regenerate is None:
+        stop_frame = run_frames
+    elif defect_params.placement == "planned" and graph.plan is None:
+        carb.log_error("The planned placement fell back to scatter, the frames cannot be regenerated")
+        return
+    elif stop_frame > run_frames:
+        carb.log_error(f"The run has {run_frames} frame(s), cannot regenerate up to frame {rep_params.frame_offset + stop_frame - 1}")
+        return
+    if start_frame and regenerate is None:
+        carb.log_info(f"Resuming the run in {rep_params.output_dir} at frame {rep_params.frame_offset + start_frame}")
+        if graph.plan is not None:
+            graph.plan = graph.plan.frame_slice(start_frame)
+        if graph.views is not None:
+            graph.views = graph.views.select(slice(start_frame, None))
+    graph.start_frame = start_frame
+    if len(classes) > 1:
+        weights = [c.weight for c in classes]
+        # Scheduled over the whole run, so the frames of every shard, resume and regenerated range follow the weights
+        graph.schedule = class_schedule(weights, run_frames, rep_params.seed)[start_frame:stop_frame]
+        counts = ", ".join(f"{c.semantic_label} {n}" for c, n in zip(classes, class_frame_counts(weights, run_frames)))
+        carb.log_info(f"Mixing {len(classes)} defect classes over {run_frames} frame(s): {counts}")
+    with defect_layer_context():
+        with timer.phase("defects"):
+            create_defects(defect_params, targets)
+        with timer.phase("randomizers"):
+            create_randomizers(defect_params=defect_params, targets=targets, catalogs=textures, nodes=graph.nodes, plan=graph.plan,
+                               start_frame=start_frame, schedule=graph.schedule)
         
-        # Add Default Light
-        distance_light = rep.create.light(rotation=(315,0,0), intensity=3000, light_type="distant")
+        with timer.phase("camera_and_light"):
+            # Create / Get camera
+            camera = create_camera(targets[0])
+
+            # Add Default Light
+            distance_light = rep.create.light(rotation=(315,0,0), intensity=3000, light_type="distant")
 
-        render_product  = rep.create.render_product(camera, (1024, 1024))
+        with timer.phase("render_product"):
+            graph.render_product = rep.create.render_product(camera, tuple(rep_params.resolution))
 
-        # Initialize and attach writer
-        writer = rep.WriterRegistry.get("BasicWriter")
-        writer.initialize(output_dir=output_dir, rgb=True, semantic_segmentation=use_seg, bounding_box_2d_tight=use_bb)
-        # Attach render_product to the writer
-        writer.attach([render_product])
+        with timer.phase("writer"):
+            # Initialize and attach writer
+            # Regenerated frames keep their numbers and leave the run's checkpoint alone
+            graph.writer = attach_writer(graph.render_product,
+                                         dataclasses.replace(rep_params, frame_offset=rep_params.frame_offset + start_frame),
+                                         [c.semantic_label for c in classes],
+                                         checkpoint_params(defect_params, object_params, rep_params, run_frames) if regenerate is None else None,
+                                         skip_frames=write_from - start_frame)
 
-        # Setup randomization
-        with rep.trigger.on_frame(num_frames=frames, rt_subframes=rt_subframes):
-            rep.randomizer.move_defect()
-            rep.randomizer.change_defect_image()
+        with timer.phase("trigger"):
+            # Setup randomization
+            # Planned runs are as long as their plan, frames without a visible defect are not rendered
+            frames = stop_frame - start_frame
+            graph.run_frames = frames
+            if rep_params.subframes.adaptive:
+                trigger = rep.trigger.on_custom_event(event_name=RANDOMIZE_EVENT)
+            else:
+                trigger = rep.trigger.on_frame(num_frames=frames, rt_subframes=rep_params.rt_subframes)
+            with trigger:
+                rep.randomizer.move_defect()
+                rep.randomizer.change_defect_image()
+                if graph.schedule is not None:
+                    rep.randomizer.show_class()
+                if len(targets) > 1:
+                    rep.randomizer.rotate_target()
+                    follow_targets(camera, targets, start_frame)
+                if graph.views is not None:
+                    with camera:
+                        rep.modify.pose(position=rep.distribution.sequence(graph.views.sequence()), look_at=graph.views.center)
+            graph.nodes["trigger"] = trigger.node
+    graph.build_timer = timer
+    _defect_graph = graph
+    carb.log_info(f"Defect layer built in {timer.total * 1000:.1f} ms: {timer.summary()}")
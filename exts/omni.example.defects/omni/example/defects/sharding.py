@@ -0,0 +1,145 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Only depends on the standard library so the coordinator can run outside of Kit
+
+import dataclasses
+import hashlib
+import json
+import os
+import re
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+SHARDS_DIR = "_shards"
+SHARDS_MANIFEST = "shards.json"
+
+# <annotator>_<frame index>.<ext> as written by BasicWriter, e.g. rgb_0042.png
+FRAME_FILE = re.compile(r"^(?P<prefix>.+)_(?P<index>\d+)(?P<ext>\.[^.]+)$")
+
+@dataclass
+class Shard:
+    index: int
+    seed: int
+    frame_offset: int
+    frames: int
+    output_dir: str
+
+    @property
+    def name(self) -> str:
+        return f"shard_{self.index:03d}"
+
+def shard_seed(base_seed: int, index: int) -> int:
+    """Seed of a shard, stable for a given base seed and shard index."""
+    digest = hashlib.sha256(f"{base_seed}:{index}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "little") & 0x7FFFFFFF
+
+def plan_shards(total_frames: int, num_shards: int, output_dir: str, base_seed: int = 0) -> List[Shard]:
+    """Splits a frame budget into contiguous shards, each writing to its own subdirectory of `output_dir`."""
+    if total_frames <= 0:
+        raise ValueError(f"Number of frames is {total_frames}. Input value needs to be greater than 0.")
+    num_shards = max(1, min(num_shards, total_frames))
+    frames, extra = divmod(total_frames, num_shards)
+
+    shards = []
+    offset = 0
+    for index in range(num_shards):
+        shard_frames = frames + (1 if index < extra else 0)
+        shard = Shard(index, shard_seed(base_seed, index), offset, shard_frames, "")
+        shard.output_dir = os.path.join(output_dir, SHARDS_DIR, shard.name)
+        shards.append(shard)
+        offset += shard_frames
+    return shards
+
+class ShardRunner:
+    """
+    Runs one worker process per shard, at most `max_workers` at a time.
+    Every `{job_file}` in the command is replaced by the shard's job file.
+    """
+    def __init__(self, shards: List[Shard], job_files: List[str], command: List[str], max_workers: int = 0) -> None:
+        self._pending = list(zip(shards, job_files))
+        self._command = command
+        self._max_workers = max_workers if max_workers > 0 else len(shards)
+        self._running = []
+        self.return_codes = {}
+
+    @property
+    def failed(self) -> List[int]:
+        return sorted(index for index, code in self.return_codes.items() if code != 0)
+
+    def _launch(self, shard: Shard, job_file: str):
+        os.makedirs(shard.output_dir, exist_ok=True)
+        args = [arg.replace("{job_file}", job_file) for arg in self._command]
+        log = open(os.path.join(os.path.dirname(job_file), f"{shard.name}.log"), "w")
+        process = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT)
+        self._running.append((shard, process, log))
+
+    def poll(self) -> bool:
+        """Collects finished workers and starts pending ones, returns True once every shard is done."""
+        for item in list(self._running):
+            shard, process, log = item
+            code = process.poll()
+            if code is not None:
+                log.close()
+                self.return_codes[shard.index] = code
+                self._running.remove(item)
+        while self._pending and len(self._running) < self._max_workers:
+            self._launch(*self._pending.pop(0))
+        return not self._pending and not self._running
+
+    def run(self, poll_interval: float = 0.5) -> List[int]:
+        """Blocks until every shard is done, returns the indices of the failed shards."""
+        while not self.poll():
+            time.sleep(poll_interval)
+        return self.failed
+
+def _frame_padding(shards: List[Shard]) -> int:
+    last_frame = shards[-1].frame_offset + shards[-1].frames - 1
+    return max(4, len(str(last_frame)))
+
+def merge_shards(shards: List[Shard], output_dir: str, renumber: bool = True, padding: Optional[int] = None) -> int:
+    """
+    Moves the shard outputs into `output_dir`, offsetting frame indices by the shard's frame offset.
+    Files that are not frame files keep their name, prefixed by the shard name if it is already taken.
+    Returns the number of moved files.
+    """
+    if padding is None:
+        padding = _frame_padding(shards)
+
+    moved = 0
+    for shard in shards:
+        for root, _, files in os.walk(shard.output_dir):
+            rel_dir = os.path.relpath(root, shard.output_dir)
+            dst_dir = os.path.normpath(os.path.join(output_dir, rel_dir))
+            os.makedirs(dst_dir, exist_ok=True)
+            for name in sorted(files):
+                match = FRAME_FILE.match(name)
+                if match:
+                    index = int(match["index"])
+                    if renumber:
+                        index += shard.frame_offset
+                    dst_name = f"{match['prefix']}_{index:0{padding}d}{match['ext']}"
+                elif os.path.exists(os.path.join(dst_dir, name)):
+                    dst_name = f"{shard.name}_{name}"
+                else:
+                    dst_name = name
+                os.replace(os.path.join(root, name), os.path.join(dst_dir, dst_name))
+                moved += 1
+
+    with open(os.path.join(output_dir, SHARDS_MANIFEST), "w") as f:
+        json.dump({"padding": padding, "shards": [dataclasses.asdict(shard) for shard in shards]}, f, indent=2)
+    return moved
@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import omni.usd
+from pxr import Sdf, Tf, Usd
+from typing import Dict, Optional, Tuple
+
+DEFECT_LAYER_NAME = "Defect"
+# Prim lookups kept per stage, the cache starts over when it grows past this
+MAX_PRIMS = 4096
+_UNKNOWN = object()
+
+class StageCache:
+    """
+    Lookups that UI actions repeat on the current stage: the Defect layer with its position in the
+    layer stack, and prims by path. Prim entries are dropped when the stage resyncs their path, the
+    layer entry when the layer stack changes, and everything when a stage is opened or closed.
+    """
+    def __init__(self, context=None) -> None:
+        self._context = context or omni.usd.get_context()
+        self._stage = None
+        self._listeners = []
+        self._defect_layer = _UNKNOWN
+        self._prims: Dict[str, Usd.Prim] = {}
+        self._stage_event_sub = self._context.get_stage_event_stream().create_subscription_to_pop(
+            self._on_stage_event, name="omni.example.defects stage cache")
+
+    @property
+    def stage(self) -> Usd.Stage:
+        """
+        Stage of the USD context
+
+        :type: Usd.Stage
+        """
+        stage = self._context.get_stage()
+        if stage != self._stage:
+            self._bind(stage)
+        return stage
+
+    @property
+    def defect_layer(self) -> Optional[Tuple[Sdf.Layer, int]]:
+        """
+        Defect layer and its position in the layer stack, None when there is no Defect layer
+
+        :type: Optional[Tuple[Sdf.Layer, int]]
+        """
+        stage = self.stage
+        if self._defect_layer is _UNKNOWN:
+            self._defect_layer = None
+            if stage is not None:
+                for pos, layer in enumerate(stage.GetLayerStack()):
+                    if layer.GetDisplayName() == DEFECT_LAYER_NAME:
+                        self._defect_layer = (layer, pos)
+                        break
+        return self._defect_layer
+
+    def get_prim(self, path: str) -> Usd.Prim:
+        stage = self.stage
+        prim = self._prims.get(path)
+        if prim is None:
+            if len(self._prims) >= MAX_PRIMS:
+                self._prims.clear()
+            prim = self._prims[path] = stage.GetPrimAtPath(path)
+        return prim
+
+    def clear(self):
+        self._defect_layer = _UNKNOWN
+        self._prims.clear()
+
+    def _bind(self, stage: Usd.Stage):
+        for listener in self._listeners:
+            listener.Revoke()
+        self._listeners = []
+        self.clear()
+        self._stage = stage
+        if stage is not None:
+            self._listeners = [Tf.Notice.Register(Usd.Notice.ObjectsChanged, self._on_objects_changed, stage),
+                               Tf.Notice.Register(Usd.Notice.LayerMutingChanged, self._on_layer_muting_changed, stage)]
+
+    def _on_objects_changed(self, notice, sender):
+        # Value edits leave prims and layers alone, only resyncs add or remove them
+        resynced = notice.GetResyncedPaths()
+        if not resynced:
+            return
+        if Sdf.Path.absoluteRootPath in resynced:
+            # Sublayers were added, removed or reordered
+            self.clear()
+            return
+        prefixes = tuple(str(path) for path in resynced)
+        for path in [p for p in self._prims if p.startswith(prefixes)]:
+            if any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes):
+                del self._prims[path]
+
+    def _on_layer_muting_changed(self, notice, sender):
+        self.clear()
+
+    def _on_stage_event(self, event):
+        if event.type in (int(omni.usd.StageEventType.OPENED), int(omni.usd.StageEventType.CLOSED)):
+            self._bind(None)
+
+    def destroy(self):
+        self._bind(None)
+        self._stage_event_sub = None
+
+_stage_cache: Optional[StageCache] = None
+
+def get_stage_cache() -> StageCache:
+    global _stage_cache
+    if _stage_cache is None:
+        _stage_cache = StageCache()
+    return _stage_cache
+
+def release_stage_cache():
+    """Drops the cache and its USD notice and stage event subscriptions."""
+    global _stage_cache
+    if _stage_cache is not None:
+        _stage_cache.destroy()
+        _stage_cache = None
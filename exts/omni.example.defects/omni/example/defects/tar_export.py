@@ -0,0 +1,209 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# WebDataset-style tar shard export for DefectWriter, free of Replicator imports like FrameEncoder
+
+import glob
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+import numpy as np
+from PIL import Image
+from typing import Callable, Dict, List, Optional
+
+EXPORT_MODES = ("", "tar")
+SHARD_PREFIX = "defects"
+PARTIAL_SUFFIX = ".partial"
+# One JSON line per finished shard, appended once the shard and its index are in place
+SHARD_LIST = "tar_shards_{first:04d}.jsonl"
+TAR_BLOCK = tarfile.BLOCKSIZE
+
+def _member_size(data: bytes) -> int:
+    # Header block plus the data padded to whole blocks
+    return TAR_BLOCK + -(-len(data) // TAR_BLOCK) * TAR_BLOCK
+
+def _png_bytes(image: np.ndarray, compression: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG", compress_level=compression)
+    return buffer.getvalue()
+
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+def encode_sample(frame_id: int, rgb: np.ndarray = None, semantic_segmentation: np.ndarray = None, segmentation_labels: dict = None,
+                  bounding_boxes: np.ndarray = None, bounding_box_labels: dict = None, png_compression: int = 1) -> Dict[str, bytes]:
+    """
+    Members of one sample by extension: `rgb.png`, the segmentation mask as `seg.png` (16 bit ids, or
+    `seg.npy` when the ids do not fit) and a `json` with the frame size, boxes and label maps.
+    """
+    members = {}
+    height, width = (0, 0)
+    if rgb is not None:
+        height, width = rgb.shape[:2]
+        members["rgb.png"] = _png_bytes(rgb, png_compression)
+    if semantic_segmentation is not None:
+        mask = np.asarray(semantic_segmentation)
+        if mask.size == 0 or int(mask.max()) <= np.iinfo(np.uint16).max:
+            members["seg.png"] = _png_bytes(mask.astype(np.uint16), png_compression)
+        else:
+            buffer = io.BytesIO()
+            np.save(buffer, mask)
+            members["seg.npy"] = buffer.getvalue()
+    info = {"frame": frame_id, "width": width, "height": height}
+    if bounding_boxes is not None:
+        names = bounding_boxes.dtype.names or ()
+        info["boxes"] = [{name: _json_value(box[name]) for name in names} for box in bounding_boxes]
+        info["box_labels"] = bounding_box_labels or {}
+    if segmentation_labels is not None:
+        info["segmentation_labels"] = segmentation_labels
+    members["json"] = json.dumps(info).encode("utf-8")
+    return members
+
+class TarShardWriter:
+    """
+    Appends samples to `defects-<first frame>.tar` shards in frame order, whatever order they are added
+    in from the encoder threads. A shard is closed once it holds `max_samples` samples or the next sample
+    would grow it past `max_bytes`. Shards are written as `.partial` and renamed when closed, next to a
+    `.idx.json` index with the data offset and size of every member, so a sample can be read with one
+    seek. Closed shards are appended to `tar_shards_<first frame>.jsonl`, readers can pick them up from
+    there while the run is still going. `on_finalized` is called with the last frame of every closed shard.
+    """
+    def __init__(self, output_dir: str, first_frame: int, max_samples: int = 1000, max_bytes: int = 1 << 30, frame_padding: int = 4,
+                 on_finalized: Optional[Callable[[int], None]] = None) -> None:
+        self.output_dir = output_dir
+        self.max_samples = max(1, max_samples)
+        self.max_bytes = max_bytes
+        self.frame_padding = frame_padding
+        self.on_finalized = on_finalized
+        self.shards = 0
+        self.samples = 0
+        self.list_path = os.path.join(output_dir, SHARD_LIST.format(first=first_frame))
+        self._first_frame = first_frame
+        self._next_frame = first_frame
+        # First frame that failed, no frame from there on is reported as finalized
+        self._missing = None
+        # Samples that arrived before an earlier frame, None for skipped frames
+        self._pending: Dict[int, Optional[Dict[str, bytes]]] = {}
+        self._lock = threading.Lock()
+        self._tar = None
+        self._path = None
+        self._first = None
+        self._index: List[dict] = []
+        self._bytes = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def add(self, frame_id: int, members: Dict[str, bytes]):
+        with self._lock:
+            self._pending[frame_id] = members
+            self._drain()
+
+    def skip(self, frame_id: int, failed: bool = False):
+        """Marks a frame that has no sample, the frames after it are not held back. A failed frame stops `on_finalized`."""
+        with self._lock:
+            if failed and (self._missing is None or frame_id < self._missing):
+                self._missing = frame_id
+            self._pending[frame_id] = None
+            self._drain()
+
+    def _drain(self):
+        while self._next_frame in self._pending:
+            members = self._pending.pop(self._next_frame)
+            if members is not None:
+                self._append(self._next_frame, members)
+            self._next_frame += 1
+
+    def _open(self, frame_id: int):
+        self._first = frame_id
+        self._path = os.path.join(self.output_dir, f"{SHARD_PREFIX}-{frame_id:0{self.frame_padding}d}.tar")
+        self._tar = tarfile.open(self._path + PARTIAL_SUFFIX, "w", format=tarfile.USTAR_FORMAT)
+        self._index = []
+        self._bytes = 0
+
+    def _append(self, frame_id: int, members: Dict[str, bytes]):
+        size = sum(_member_size(data) for data in members.values())
+        if self._tar is not None and (len(self._index) >= self.max_samples or self._bytes + size > self.max_bytes):
+            self._finalize(frame_id - 1)
+        if self._tar is None:
+            self._open(frame_id)
+        key = f"{frame_id:0{self.frame_padding}d}"
+        entry = {"key": key, "frame": frame_id, "offset": self._tar.offset, "members": {}}
+        mtime = time.time()
+        for ext, data in members.items():
+            info = tarfile.TarInfo(f"{key}.{ext}")
+            info.size = len(data)
+            info.mtime = mtime
+            # USTAR members have a single header block, the data follows it
+            entry["members"][ext] = [self._tar.offset + TAR_BLOCK, len(data)]
+            self._tar.addfile(info, io.BytesIO(data))
+        self._index.append(entry)
+        self._bytes += size
+        self.samples += 1
+
+    def _finalize(self, last_frame: int):
+        self._tar.close()
+        name = os.path.basename(self._path)
+        index_path = os.path.splitext(self._path)[0] + ".idx.json"
+        with open(index_path + PARTIAL_SUFFIX, "w") as f:
+            json.dump({"shard": name, "samples": self._index}, f)
+        os.replace(index_path + PARTIAL_SUFFIX, index_path)
+        os.replace(self._path + PARTIAL_SUFFIX, self._path)
+        with open(self.list_path, "a") as f:
+            f.write(json.dumps({"shard": name, "index": os.path.basename(index_path), "first_frame": self._first,
+                                "last_frame": last_frame, "samples": len(self._index), "bytes": os.path.getsize(self._path)}) + "\n")
+        self.shards += 1
+        self._tar = None
+        if self.on_finalized is not None:
+            self.on_finalized(last_frame if self._missing is None else min(last_frame, self._missing - 1))
+
+    def close(self):
+        """Closes the last shard. Samples held back behind a frame that never arrived are still written, but not reported as finalized."""
+        with self._lock:
+            if self._pending and self._missing is None:
+                self._missing = self._next_frame
+                for frame_id in sorted(self._pending):
+                    members = self._pending.pop(frame_id)
+                    if members is not None:
+                        self._append(frame_id, members)
+                    self._next_frame = frame_id + 1
+            if self._tar is not None:
+                self._finalize(self._next_frame - 1)
+            elif self.on_finalized is not None and self._next_frame > self._first_frame and self._missing is None:
+                # Only skipped frames since the last shard
+                self.on_finalized(self._next_frame - 1)
+
+def completed_shards(output_dir: str) -> List[dict]:
+    """Shards closed so far by the runs in `output_dir`, in frame order."""
+    shards = []
+    for path in glob.glob(os.path.join(glob.escape(output_dir), SHARD_LIST.replace("{first:04d}", "*"))):
+        with open(path, "r") as f:
+            # A line can be half written while the run appends to the list
+            for line in f:
+                if line.endswith("\n"):
+                    shards.append(json.loads(line))
+    return sorted(shards, key=lambda shard: shard["first_frame"])
+
+def read_sample(shard_path: str, index: int) -> Dict[str, bytes]:
+    """Members of the index-th sample of a closed shard by extension, read through the shard index."""
+    with open(os.path.splitext(shard_path)[0] + ".idx.json", "r") as f:
+        entry = json.load(f)["samples"][index]
+    members = {}
+    with open(shard_path, "rb") as f:
+        for ext, (offset, size) in entry["members"].items():
+            f.seek(offset)
+            members[ext] = f.read(size)
+    return members
@@ -0,0 +1,153 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import carb
+import hashlib
+import json
+import math
+import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from typing import Dict, Tuple
+from .texture_catalog import CACHE_DIR, TextureCatalog, TextureSet
+
+TEXTURE_CACHE_DIR = CACHE_DIR / "textures"
+MANIFEST_NAME = "manifest.json"
+MIN_RESOLUTION = 32
+MAX_RESOLUTION = 4096
+PNG_COMPRESSION = 6
+
+def choose_resolution(render_resolution: Tuple[int, int], max_defect_size: float, view_extent: float,
+                      minimum: int = MIN_RESOLUTION, maximum: int = MAX_RESOLUTION) -> int:
+    """
+    Smallest power of two texture resolution that still has two texels per rendered pixel
+    for the largest defect, given the world size covered by the render product's width.
+    """
+    if view_extent <= 0 or max_defect_size <= 0:
+        return maximum
+    pixels = max(render_resolution) * max_defect_size / view_extent
+    resolution = 2 ** math.ceil(math.log2(max(1.0, 2.0 * pixels)))
+    return int(min(maximum, max(minimum, resolution)))
+
+def _resize(source: str, destination: str, resolution: int, is_normal: bool):
+    with Image.open(source) as image:
+        scale = resolution / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        resized = image.resize(size, Image.LANCZOS)
+    if is_normal:
+        # Filtering shortens the normals, bring them back to unit length
+        pixels = np.asarray(resized.convert("RGB"), dtype=np.float32) / 127.5 - 1.0
+        pixels /= np.maximum(np.linalg.norm(pixels, axis=-1, keepdims=True), 1e-6)
+        resized = Image.fromarray(np.round((pixels + 1.0) * 127.5).astype(np.uint8))
+    tmp_path = destination + ".tmp"
+    resized.save(tmp_path, format="PNG", compress_level=PNG_COMPRESSION)
+    os.replace(tmp_path, destination)
+
+class TextureCache:
+    """
+    Downsampled copies of the catalog textures, named by the hash of the source content and
+    the target resolution. Sources are re-hashed when their size or modification time changes.
+    """
+    def __init__(self, cache_dir: Path = TEXTURE_CACHE_DIR, num_workers: int = 4) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.num_workers = num_workers
+        self._manifest_path = self.cache_dir / MANIFEST_NAME
+        self._manifest = self._read_manifest()
+        self._lock = threading.Lock()
+        # (directory, resolution) -> (source stamps, cached catalog), avoids reading the sources again this session
+        self._prepared: Dict[tuple, Tuple[tuple, TextureCatalog]] = {}
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _content_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._manifest.get(path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._manifest[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _cached_texture(self, source: str, resolution: int, is_normal: bool) -> str:
+        with Image.open(source) as image:
+            if max(image.size) <= resolution:
+                return source
+        destination = self.cache_dir / f"{self._content_hash(source)[:20]}_{resolution}.png"
+        if destination.exists():
+            return destination.as_posix()
+        _resize(source, str(destination), resolution, is_normal)
+        return destination.as_posix()
+
+    def _prepare_set(self, texture_set: TextureSet, resolution: int) -> TextureSet:
+        return TextureSet(texture_set.stem,
+                          self._cached_texture(texture_set.diffuse, resolution, False),
+                          self._cached_texture(texture_set.normal, resolution, True),
+                          self._cached_texture(texture_set.roughness, resolution, False))
+
+    @staticmethod
+    def _source_stamps(catalog: TextureCatalog) -> tuple:
+        # Editing a texture in place leaves the folder modification time alone
+        stamps = []
+        for texture_set in catalog.texture_sets:
+            for path in (texture_set.diffuse, texture_set.normal, texture_set.roughness):
+                stat = os.stat(path)
+                stamps.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(stamps)
+
+    def prepare(self, catalog: TextureCatalog, resolution: int) -> TextureCatalog:
+        """Returns a catalog pointing to textures no larger than `resolution`, processing the missing ones in parallel."""
+        key = (catalog.directory, resolution)
+        stamps = self._source_stamps(catalog)
+        cached = self._prepared.get(key)
+        if cached is not None and cached[0] == stamps:
+            return cached[1]
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            texture_sets = list(executor.map(lambda t: self._prepare_set(t, resolution), catalog.texture_sets))
+        self._write_manifest()
+        carb.log_info(f"Prepared {len(texture_sets)} texture set(s) of {catalog.directory} at {resolution}px")
+
+        prepared = TextureCatalog(catalog.directory, catalog.mtime_ns, texture_sets, catalog.incomplete, catalog.files)
+        self._prepared[key] = (stamps, prepared)
+        return prepared
+
+_texture_cache = None
+
+def get_texture_cache() -> TextureCache:
+    global _texture_cache
+    if _texture_cache is None:
+        _texture_cache = TextureCache()
+    return _texture_cache
@@ -0,0 +1,330 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import carb
+import hashlib
+import json
+import os
+import struct
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+CATALOG_VERSION = 1
+CACHE_DIR = Path.home() / ".cache" / "omni.example.defects"
+INDEX_DIR = CACHE_DIR / "texture_index"
+
+# Diffuse, Normal and Roughness suffixes, in the order they are stored in a TextureSet
+TEXTURE_SUFFIXES = ("_D.png", "_N.png", "_R.png")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Files checked between two progress updates of a folder validation
+PROGRESS_INTERVAL = 64
+
+@dataclass(frozen=True)
+class TextureSet:
+    stem: str
+    diffuse: str
+    normal: str
+    roughness: str
+
+class TextureCatalog:
+    def __init__(self, directory: str, mtime_ns: int, texture_sets: List[TextureSet], incomplete: List[str], files: List[str]) -> None:
+        self.directory = directory
+        self.mtime_ns = mtime_ns
+        self.texture_sets = texture_sets
+        self.incomplete = incomplete
+        self.files = files
+
+    def __len__(self) -> int:
+        return len(self.texture_sets)
+
+    @property
+    def diffuse(self) -> List[str]:
+        """
+        Diffuse textures, aligned with `normal` and `roughness`
+
+        :type: List[str]
+        """
+        return [t.diffuse for t in self.texture_sets]
+
+    @property
+    def normal(self) -> List[str]:
+        """
+        Normal textures, aligned with `diffuse` and `roughness`
+
+        :type: List[str]
+        """
+        return [t.normal for t in self.texture_sets]
+
+    @property
+    def roughness(self) -> List[str]:
+        """
+        Roughness textures, aligned with `diffuse` and `normal`
+
+        :type: List[str]
+        """
+        return [t.roughness for t in self.texture_sets]
+
+    @property
+    def content_hash(self) -> str:
+        """
+        Hash of the texture sets in the order the randomizers cycle through them, with the size and
+        modification time of every file so textures edited in place change it
+
+        :type: str
+        """
+        entries = []
+        for t in self.texture_sets:
+            entry = [t.stem]
+            for path in (t.diffuse, t.normal, t.roughness):
+                try:
+                    stat = os.stat(path)
+                    entry.append([path, stat.st_size, stat.st_mtime_ns])
+                except OSError:
+                    entry.append([path, None, None])
+            entries.append(entry)
+        return hashlib.sha1(json.dumps(entries).encode("utf-8")).hexdigest()
+
+    def to_dict(self) -> dict:
+        return {
+            "version": CATALOG_VERSION,
+            "directory": self.directory,
+            "mtime_ns": self.mtime_ns,
+            "texture_sets": [[t.stem, t.diffuse, t.normal, t.roughness] for t in self.texture_sets],
+            "incomplete": self.incomplete,
+            "files": self.files
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TextureCatalog":
+        return cls(data["directory"],
+                   data["mtime_ns"],
+                   [TextureSet(*t) for t in data["texture_sets"]],
+                   data["incomplete"],
+                   data["files"])
+
+def combined_hash(catalogs: List[TextureCatalog]) -> str:
+    """Content hash of the catalogs of a run in class order, the hash of the catalog itself for a single one."""
+    if len(catalogs) == 1:
+        return catalogs[0].content_hash
+    return hashlib.sha1(json.dumps([c.content_hash for c in catalogs]).encode("utf-8")).hexdigest()
+
+# Catalogs already loaded in this session, keyed by directory
+_catalogs: Dict[str, TextureCatalog] = {}
+# Folder validations index on worker threads. Folders are scanned without the lock, it is only held to
+# read and publish session cache entries and write their index
+_catalog_lock = threading.Lock()
+
+def scan_directory(directory: str, mtime_ns: int = 0, cancel_event: threading.Event = None) -> Optional[TextureCatalog]:
+    """
+    Single pass over the directory grouping the PNG files by stem into D/N/R texture sets.
+    Returns None when `cancel_event` is set before the end.
+    """
+    files = []
+    groups = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            if not entry.name.lower().endswith(".png") or not entry.is_file():
+                continue
+            path = f"{directory}/{entry.name}"
+            files.append(path)
+            for index, suffix in enumerate(TEXTURE_SUFFIXES):
+                if entry.name.endswith(suffix):
+                    groups.setdefault(entry.name[:-len(suffix)], [None, None, None])[index] = path
+                    break
+
+    texture_sets = []
+    incomplete = []
+    for stem in sorted(groups):
+        maps = groups[stem]
+        if None in maps:
+            incomplete.append(stem)
+        else:
+            texture_sets.append(TextureSet(stem, *maps))
+    if incomplete:
+        carb.log_warn(f"Skipping {len(incomplete)} texture(s) without a full D/N/R set in {directory}: {incomplete[:5]}")
+    return TextureCatalog(directory, mtime_ns, texture_sets, incomplete, sorted(files))
+
+def _index_path(directory: str, index_dir: Path) -> Path:
+    return index_dir / (hashlib.sha1(directory.encode("utf-8")).hexdigest() + ".json")
+
+def _read_index(path: Path, directory: str, mtime_ns: int) -> Optional[TextureCatalog]:
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CATALOG_VERSION or data.get("directory") != directory or data.get("mtime_ns") != mtime_ns:
+        return None
+    return TextureCatalog.from_dict(data)
+
+def _write_index(path: Path, catalog: TextureCatalog):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(catalog.to_dict(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        carb.log_warn(f"Unable to write texture index {path}: {e}")
+
+def load_catalog(directory: str, index_dir: Path = INDEX_DIR, cancel_event: threading.Event = None) -> Optional[TextureCatalog]:
+    """
+    Returns the texture catalog of a directory. The directory is only scanned when its
+    modification time differs from the one stored in the session cache or the on-disk index.
+    Returns None when `cancel_event` is set during the scan.
+    """
+    directory = Path(directory).as_posix()
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        carb.log_error(f"Texture folder does not exist: {directory}")
+        return None
+
+    with _catalog_lock:
+        catalog = _catalogs.get(directory)
+    if catalog is not None and catalog.mtime_ns == mtime_ns:
+        return catalog
+
+    index_path = _index_path(directory, index_dir)
+    catalog = _read_index(index_path, directory, mtime_ns)
+    scanned = catalog is None
+    if scanned:
+        carb.log_info(f"Indexing texture folder: {directory}")
+        catalog = scan_directory(directory, mtime_ns, cancel_event)
+        if catalog is None:
+            return None
+    with _catalog_lock:
+        # Another thread may have published the same folder meanwhile
+        current = _catalogs.get(directory)
+        if current is not None and current.mtime_ns == mtime_ns:
+            return current
+        if scanned:
+            _write_index(index_path, catalog)
+        _catalogs[directory] = catalog
+        return catalog
+
+def read_png_size(path: str) -> Optional[Tuple[int, int]]:
+    """Width and height from the IHDR chunk of a PNG file, None when the header is not a valid PNG header."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(24)
+    except OSError:
+        return None
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+@dataclass
+class FolderValidation:
+    directory: str
+    complete: int = 0
+    incomplete: List[str] = field(default_factory=list)
+    bad_headers: List[str] = field(default_factory=list)
+    mismatched: List[str] = field(default_factory=list)
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        """
+        True when the folder has at least one usable texture set and no bad file
+
+        :type: bool
+        """
+        return not self.error and self.complete > len(self.mismatched) and not self.bad_headers
+
+    def summary(self) -> str:
+        if self.error:
+            return self.error
+        return (f"{self.complete} complete set(s), {len(self.incomplete)} incomplete, "
+                f"{len(self.bad_headers)} bad header(s), {len(self.mismatched)} resolution mismatch(es)")
+
+def validate_folder(directory: str, progress_fn: Callable[[int, int], None] = None,
+                    cancel_event: threading.Event = None, index_dir: Path = INDEX_DIR) -> Optional[FolderValidation]:
+    """
+    Indexes the folder like `load_catalog`, so the next graph build finds it in the session cache, then reads
+    the PNG header of every map of the complete sets. A set is mismatched when its maps differ in resolution.
+    Returns None when `cancel_event` is set before the end.
+    """
+    result = FolderValidation(Path(directory).as_posix())
+    if not os.path.isdir(directory):
+        result.error = f"Texture folder does not exist: {result.directory}"
+        return result
+    catalog = load_catalog(directory, index_dir=index_dir, cancel_event=cancel_event)
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    if catalog is None:
+        result.error = f"Unable to read texture folder: {result.directory}"
+        return result
+    result.complete = len(catalog)
+    result.incomplete = list(catalog.incomplete)
+    total = 3 * len(catalog)
+    checked = 0
+    for texture_set in catalog.texture_sets:
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        sizes = set()
+        for path in (texture_set.diffuse, texture_set.normal, texture_set.roughness):
+            size = read_png_size(path)
+            if size is None:
+                result.bad_headers.append(path)
+            else:
+                sizes.add(size)
+        if len(sizes) > 1:
+            result.mismatched.append(texture_set.stem)
+        checked += 3
+        if progress_fn is not None and checked % (3 * PROGRESS_INTERVAL) == 0:
+            progress_fn(checked, total)
+    if progress_fn is not None:
+        progress_fn(total, total)
+    if not catalog.texture_sets:
+        result.error = f"No complete _D/_N/_R texture sets found in {result.directory}"
+    return result
+
+class FolderValidationTask:
+    """Runs `validate_folder` on a worker thread, the progress and result are read from any thread."""
+    def __init__(self, directory: str, index_dir: Path = INDEX_DIR) -> None:
+        self.directory = directory
+        self.checked = 0
+        self.total = 0
+        self.result: Optional[FolderValidation] = None
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self._work, args=(index_dir,), daemon=True)
+        self._thread.start()
+
+    @property
+    def done(self) -> bool:
+        """
+        True once the validation finished or was cancelled
+
+        :type: bool
+        """
+        return not self._thread.is_alive()
+
+    def _progress(self, checked: int, total: int):
+        self.checked = checked
+        self.total = total
+
+    def _work(self, index_dir: Path):
+        try:
+            self.result = validate_folder(self.directory, self._progress, self._cancel_event, index_dir)
+        except OSError as e:
+            self.result = FolderValidation(Path(self.directory).as_posix(), error=f"Unable to read texture folder: {e}")
+
+    def cancel(self):
+        self._cancel_event.set()
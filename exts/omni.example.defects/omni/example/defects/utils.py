@@ -16,12 +16,14 @@
 import omni.usd
 import carb
 import omni.kit.commands
-import os
+import re
+from pxr import Usd
+from typing import List, Sequence
+from .stage_cache import get_stage_cache
+from .texture_catalog import load_catalog
 
 def get_current_stage():
-    context = omni.usd.get_context()
-    stage = context.get_stage()
-    return stage
+    return get_stage_cache().stage
 
 def check_path(path: str) -> bool:
     if not path:
@@ -46,15 +48,26 @@ def get_prim_attr(prim_path: str, attr_name: str):
     return prim.GetAttribute(attr_name).Get()
 
 def get_textures(dir_path, png_type=".png"):
-    textures = []
-    dir_path += "/"
-    for file in os.listdir(dir_path):
-        if file.endswith(png_type):
-            textures.append(dir_path + file)
-    return textures
+    catalog = load_catalog(dir_path)
+    if catalog is None:
+        return []
+    return [file for file in catalog.files if file.endswith(png_type)]
+
+def find_prims(path_pattern: str, exclude: Sequence[str] = (), stage: Usd.Stage = None) -> List[str]:
+    """Paths of the prims matching a regular expression, the descendants of a matching prim are not visited."""
+    regex = re.compile(path_pattern)
+    paths = []
+    stage = stage or get_current_stage()
+    prims = iter(Usd.PrimRange(stage.GetPseudoRoot()))
+    for prim in prims:
+        path = str(prim.GetPath())
+        if path in exclude:
+            prims.PruneChildren()
+        elif regex.match(path):
+            paths.append(path)
+            prims.PruneChildren()
+    return paths
 
 def get_prim(prim_path: str):
-    stage = get_current_stage()
-    prim = stage.GetPrimAtPath(prim_path)
-    return prim
+    return get_stage_cache().get_prim(prim_path)
 
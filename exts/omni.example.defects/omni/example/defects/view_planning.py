@@ -0,0 +1,135 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+from .placement import PlacementPlan
+
+# Random stream of the camera views, kept apart from the placement stream of the same seed
+VIEW_STREAM = 1
+# Points closer to the camera than this are treated as behind it
+NEAR_CLIP = 1.0
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+def _orthonormal_basis(axis: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    axis = _normalize(np.asarray(axis, dtype=np.float64))
+    helper = np.array([1.0, 0.0, 0.0]) if abs(axis[0]) < 0.9 else np.array([0.0, 1.0, 0.0])
+    tangent = _normalize(np.cross(axis, helper))
+    return tangent, np.cross(axis, tangent), axis
+
+def hemisphere_directions(n: int, rng: np.random.Generator, axis: Sequence[float],
+                          min_elevation: float = 0.0, max_elevation: float = 90.0) -> np.ndarray:
+    """Unit vectors uniformly distributed over the band of the hemisphere around `axis` between two elevations in degrees."""
+    # Uniform heights on the axis give uniform areas on the sphere
+    height = rng.uniform(math.sin(math.radians(min_elevation)), math.sin(math.radians(max_elevation)), n)
+    azimuth = rng.uniform(0.0, 2.0 * math.pi, n)
+    radius = np.sqrt(np.maximum(0.0, 1.0 - height ** 2))
+    tangent, bitangent, axis = _orthonormal_basis(axis)
+    return ((radius * np.cos(azimuth))[:, None] * tangent
+            + (radius * np.sin(azimuth))[:, None] * bitangent
+            + height[:, None] * axis)
+
+def look_at(eyes: np.ndarray, target: Sequence[float], up: Sequence[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Forward, right and up vectors of cameras at `eyes` looking at `target`."""
+    forward = _normalize(np.asarray(target, dtype=np.float64) - eyes)
+    up = np.broadcast_to(np.asarray(up, dtype=np.float64), forward.shape)
+    right = np.cross(forward, up)
+    # Cameras looking straight along the up axis take any perpendicular right vector
+    degenerate = np.linalg.norm(right, axis=1) < 1e-9
+    if degenerate.any():
+        right[degenerate] = np.cross(forward[degenerate], _orthonormal_basis(up[0])[0])
+    right = _normalize(right)
+    return forward, right, np.cross(right, forward)
+
+def projected_pixel_areas(eyes: np.ndarray, forward: np.ndarray, right: np.ndarray, up: np.ndarray,
+                          points: np.ndarray, normals: np.ndarray, areas: np.ndarray,
+                          hfov: float, resolution: Sequence[int]) -> np.ndarray:
+    """
+    Approximate pinhole projection of small planar patches, one camera per patch. Returns the pixel
+    area of each patch, 0 when its center is behind the camera, outside the image or facing away.
+    """
+    width, height = resolution
+    focal = 0.5 * width / math.tan(0.5 * hfov)
+    offsets = points - eyes
+    depth = np.einsum("ij,ij->i", offsets, forward)
+    safe_depth = np.maximum(depth, NEAR_CLIP)
+    x = 0.5 * width + focal * np.einsum("ij,ij->i", offsets, right) / safe_depth
+    y = 0.5 * height - focal * np.einsum("ij,ij->i", offsets, up) / safe_depth
+    distance_sq = np.einsum("ij,ij->i", offsets, offsets)
+    # Cosine between the patch normal and the direction to the camera
+    facing = -np.einsum("ij,ij->i", offsets, normals) / np.sqrt(np.maximum(distance_sq, 1e-12))
+    visible = (depth > NEAR_CLIP) & (x >= 0) & (x < width) & (y >= 0) & (y < height) & (facing > 0)
+    return np.where(visible, areas * facing * focal ** 2 / np.maximum(distance_sq, 1e-12), 0.0)
+
+class ViewPlan:
+    """One camera position per kept frame, all looking at `center`."""
+    def __init__(self, center: Sequence[float], positions: np.ndarray, frames: np.ndarray, visible_pixels: np.ndarray, dropped: int) -> None:
+        self.center = tuple(float(v) for v in center)
+        self.positions = positions
+        # Indices of the kept frames in the placement plan the views were planned for
+        self.frames = frames
+        self.visible_pixels = visible_pixels
+        self.dropped = dropped
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def select(self, frames: np.ndarray) -> "ViewPlan":
+        """Views of the given kept frames, by position in this plan."""
+        return ViewPlan(self.center, self.positions[frames], self.frames[frames], self.visible_pixels[frames], self.dropped)
+
+    def sequence(self) -> List[tuple]:
+        """Camera positions as a list of tuples for `rep.distribution.sequence`."""
+        return [tuple(p) for p in self.positions.tolist()]
+
+def plan_views(plan: PlacementPlan, center: Sequence[float], axis: Sequence[float], distance, hfov: float, resolution: Sequence[int],
+               min_elevation: float = 20.0, max_elevation: float = 90.0, min_visible_pixels: float = 64.0,
+               max_attempts: int = 8, seed: Optional[int] = None, proxy_size: float = 100.0) -> ViewPlan:
+    """
+    Picks a camera on the hemisphere around `center` for every frame of a placement plan. Frames whose
+    defects cover fewer than `min_visible_pixels` get a new camera, up to `max_attempts` times, and
+    are dropped when no camera reaches the threshold.
+    """
+    rng = np.random.default_rng(None if seed is None else (seed, VIEW_STREAM))
+    center = np.asarray(center, dtype=np.float64)
+    count = plan.count
+    points = plan.positions.astype(np.float64)
+    normals = plan.normals.astype(np.float64)
+    areas = proxy_size ** 2 * plan.scales[:, 1].astype(np.float64) * plan.scales[:, 2]
+
+    eyes = np.zeros((plan.frames, 3))
+    visible = np.full(plan.frames, -1.0)
+    pending = np.arange(plan.frames)
+    for _ in range(max_attempts):
+        if not len(pending):
+            break
+        candidates = center + hemisphere_directions(len(pending), rng, axis, min_elevation, max_elevation) \
+            * rng.uniform(distance.min_value, distance.max_value, len(pending))[:, None]
+        forward, right, up = look_at(candidates, center, axis)
+        poses = (pending[:, None] * count + np.arange(count)).ravel()
+        pixels = projected_pixel_areas(np.repeat(candidates, count, axis=0), np.repeat(forward, count, axis=0),
+                                       np.repeat(right, count, axis=0), np.repeat(up, count, axis=0),
+                                       points[poses], normals[poses], areas[poses], hfov, resolution)
+        frame_pixels = pixels.reshape(-1, count).sum(axis=1)
+        better = frame_pixels > visible[pending]
+        eyes[pending[better]] = candidates[better]
+        visible[pending[better]] = frame_pixels[better]
+        pending = pending[visible[pending] < min_visible_pixels]
+
+    kept = np.flatnonzero(visible >= min_visible_pixels)
+    return ViewPlan(center, eyes[kept], kept, visible[kept], plan.frames - len(kept))
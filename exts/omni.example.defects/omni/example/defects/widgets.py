@@ -15,16 +15,23 @@
 
 import omni.ui as ui
 from omni.kit.window.file_importer import get_file_importer
-from typing import List
+from typing import List, Optional
+from .texture_catalog import FolderValidationTask
 import carb
+import omni.kit.app
 import omni.usd
 
 class CustomDirectory:
-    def __init__(self, label: str, tooltip: str = "", default_dir: str = "", file_types: List[str] = None) -> None:
+    def __init__(self, label: str, tooltip: str = "", default_dir: str = "", file_types: List[str] = None,
+                 validate_textures: bool = False) -> None:
         self._label_text = label
         self._tooltip = tooltip
         self._file_types = file_types
         self._dir = ui.SimpleStringModel(default_dir)
+        self._validate_textures = validate_textures
+        self._validation: Optional[FolderValidationTask] = None
+        self._validation_label = None
+        self._update_sub = None
         self._build_directory()
 
     @property
@@ -39,8 +46,41 @@ class CustomDirectory:
     def _build_directory(self):
         with ui.HStack(height=0, tooltip=self._tooltip):
             ui.Label(self._label_text)
-            ui.StringField(model=self._dir)
+            field = ui.StringField(model=self._dir)
             ui.Button("Open", width=0, style={"padding": 5}, clicked_fn=self._pick_directory)
+        if self._validate_textures:
+            self._validation_label = ui.Label("", height=0, word_wrap=True)
+            field.model.add_end_edit_fn(lambda _: self.validate())
+
+    def validate(self):
+        """Checks the D/N/R sets of the folder on a worker thread, the label below the field shows the progress."""
+        if not self._validate_textures:
+            return
+        if self._validation is not None:
+            self._validation.cancel()
+        self._validation = FolderValidationTask(self.directory)
+        self._validation_label.text = "Checking textures..."
+        if self._update_sub is None:
+            self._update_sub = omni.kit.app.get_app().get_update_event_stream().create_subscription_to_pop(
+                self._on_update, name="Defects texture folder validation")
+
+    def _on_update(self, event):
+        task = self._validation
+        if task is None or self._validation_label is None:
+            self._update_sub = None
+            return
+        if not task.done:
+            if task.total:
+                self._validation_label.text = f"Checking textures... {task.checked}/{task.total} files"
+            return
+        self._update_sub = None
+        self._validation = None
+        if task.result is None:
+            return
+        self._validation_label.text = task.result.summary()
+        self._validation_label.style = {"color": 0xFFDDDDDD if task.result.ok else 0xFF4444DD}
+        if not task.result.ok:
+            carb.log_warn(f"Texture folder {task.result.directory}: {task.result.summary()}")
 
     def _pick_directory(self):
         file_importer = get_file_importer()
@@ -55,8 +95,14 @@ class CustomDirectory:
 
     def import_handler(self, filename: str, dirname: str, selections: List[str] = []):
         self._dir.set_value(dirname)
+        self.validate()
 
     def destroy(self):
+        if self._validation is not None:
+            self._validation.cancel()
+            self._validation = None
+        self._update_sub = None
+        self._validation_label = None
         self._dir = None
 
 class MinMaxWidget:
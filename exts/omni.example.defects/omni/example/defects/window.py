@@ -14,28 +14,88 @@
 # limitations under the License.
 
 import carb
+import time
+import omni.kit.app
 import omni.ui as ui
 from omni.ui import DockPreference
 from .style import *
 from .widgets import CustomDirectory
-from .replicator_defect import create_defect_layer, rep_preview, does_defect_layer_exist, rep_run, get_defect_layer
+from .replicator_defect import create_defect_layer, rep_preview, does_defect_layer_exist, rep_run, sync_defect_layer, get_build_timer, remove_replicator_graph
+from .instrumentation import get_active_metrics
 from .rep_widgets import DefectParameters, ObjectParameters
+from .params import CameraConfig, ReplicatorConfig, SubframeConfig, WriterConfig
+from .profiles import PROFILES, get_profile, profile_label
 from .utils import *
 from pathlib import Path
 
+# Seconds between refreshes of the run statistics
+STATS_INTERVAL = 0.5
+
 class DefectsWindow(ui.Window):
     def __init__(self, title: str, dockPreference: DockPreference = DockPreference.DISABLED, **kwargs) -> None:
         super().__init__(title, dockPreference, **kwargs)
         # Models
         self.frames = ui.SimpleIntModel(1, min=1)
         self.rt_subframes = ui.SimpleIntModel(1, min=1)
+        self.seed = ui.SimpleIntModel(0, min=-1)
+        self.regenerate_first = ui.SimpleIntModel(0, min=0)
+        self.regenerate_last = ui.SimpleIntModel(0, min=0)
         # Widgets
         self.defect_params = None
         self.object_params = None
         self.output_dir = None
         self.frame_change = None
+        self._profile_combo = None
+        self._stats_label = None
+        self._last_stats_update = 0.0
+        self._update_sub = omni.kit.app.get_app().get_update_event_stream().create_subscription_to_pop(
+            self._on_update, name="Defects window statistics")
         self.frame.set_build_fn(self._build_frame)
 
+    def _on_update(self, event):
+        now = time.monotonic()
+        if self._stats_label is None or now - self._last_stats_update < STATS_INTERVAL:
+            return
+        self._last_stats_update = now
+
+        lines = []
+        timer = get_build_timer()
+        if timer is not None:
+            lines.append(f"Graph build: {timer.total * 1000:.1f} ms")
+        metrics = get_active_metrics()
+        if metrics is not None:
+            summary = metrics.summary()
+            line = f"Frames: {summary['frames']}  |  {summary['fps']:.2f} fps  |  queue {summary['queue_depth']}"
+            if summary["duplicates"]:
+                line += f"  |  {summary['duplicates']} near-duplicate(s)"
+            lines.append(line)
+            lines.append(f"Randomize {summary['randomize_ms']:.1f} ms  |  Render {summary['render_ms']:.1f} ms  |  Write {summary['write_ms']:.1f} ms")
+        self._stats_label.text = "\n".join(lines)
+
+    @property
+    def profile_name(self) -> str:
+        """
+        Generation profile picked in the window, empty when none is picked or its settings were edited since
+
+        :type: str
+        """
+        index = self._profile_combo.model.get_item_value_model().as_int if self._profile_combo else 0
+        if index == 0:
+            return ""
+        profile = get_profile(list(PROFILES)[index - 1])
+        if (self._use_seg.as_bool, self._use_bb.as_bool, self.rt_subframes.as_int) != (profile.use_seg, profile.use_bb, profile.rt_subframes):
+            return ""
+        return profile.name
+
+    def _on_profile_changed(self, model, item):
+        index = model.get_item_value_model().as_int
+        if index == 0:
+            return
+        profile = get_profile(list(PROFILES)[index - 1])
+        self._use_seg.set_value(profile.use_seg)
+        self._use_bb.set_value(profile.use_bb)
+        self.rt_subframes.set_value(profile.rt_subframes)
+
     def _build_collapse_base(self, label: str, collapsed: bool = False):
         v_stack = None
         with ui.CollapsableFrame(label, height=0, collapsed=collapsed):
@@ -65,38 +125,43 @@ class DefectsWindow(ui.Window):
             if does_defect_layer_exist():
                 rep_preview()
             else:
-                create_defect_layer(self.defect_params, self.object_params)
+                create_defect_layer(self.defect_params.to_config(), self.object_params.to_config())
                 self.rep_layer_button.text = "Recreate Replicator Graph"
-        
-        def remove_replicator_graph():
-            if get_defect_layer() is not None:
-                layer, pos = get_defect_layer()
-                omni.kit.commands.execute('RemoveSublayer',
-                    layer_identifier=layer.identifier,
-                    sublayer_position=pos)
-                if is_valid_prim('/World/Looks/ProjectPBRMaterial'):
-                    delete_prim('/World/Looks/ProjectPBRMaterial')
-                if is_valid_prim(self.object_params.target_prim.path_value + "/Projection"):
-                    delete_prim(self.object_params.target_prim.path_value + "/Projection")
-            if is_valid_prim('/Replicator'):
-                delete_prim('/Replicator')
-
-        def run_replicator():
-            remove_replicator_graph()
+
+        def run_replicator(regenerate=None):
             total_frames = self.frames.get_value_as_int()
             subframes = self.rt_subframes.get_value_as_int()
             if subframes <= 0:
                 subframes = 0
+            seed = self.seed.get_value_as_int()
+            profile_name = self.profile_name
+            profile_params = {}
+            if profile_name:
+                profile = get_profile(profile_name)
+                profile_params = {"profile": profile_name, "resolution": list(profile.resolution),
+                                  "writer": WriterConfig(png_compression=profile.png_compression)}
             if total_frames > 0:
-                create_defect_layer(self.defect_params, self.object_params, total_frames, self.output_dir.directory, subframes, self._use_seg.as_bool, self._use_bb.as_bool)
+                rep_params = ReplicatorConfig(**profile_params,
+                                              frames=total_frames,
+                                              output_dir=self.output_dir.directory,
+                                              rt_subframes=subframes,
+                                              use_seg=self._use_seg.as_bool,
+                                              use_bb=self._use_bb.as_bool,
+                                              seed=seed if seed >= 0 else None,
+                                              resume=self._resume.as_bool,
+                                              regenerate=regenerate or [],
+                                              subframes=SubframeConfig(adaptive=self._adaptive_subframes.as_bool),
+                                              camera=CameraConfig(mode="planned" if self._plan_views.as_bool else "fixed"))
+                sync_defect_layer(self.defect_params.to_config(), self.object_params.to_config(), rep_params)
                 self.rep_layer_button.text = "Recreate Replicator Graph"
                 rep_run()
             else:
                 carb.log_error(f"Number of frames is {total_frames}. Input value needs to be greater than 0.")
         
         def create_replicator_graph():
+            # Always a full rebuild, only Preview and Run update the graph in place
             remove_replicator_graph()
-            create_defect_layer(self.defect_params, self.object_params)
+            create_defect_layer(self.defect_params.to_config(), self.object_params.to_config())
             self.rep_layer_button.text = "Recreate Replicator Graph"
 
         def set_text(label, model):
@@ -106,6 +171,10 @@ class DefectsWindow(ui.Window):
             home_dir = Path.home()
             valid_out_dir = home_dir / "omni.replicator_out"
             self.output_dir = CustomDirectory("Output Directory", default_dir=str(valid_out_dir.as_posix()), tooltip="Directory to specify where the output files will be stored. Default is [DRIVE/Users/USER/omni.replicator_out]")
+            with ui.HStack(height=0, tooltip="Sets the resolution, annotators, subframes and PNG compression together. The fps is measured on earlier runs of the profile"):
+                ui.Label("Profile: ", width=0)
+                ui.Spacer(width=ui.Fraction(0.25))
+                self._profile_combo = ui.ComboBox(0, "custom", *[profile_label(name) for name in PROFILES])
             with ui.HStack(height=0, tooltip="Check off which annotator you want to use; You can also use both"):
                 ui.Label("Annotations: ", width=0)
                 ui.Spacer()
@@ -114,11 +183,23 @@ class DefectsWindow(ui.Window):
                 ui.Label("Bounding Box", width=0)
                 self._use_bb = ui.CheckBox().model
                 ui.Spacer()
+            with ui.HStack(height=0, tooltip="Pick a camera per frame around the target and skip frames where the defects are barely visible. Requires Plan Defect Placement"):
+                ui.Label("Plan Camera Views", width=0)
+                ui.Spacer()
+                self._plan_views = ui.CheckBox().model
             with ui.HStack(height=0):
                 ui.Label("Render Subframe Count: ", width=0,
                          tooltip="Defines how many subframes of rendering occur before going to the next frame")
                 ui.Spacer(width=ui.Fraction(0.25))
                 ui.IntField(model=self.rt_subframes)
+                ui.Label("Adaptive", width=0,
+                         tooltip="Stop rendering subframes once the frame converged, the count above is the maximum")
+                self._adaptive_subframes = ui.CheckBox(width=0).model
+            with ui.HStack(height=0, tooltip="Seed of the randomization, stored in the run manifest. -1 leaves the run unseeded"):
+                ui.Label("Seed: ", width=0)
+                ui.Spacer(width=ui.Fraction(0.25))
+                ui.IntField(model=self.seed)
+            self._profile_combo.model.add_item_changed_fn(self._on_profile_changed)
             self.rep_layer_button = ui.Button("Create Replicator Layer", 
                                               clicked_fn=lambda: create_replicator_graph(), 
                                               tooltip="Creates/Recreates the Replicator Graph, based on the current Defect Parameters")
@@ -134,9 +215,28 @@ class DefectsWindow(ui.Window):
                     self.frame_change = ui.StringField(model=self.frames)
                     self.frame_change_cb = self.frame_change.model.add_value_changed_fn(lambda m, l=l: set_text(l, m))
                 ui.Label("frame(s)")
+            with ui.HStack(height=0, tooltip="Continue the run from the checkpoint in the Output Directory instead of starting again from the first frame"):
+                ui.Label("Resume from Checkpoint", width=0)
+                ui.Spacer()
+                self._resume = ui.CheckBox().model
+            with ui.HStack(height=0, tooltip="Render frames first to last of the run in the Output Directory again, into a regenerated_<first>_<last> folder"):
+                ui.Button("Regenerate", width=0,
+                          clicked_fn=lambda: run_replicator([self.regenerate_first.get_value_as_int(), self.regenerate_last.get_value_as_int()]))
+                ui.Label("frames", width=0)
+                ui.IntField(model=self.regenerate_first)
+                ui.Label("to", width=0)
+                ui.IntField(model=self.regenerate_last)
+            self._stats_label = ui.Label("", height=0, word_wrap=True,
+                                         tooltip="Timings of the last graph build and of the current or last run")
 
     def destroy(self) -> None:
+        self._update_sub = None
+        self._profile_combo = None
+        self._stats_label = None
         self.frames = None
+        self.seed = None
+        self.regenerate_first = None
+        self.regenerate_last = None
         self.defect_semantic = None
         if self.frame_change is not None:
             self.frame_change.model.remove_value_changed_fn(self.frame_change_cb)
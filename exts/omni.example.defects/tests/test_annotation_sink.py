@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import numpy as np
+import pytest
+from omni.example.defects.annotation_sink import AnnotationSink, read_record, rle_encode
+from omni.example.defects.frame_encoder import FrameEncoder
+
+BOX_DTYPE = [("semanticId", "<u4"), ("x_min", "<i4"), ("y_min", "<i4"), ("x_max", "<i4"), ("y_max", "<i4"), ("occlusionRatio", "<f4")]
+BOX_LABELS = {"1": {"class": "scratch_mesh"}, "2": {"class": "dent_mesh"}}
+
+def _boxes(frame_id: int) -> np.ndarray:
+    return np.array([(1, frame_id, 0, frame_id + 3, 4, 0.25), (2, 0, 0, 1, 1, 0.0), (3, 5, 5, 6, 6, 0.0)], dtype=BOX_DTYPE)
+
+def _rle_decode(counts, shape) -> np.ndarray:
+    values = np.repeat(np.arange(len(counts)) % 2, counts).astype(bool)
+    return values.reshape(shape, order="F")
+
+@pytest.mark.parametrize("mask", [np.zeros((3, 4), bool), np.ones((3, 4), bool), np.eye(5, dtype=bool),
+                                  np.random.default_rng(0).random((16, 9)) > 0.5])
+def test_rle_round_trip(mask):
+    counts = rle_encode(mask)
+    assert sum(counts) == mask.size
+    assert (_rle_decode(counts, mask.shape) == mask).all()
+
+def test_records_are_indexed_by_frame(tmp_path):
+    sink = AnnotationSink(str(tmp_path), ["scratch_mesh", "dent_mesh"], name="annotations_0010", chunk_size=3, first_frame=10)
+    # Added out of order from several encoder threads, frame 12 was dropped
+    for frame_id in (11, 13, 10, 15, 14):
+        sink.add(frame_id, sink.encode(frame_id, 64, 32, boxes=_boxes(frame_id), box_labels=BOX_LABELS))
+    sink.skip(12)
+    assert not os.path.exists(sink.jsonl_path)
+    sink.finalize()
+    assert sink.records == 5
+    with open(sink.jsonl_path) as f:
+        assert [json.loads(line)["frame"] for line in f] == [10, 11, 13, 14, 15]
+    for frame_id in (10, 11, 13, 14, 15):
+        record = read_record(sink.jsonl_path, frame_id)
+        assert record["frame"] == frame_id
+        assert [box["label"] for box in record["boxes"]] == ["scratch_mesh", "dent_mesh"]
+        assert record["boxes"][0] == {"label": "scratch_mesh", "bbox": [frame_id, 0, frame_id + 3, 4], "occlusion": 0.25}
+    for frame_id in (9, 12, 16):
+        with pytest.raises(IndexError):
+            read_record(sink.jsonl_path, frame_id)
+
+def test_finalize_writes_records_behind_a_missing_frame(tmp_path):
+    sink = AnnotationSink(str(tmp_path), "scratch_mesh", first_frame=0)
+    sink.add_frame(0, 8, 8)
+    sink.add_frame(2, 8, 8)
+    sink.finalize()
+    assert read_record(sink.jsonl_path, 2)["frame"] == 2
+    with pytest.raises(IndexError):
+        read_record(sink.jsonl_path, 1)
+
+def test_masks_and_coco(tmp_path):
+    segmentation = np.zeros((6, 8), dtype=np.uint32)
+    segmentation[1:3, 2:5] = 4
+    sink = AnnotationSink(str(tmp_path), "scratch_mesh", coco=True)
+    sink.add_frame(0, 8, 6, boxes=_boxes(0), box_labels=BOX_LABELS,
+                   segmentation=segmentation, segmentation_labels={"0": "BACKGROUND", "4": "scratch_mesh"})
+    sink.finalize()
+    mask = read_record(sink.jsonl_path, 0)["masks"][0]
+    assert mask["bbox"] == [2, 1, 4, 2] and mask["area"] == 6
+    assert (_rle_decode(mask["counts"], mask["size"]) == (segmentation == 4)).all()
+    with open(sink.coco_path) as f:
+        coco = json.load(f)
+    assert coco["categories"] == [{"id": 1, "name": "scratch_mesh"}]
+    assert [a["iscrowd"] for a in coco["annotations"]] == [0, 1]
+    assert coco["annotations"][0]["bbox"] == [0, 0, 4, 5]
+
+def test_a_run_without_records_leaves_no_files(tmp_path):
+    AnnotationSink(str(tmp_path), "scratch_mesh").finalize()
+    assert os.listdir(tmp_path) == []
+
+def test_encoder_streams_records(tmp_path):
+    sink = AnnotationSink(str(tmp_path), "scratch_mesh", name="annotations_0000", chunk_size=4)
+    reported = []
+    encoder = FrameEncoder(str(tmp_path), num_workers=4, sink=sink, on_written=reported.append)
+    for frame_id in range(20):
+        if frame_id == 7:
+            encoder.skip(frame_id)
+            continue
+        encoder.submit(frame_id, rgb=np.zeros((4, 6, 4), dtype=np.uint8), bounding_boxes=_boxes(frame_id), bounding_box_labels=BOX_LABELS)
+    encoder.close()
+    sink.finalize()
+    assert not encoder.errors
+    assert encoder.written_through == 19
+    assert sink.records == 19
+    record = read_record(sink.jsonl_path, 12)
+    assert (record["frame"], record["width"], record["height"]) == (12, 6, 4)
+    with pytest.raises(IndexError):
+        read_record(sink.jsonl_path, 7)
@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import threading
+from omni.example.defects import checkpoint as checkpoint_module
+from omni.example.defects.checkpoint import CHECKPOINT_FILE, Checkpoint, read_checkpoint
+
+def test_round_trip(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path), 7, "abc", 100, 200, last_frame=149)
+    checkpoint.write()
+    loaded = read_checkpoint(str(tmp_path))
+    assert (loaded.seed, loaded.params_hash, loaded.first_frame, loaded.end_frame, loaded.last_frame) == (7, "abc", 100, 200, 149)
+    assert loaded.next_frame == 150 and not loaded.complete
+    assert loaded.mismatch(7, "abc", 100) is None
+    assert "seed" in loaded.mismatch(8, "abc", 100)
+    assert "parameters" in loaded.mismatch(7, "abd", 100)
+    assert "offset" in loaded.mismatch(7, "abc", 0)
+
+def test_planned_frame_count_must_match(tmp_path):
+    Checkpoint(str(tmp_path), 7, "abc", 0, 10, frames=10).write()
+    loaded = read_checkpoint(str(tmp_path))
+    assert loaded.frames == 10
+    assert loaded.mismatch(7, "abc", 0) is None
+    assert loaded.mismatch(7, "abc", 0, 10) is None
+    assert "frame(s)" in loaded.mismatch(7, "abc", 0, 12)
+
+def test_unreadable_checkpoints_are_ignored(tmp_path):
+    assert read_checkpoint(str(tmp_path)) is None
+    (tmp_path / CHECKPOINT_FILE).write_text("{")
+    assert read_checkpoint(str(tmp_path)) is None
+
+def test_advance_is_throttled(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(checkpoint_module.time, "monotonic", lambda: now[0])
+    checkpoint = Checkpoint(str(tmp_path), None, "abc", 0, 100)
+    checkpoint.advance(3, interval=5.0)
+    assert read_checkpoint(str(tmp_path)).last_frame == 3
+    now[0] += 1.0
+    checkpoint.advance(9, interval=5.0)
+    # Older frames never move the checkpoint back
+    checkpoint.advance(5, interval=5.0)
+    assert checkpoint.last_frame == 9
+    assert read_checkpoint(str(tmp_path)).last_frame == 3
+    now[0] += 5.0
+    checkpoint.advance(10, interval=5.0)
+    assert read_checkpoint(str(tmp_path)).last_frame == 10
+
+def test_concurrent_advances(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path), 1, "abc", 0, 4000)
+    errors = []
+    def advance(frames):
+        try:
+            for frame in frames:
+                checkpoint.advance(frame, interval=0.0)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=advance, args=(range(i, 4000, 8),)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    checkpoint.write()
+    with open(tmp_path / CHECKPOINT_FILE) as f:
+        assert json.load(f)["last_frame"] == 3999
+    assert os.listdir(tmp_path) == [CHECKPOINT_FILE]
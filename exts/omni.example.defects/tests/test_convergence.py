@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import numpy as np
+import pytest
+from omni.example.defects.convergence import SubframeController, frame_change
+
+SHAPE = (32, 32, 4)
+
+def _run(controller: SubframeController, frames) -> int:
+    """Feeds subframes until the controller finishes the frame, returns the subframe it stopped at."""
+    for index, rgb in enumerate(frames, start=1):
+        if controller.update(rgb):
+            return index
+    raise AssertionError("the frame never finished")
+
+def _converging(rate: float = 0.5):
+    # Every subframe halves the remaining error of the accumulated image
+    k = 0
+    while True:
+        k += 1
+        yield np.full(SHAPE, 0.5 + 0.4 * rate ** k, dtype=np.float32)
+
+def _flickering():
+    k = 0
+    while True:
+        k += 1
+        yield np.full(SHAPE, 0.2 if k % 2 else 0.8, dtype=np.float32)
+
+def _accumulated_noise(rng: np.random.Generator, sigma: float = 40.0):
+    # Running average of noisy 8-bit samples of one image, like an RTX accumulation buffer
+    target = rng.uniform(40.0, 215.0, SHAPE)
+    total = np.zeros(SHAPE)
+    k = 0
+    while True:
+        k += 1
+        total += target + rng.normal(0.0, sigma, SHAPE)
+        yield np.clip(np.rint(total / k), 0, 255).astype(np.uint8)
+
+def test_frame_change():
+    a = np.zeros(SHAPE, dtype=np.uint8)
+    b = a.copy()
+    b[..., 1] = 2
+    # Alpha is ignored
+    b[..., 3] = 255
+    assert frame_change(a, b) == pytest.approx(2 / 255)
+    c = np.zeros(SHAPE, dtype=np.float32)
+    c[:1, :3, 0] = 0.5
+    # 3 of 1024 pixels changed, below the 0.99 quantile but above the 0.999 one
+    assert frame_change(np.zeros(SHAPE, dtype=np.float32), c) == 0.0
+    assert frame_change(np.zeros(SHAPE, dtype=np.float32), c, quantile=0.999) > 0.0
+
+def test_converging_frame_stops_below_the_tolerance():
+    controller = SubframeController(max_subframes=64, tolerance=0.008)
+    # The change 0.4 * 0.5^k first drops below 0.008 at k = 6
+    assert _run(controller, _converging()) == 6
+    assert controller.last_change == pytest.approx(0.4 * 0.5 ** 6, abs=1e-6)
+    assert controller.spent == [6]
+    assert controller.summary() == {"frames": 1, "mean_subframes": 6.0, "capped": 0}
+
+def test_looser_tolerance_stops_earlier():
+    assert _run(SubframeController(64, tolerance=0.05), _converging()) == 4
+    assert _run(SubframeController(64, tolerance=0.001), _converging()) == 9
+
+def test_non_converging_frame_is_capped():
+    controller = SubframeController(max_subframes=12, tolerance=0.008)
+    assert _run(controller, _flickering()) == 12
+    assert controller.summary()["capped"] == 1
+
+def test_small_flickering_highlight_keeps_the_frame_going():
+    # 2% of the pixels keep changing, above the 1% the 0.99 quantile ignores
+    def highlight():
+        k = 0
+        while True:
+            k += 1
+            rgb = np.full(SHAPE, 0.5, dtype=np.float32)
+            rgb[:, :1] = 0.2 if k % 2 else 0.8
+            yield rgb
+    assert _run(SubframeController(16, quantile=0.99), highlight()) == 16
+    assert _run(SubframeController(16, quantile=0.5), highlight()) == 2
+
+@pytest.mark.parametrize("min_subframes", [1, 4, 10])
+def test_min_subframes_are_respected(min_subframes):
+    static = itertools.repeat(np.full(SHAPE, 0.5, dtype=np.float32))
+    # A static frame converges at the second subframe, the first comparison
+    assert _run(SubframeController(32, min_subframes=min_subframes), static) == max(2, min_subframes)
+
+def test_min_subframes_are_capped_by_the_maximum():
+    controller = SubframeController(max_subframes=5, min_subframes=50)
+    assert controller.min_subframes == 5
+    assert _run(controller, _converging()) == 5
+
+def test_a_single_subframe_finishes_every_frame():
+    controller = SubframeController(max_subframes=0)
+    assert controller.max_subframes == 1
+    assert controller.update(np.zeros(SHAPE, dtype=np.uint8))
+    assert controller.update(np.zeros(SHAPE, dtype=np.uint8))
+    assert controller.spent == [1, 1]
+
+def test_frames_without_rgb_get_the_maximum():
+    controller = SubframeController(max_subframes=7)
+    assert _run(controller, itertools.repeat(None)) == 7
+
+@pytest.mark.parametrize("seed", range(5))
+def test_noisy_accumulation_converges_between_the_bounds(seed):
+    controller = SubframeController(max_subframes=256, tolerance=2 / 255, min_subframes=4)
+    spent = _run(controller, _accumulated_noise(np.random.default_rng(seed)))
+    # The change of a running average of sigma 40 noise shrinks like 40 / k levels, its 0.99 quantile
+    # drops below 2 levels after roughly a hundred subframes
+    assert 40 <= spent <= 150
+    # Below half a level the 8-bit rounding keeps the frame changing until the cap
+    tight = SubframeController(256, tolerance=0.5 / 255, min_subframes=4)
+    assert _run(tight, _accumulated_noise(np.random.default_rng(seed))) == 256
+    assert tight.summary()["capped"] == 1
+
+def test_every_frame_starts_over():
+    controller = SubframeController(max_subframes=64, tolerance=0.008)
+    assert [_run(controller, _converging()) for _ in range(3)] == [6, 6, 6]
+    assert controller.subframes == 0
+    assert controller.spent == [6, 6, 6]
+
+def test_buffers_reused_between_subframes_are_copied():
+    controller = SubframeController(max_subframes=8, tolerance=0.008)
+    buffer = np.full(SHAPE, 0.1, dtype=np.float32)
+    assert not controller.update(buffer)
+    # Replicator writes the next subframe into the same buffer
+    buffer[:] = 0.9
+    assert not controller.update(buffer)
+    assert controller.last_change == pytest.approx(0.8, abs=1e-6)
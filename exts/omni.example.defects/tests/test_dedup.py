@@ -0,0 +1,36 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+from omni.example.defects.dedup import FrameDeduplicator
+from omni.example.defects.frame_encoder import FrameEncoder
+
+def _rgb(frame_id: int) -> np.ndarray:
+    return np.random.default_rng(frame_id).integers(0, 255, (16, 16, 4), dtype=np.uint8)
+
+def test_a_failed_hand_off_does_not_hold_back_later_frames(tmp_path):
+    encoder = FrameEncoder(str(tmp_path), num_workers=2)
+    def on_kept(frame_id, rgb, boxes, payload):
+        if frame_id == 1:
+            raise RuntimeError("encoder queue closed")
+        encoder.submit(frame_id, rgb=rgb)
+    dedup = FrameDeduplicator(str(tmp_path), 0, on_kept, encoder.skip, mode="flag")
+    for frame_id in range(4):
+        dedup.submit(frame_id, _rgb(frame_id), None, {})
+    dedup.close()
+    encoder.close()
+    assert encoder.written_through == 3
+    assert dedup.errors == ["Frame 1 was not written: encoder queue closed"]
+    assert not (tmp_path / "rgb_0001.png").exists()
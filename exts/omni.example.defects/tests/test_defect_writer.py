@@ -0,0 +1,42 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+from omni.example.defects.defect_writer import DefectWriter
+from omni.example.defects.instrumentation import get_active_metrics
+
+def _frame() -> dict:
+    return {"rgb": np.zeros((4, 4, 4), dtype=np.uint8)}
+
+def test_active_metrics_are_reset_when_the_run_ends(tmp_path):
+    writer = DefectWriter(str(tmp_path))
+    writer.write(_frame())
+    metrics = get_active_metrics()
+    assert metrics is not None
+    writer.write(_frame())
+    writer.on_final_frame()
+    assert get_active_metrics() is None
+    assert metrics.frames == 2
+
+def test_detach_keeps_the_metrics_of_a_newer_run(tmp_path):
+    old = DefectWriter(str(tmp_path / "old"))
+    old.write(_frame())
+    new = DefectWriter(str(tmp_path / "new"))
+    new.write(_frame())
+    current = get_active_metrics()
+    old.detach()
+    assert get_active_metrics() is current
+    new.detach()
+    assert get_active_metrics() is None
@@ -0,0 +1,135 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import random
+import threading
+import time
+import numpy as np
+from PIL import Image
+from omni.example.defects.frame_encoder import FrameEncoder
+from omni.example.defects.tar_export import TarShardWriter, completed_shards, read_sample
+
+BOX_DTYPE = [("semanticId", "<u4"), ("x_min", "<i4"), ("y_min", "<i4"), ("x_max", "<i4"), ("y_max", "<i4")]
+
+def _rgb(frame_id: int) -> np.ndarray:
+    return np.full((8, 8, 4), frame_id, dtype=np.uint8)
+
+def _boxes(frame_id: int) -> np.ndarray:
+    return np.array([(1, frame_id, 0, frame_id + 2, 2)], dtype=BOX_DTYPE)
+
+class SlowEncoder(FrameEncoder):
+    """Writes the RGB files after a random delay, so the workers finish frames out of order."""
+    def _write_png(self, name, frame_id, image):
+        time.sleep(random.uniform(0.0, 0.005))
+        super()._write_png(name, frame_id, image)
+
+def test_written_through_follows_frame_order(tmp_path):
+    random.seed(0)
+    reported = []
+    missing = []
+    def on_written(frame_id):
+        # Every frame up to the reported one has all of its files
+        missing.extend(f for f in range(frame_id + 1) if not (tmp_path / f"rgb_{f:04d}.png").exists()
+                       or not (tmp_path / f"bounding_box_2d_tight_{f:04d}.npy").exists())
+        reported.append(frame_id)
+    encoder = SlowEncoder(str(tmp_path), num_workers=4, queue_size=4, on_written=on_written)
+    for frame_id in range(40):
+        encoder.submit(frame_id, rgb=_rgb(frame_id), bounding_boxes=_boxes(frame_id), bounding_box_labels={"1": "defect"})
+    encoder.close()
+    assert not encoder.errors
+    assert not missing
+    assert reported == sorted(set(reported))
+    assert reported[-1] == encoder.written_through == 39
+    assert encoder.frames_submitted == 40
+    for frame_id in (0, 17, 39):
+        assert np.load(tmp_path / f"bounding_box_2d_tight_{frame_id:04d}.npy")[0]["x_min"] == frame_id
+    with open(tmp_path / "bounding_box_2d_tight_labels_0005.json") as f:
+        assert json.load(f) == {"1": "defect"}
+
+def test_frames_can_start_at_an_offset(tmp_path):
+    encoder = FrameEncoder(str(tmp_path), frame_padding=6)
+    for frame_id in range(100, 105):
+        encoder.submit(frame_id, rgb=_rgb(frame_id))
+    encoder.close()
+    assert encoder.written_through == 104
+    assert sorted(os.listdir(tmp_path)) == [f"rgb_{i:06d}.png" for i in range(100, 105)]
+
+def test_close_flushes_the_last_batch(tmp_path):
+    encoder = FrameEncoder(str(tmp_path), npz_batch_size=4, compress_npz=False)
+    for frame_id in range(10):
+        encoder.submit(frame_id, rgb=_rgb(frame_id), semantic_segmentation=np.full((8, 8), frame_id, dtype=np.uint32),
+                       segmentation_labels={"0": "background"}, bounding_boxes=_boxes(frame_id))
+    # Frames 8 and 9 wait for a full batch until close
+    assert not (tmp_path / "annotations_batch_0008.npz").exists()
+    encoder.close()
+    assert encoder.written_through == 9
+    assert sorted(p for p in os.listdir(tmp_path) if p.endswith(".npz")) == [f"annotations_batch_{i:04d}.npz" for i in (0, 4, 8)]
+    with np.load(tmp_path / "annotations_batch_0008.npz") as batch:
+        assert sorted(batch.files) == ["bounding_box_2d_tight_8", "bounding_box_2d_tight_9",
+                                       "semantic_segmentation_8", "semantic_segmentation_8_labels",
+                                       "semantic_segmentation_9", "semantic_segmentation_9_labels"]
+        assert int(batch["semantic_segmentation_9"][0, 0]) == 9
+
+def test_buffers_are_copied_on_submit(tmp_path):
+    gate = threading.Event()
+    class GatedEncoder(FrameEncoder):
+        def _write_png(self, name, frame_id, image):
+            gate.wait()
+            super()._write_png(name, frame_id, image)
+    encoder = GatedEncoder(str(tmp_path), num_workers=1)
+    buffer = _rgb(1)
+    encoder.submit(0, rgb=buffer)
+    # Replicator reuses the buffer for the next frame
+    buffer[:] = 200
+    gate.set()
+    encoder.close()
+    assert (np.asarray(Image.open(tmp_path / "rgb_0000.png")) == 1).all()
+
+def test_skipped_frames_do_not_hold_back_later_ones(tmp_path):
+    encoder = FrameEncoder(str(tmp_path))
+    encoder.submit(0, rgb=_rgb(0))
+    encoder.skip(1)
+    encoder.submit(2, rgb=_rgb(2))
+    encoder.close()
+    assert encoder.written_through == 2
+    assert not (tmp_path / "rgb_0001.png").exists()
+
+def test_failed_frames_stop_written_through(tmp_path):
+    class FailingEncoder(FrameEncoder):
+        def _write_png(self, name, frame_id, image):
+            if frame_id == 3:
+                raise OSError("disk full")
+            super()._write_png(name, frame_id, image)
+    encoder = FailingEncoder(str(tmp_path))
+    for frame_id in range(6):
+        encoder.submit(frame_id, rgb=_rgb(frame_id))
+    encoder.close()
+    assert encoder.errors == ["disk full"]
+    assert encoder.written_through == 2
+
+def test_close_finalizes_tar_shards(tmp_path):
+    tar = TarShardWriter(str(tmp_path), 0, max_samples=4)
+    encoder = FrameEncoder(str(tmp_path), num_workers=3, tar=tar)
+    for frame_id in range(10):
+        encoder.submit(frame_id, rgb=_rgb(frame_id), bounding_boxes=_boxes(frame_id))
+    encoder.close()
+    assert encoder.written_through == 9
+    shards = completed_shards(str(tmp_path))
+    assert [(s["first_frame"], s["last_frame"], s["samples"]) for s in shards] == [(0, 3, 4), (4, 7, 4), (8, 9, 2)]
+    sample = read_sample(str(tmp_path / shards[2]["shard"]), 1)
+    assert json.loads(sample["json"])["frame"] == 9
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".partial")]
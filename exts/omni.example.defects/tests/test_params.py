@@ -0,0 +1,125 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+import json
+import typing
+import pytest
+from omni.example.defects.params import DefectClassConfig, JobConfig, ProceduralConfig, Range, config_hash
+
+def _job() -> JobConfig:
+    job = JobConfig(stage="/tmp/scene.usd")
+    job.defect.count = 5
+    job.defect.dim_w = Range(0.2, 0.4)
+    job.defect.classes = [DefectClassConfig("scratch", 2.0, 3), DefectClassConfig("dent", 0.5, 1, rot=Range(-10.0, 10.0))]
+    job.object.targets = ["/World/A", "/World/B"]
+    job.replicator.frames = 20
+    job.replicator.seed = 7
+    job.replicator.use_seg = True
+    job.replicator.writer.compress_npz = False
+    job.replicator.subframes.tolerance = 0.01
+    job.sharding.command = ["python", "worker.py", "{job_file}"]
+    return job
+
+def test_round_trip():
+    job = _job()
+    assert JobConfig.from_dict(job.to_dict()) == job
+    assert JobConfig.from_dict(json.loads(json.dumps(job.to_dict()))) == job
+
+def test_round_trip_without_typing_introspection(monkeypatch):
+    # Python 3.7, shipped with Kit 104, has neither
+    monkeypatch.delattr(typing, "get_origin", raising=False)
+    monkeypatch.delattr(typing, "get_args", raising=False)
+    job = _job()
+    assert JobConfig.from_dict(job.to_dict()) == job
+
+def test_defaults_and_ranges_as_lists():
+    job = JobConfig.from_dict({"defect": {"dim_h": [0.3, 0.6]}})
+    assert job.defect.dim_h == Range(0.3, 0.6)
+    assert job.defect.dim_w == Range(0.1, 1.0)
+    assert job.replicator == JobConfig().replicator
+
+def test_numbers_are_converted():
+    job = JobConfig.from_dict({"defect": {"count": "4"}, "replicator": {"subframes": {"tolerance": 1}}})
+    assert job.defect.count == 4
+    assert isinstance(job.replicator.subframes.tolerance, float)
+
+@pytest.mark.parametrize("data, message", [
+    ({"defects": {}}, "Unknown JobConfig field"),
+    ({"replicator": {"frame": 3}}, "Unknown ReplicatorConfig field"),
+    ({"replicator": {"writer": {"png": 1}}}, "Unknown WriterConfig field"),
+    ({"defect": {"classes": [{"label": "dent"}]}}, "Unknown DefectClassConfig field"),
+])
+def test_unknown_fields_are_rejected(data, message):
+    with pytest.raises(ValueError, match=message):
+        JobConfig.from_dict(data)
+
+@pytest.mark.parametrize("value", ["false", "true", 0, 1, None])
+def test_bools_must_be_booleans(value):
+    with pytest.raises(ValueError, match="ReplicatorConfig.use_seg"):
+        JobConfig.from_dict({"replicator": {"use_seg": value}})
+
+@pytest.mark.parametrize("data, field_name", [
+    ({"defect": {"count": "many"}}, "DefectConfig.count"),
+    ({"replicator": {"camera": {"min_elevation": None}}}, "CameraConfig.min_elevation"),
+    ({"defect": {"classes": [{"weight": "heavy"}]}}, "DefectClassConfig.weight"),
+])
+def test_bad_numbers_name_the_field(data, field_name):
+    with pytest.raises(ValueError, match=field_name):
+        JobConfig.from_dict(data)
+
+@pytest.mark.parametrize("data, message", [
+    ({"defect": {"count": 2.7}}, "whole number for DefectConfig.count"),
+    ({"replicator": {"frames": True}}, "whole number for ReplicatorConfig.frames"),
+    ({"replicator": {"subframes": {"tolerance": False}}}, "number for SubframeConfig.tolerance"),
+    ({"replicator": {"seed": 1.5}}, "whole number for ReplicatorConfig.seed"),
+    ({"replicator": {"seed": "any"}}, "number for ReplicatorConfig.seed"),
+    ({"replicator": {"resolution": [1024, "wide"]}}, r"ReplicatorConfig.resolution\[1\]"),
+    ({"replicator": {"resolution": 1024}}, "list for ReplicatorConfig.resolution"),
+    ({"replicator": {"regenerate": [3, 4.5]}}, r"ReplicatorConfig.regenerate\[1\]"),
+    ({"object": {"targets": ["/World/A", 3]}}, r"string for ObjectConfig.targets\[1\]"),
+    ({"object": {"targets": "/World/A"}}, "list for ObjectConfig.targets"),
+    ({"defect": {"procedural": {"kinds": [None]}}}, r"ProceduralConfig.kinds\[0\]"),
+    ({"sharding": {"command": ["kit", ["--no-window"]]}}, r"ShardingConfig.command\[1\]"),
+    ({"defect": {"dim_w": [0.1, 0.2, 0.3]}}, r"\[min, max\] for Range"),
+    ({"defect": {"rot": [0, "full"]}}, "Range.max_value"),
+])
+def test_values_and_list_items_are_checked(data, message):
+    with pytest.raises(ValueError, match=message):
+        JobConfig.from_dict(data)
+
+def test_whole_floats_and_optional_values_are_accepted():
+    job = JobConfig.from_dict({"replicator": {"frames": 10.0, "seed": None, "resolution": [512.0, 256]}})
+    assert job.replicator.frames == 10 and isinstance(job.replicator.frames, int)
+    assert job.replicator.seed is None
+    assert job.replicator.resolution == [512, 256]
+    assert JobConfig.from_dict({"replicator": {"seed": "7"}}).replicator.seed == 7
+
+def test_tables_are_required():
+    with pytest.raises(ValueError, match="Expected a table for DefectConfig"):
+        JobConfig.from_dict({"defect": 3})
+    with pytest.raises(ValueError, match="Expected a list of DefectClassConfig"):
+        JobConfig.from_dict({"defect": {"classes": {"weight": 1.0}}})
+
+def test_config_hash_skips_unhashed_fields_of_classes():
+    job = _job()
+    base = config_hash(job.defect, job.object, job.replicator)
+    other = _job()
+    other.replicator.frames = 500
+    other.replicator.writer.num_workers = 16
+    other.defect.classes[1].procedural = ProceduralConfig(num_workers=1)
+    assert config_hash(other.defect, other.object, other.replicator) == base
+    other.defect.classes[1] = dataclasses.replace(other.defect.classes[1], weight=3.0)
+    assert config_hash(other.defect, other.object, other.replicator) != base
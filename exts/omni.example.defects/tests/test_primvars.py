@@ -0,0 +1,102 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import sys
+import pytest
+from recording_stub import PACKAGE_NAME
+
+# Modules importing pxr, imported again against the real pxr of usd-core
+PXR_MODULES = ("stage_cache", "utils", "primvars")
+
+def _pxr_module_names() -> list:
+    names = {f"{PACKAGE_NAME}.{name}" for name in PXR_MODULES}
+    return [name for name in sys.modules if name == "pxr" or name.startswith("pxr.") or name in names]
+
+@pytest.fixture
+def primvars():
+    """primvars.py on a real USD stage, the recording stub is put back afterwards."""
+    stubbed = {name: sys.modules.pop(name) for name in _pxr_module_names()}
+    package = sys.modules[PACKAGE_NAME]
+    attributes = {name: getattr(package, name) for name in PXR_MODULES if hasattr(package, name)}
+    try:
+        pytest.importorskip("pxr.Usd", reason="requires the usd-core package")
+        yield importlib.import_module(f"{PACKAGE_NAME}.primvars")
+    finally:
+        for name in _pxr_module_names():
+            del sys.modules[name]
+        sys.modules.update(stubbed)
+        for name in PXR_MODULES:
+            if name in attributes:
+                setattr(package, name, attributes[name])
+            elif hasattr(package, name):
+                delattr(package, name)
+
+def _stage(count: int):
+    from pxr import Usd, UsdGeom
+    stage = Usd.Stage.CreateInMemory()
+    UsdGeom.Xform.Define(stage, "/World")
+    paths = [f"/World/Part_{i}" for i in range(count)]
+    for path in paths:
+        UsdGeom.Mesh.Define(stage, path)
+    return stage, paths
+
+def _check_primvars(primvars, prim):
+    from pxr import Gf, Sdf, UsdGeom
+    api = UsdGeom.PrimvarsAPI(prim)
+    for name in primvars.PRIMVARS:
+        primvar = api.GetPrimvar(name[len("primvars:"):])
+        assert primvar.IsDefined(), f"{prim.GetPath()} {name}"
+        assert primvar.GetAttr().IsCustom()
+        assert primvar.GetTypeName() == Sdf.ValueTypeNames.Float3
+        assert primvar.GetInterpolation() == UsdGeom.Tokens.constant
+        assert primvar.Get() == Gf.Vec3f(0, 0, 0)
+
+def test_apply_primvars_to_many_prims(primvars):
+    from pxr import Gf, Tf, Usd
+    stage, paths = _stage(200)
+    # Already authored values are reset
+    stage.GetPrimAtPath(paths[3]).CreateAttribute(primvars.PRIMVARS[0], primvars.Sdf.ValueTypeNames.Float3, custom=True).Set(Gf.Vec3f(1, 2, 3))
+    notices = []
+    listener = Tf.Notice.Register(Usd.Notice.ObjectsChanged, lambda notice, sender: notices.append(notice), stage)
+    try:
+        assert primvars.apply_primvars(paths, stage=stage) == 200
+    finally:
+        listener.Revoke()
+    assert len(notices) == 1
+    for path in paths:
+        _check_primvars(primvars, stage.GetPrimAtPath(path))
+    assert not stage.GetPrimAtPath("/World").HasAttribute(primvars.PRIMVARS[0])
+
+def test_apply_primvars_in_the_edit_target(primvars):
+    from pxr import Sdf, Usd
+    stage, paths = _stage(3)
+    sublayer = Sdf.Layer.CreateAnonymous()
+    stage.GetRootLayer().subLayerPaths.append(sublayer.identifier)
+    stage.SetEditTarget(Usd.EditTarget(sublayer))
+    primvars.apply_primvars(paths, stage=stage)
+    for path in paths:
+        _check_primvars(primvars, stage.GetPrimAtPath(path))
+        assert sublayer.GetAttributeAtPath(f"{path}.{primvars.PRIMVARS[0]}") is not None
+        assert stage.GetRootLayer().GetAttributeAtPath(f"{path}.{primvars.PRIMVARS[0]}") is None
+
+def test_collect_prims(primvars):
+    from pxr import UsdGeom
+    stage, paths = _stage(12)
+    UsdGeom.Mesh.Define(stage, "/World/Assembly/Bolt")
+    UsdGeom.Xform.Define(stage, "/World/Assembly/Group")
+    found = primvars.collect_prims(["/World/Part_1", "/World/Missing"], path_pattern=r"/World/Part_1\d$",
+                                   subtrees=["/World/Assembly"], stage=stage)
+    assert found == ["/World/Part_1", "/World/Part_10", "/World/Part_11", "/World/Assembly/Bolt"]
@@ -0,0 +1,125 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+import numpy as np
+import pytest
+import omni.replicator.core as rep
+import recording_stub
+from omni.example.defects import defect_pool, replicator_defect
+from omni.example.defects.annotation_sink import read_record
+from omni.example.defects.checkpoint import Checkpoint, read_checkpoint
+from omni.example.defects.defect_writer import DefectWriter
+from omni.example.defects.manifest import MANIFEST_FILE
+from omni.example.defects.params import SCRATCHES_DIR, DefectConfig, ObjectConfig, ReplicatorConfig, config_hash
+from omni.example.defects.texture_catalog import load_catalog
+
+TARGET_PATH = "/World/Target"
+BOX_DTYPE = [("semanticId", "<u4"), ("x_min", "<i4"), ("y_min", "<i4"), ("x_max", "<i4"), ("y_max", "<i4"), ("occlusionRatio", "<f4")]
+
+class _RegisteredWriter(DefectWriter):
+    # Like the writers of Replicator's registry, constructed by initialize
+    def __init__(self) -> None:
+        pass
+
+    def initialize(self, **kwargs):
+        DefectWriter.__init__(self, **kwargs)
+
+@pytest.fixture
+def stage(tmp_path, monkeypatch):
+    # Keep the bundled folder's index out of the user cache
+    load_catalog(str(SCRATCHES_DIR), index_dir=tmp_path / "index")
+    recording_stub.new_stage(TARGET_PATH)
+    defect_pool.clear_pools()
+    monkeypatch.setattr(rep.WriterRegistry, "get", lambda name: _RegisteredWriter())
+    yield recording_stub.context.stage
+    replicator_defect.remove_replicator_graph()
+
+def _rep_params(output_dir, frames: int) -> ReplicatorConfig:
+    rep_params = ReplicatorConfig(frames=frames, output_dir=str(output_dir))
+    rep_params.writer.annotations = "jsonl"
+    return rep_params
+
+def _run(rep_params: ReplicatorConfig):
+    """Runs the graph like the Run button, with the orchestrator's frames handed to the writer."""
+    replicator_defect.sync_defect_layer(DefectConfig(texture_resolution=-1), ObjectConfig(target_prim=TARGET_PATH), rep_params)
+    replicator_defect.rep_run()
+    writer = replicator_defect._defect_graph.writer
+    for i in range(rep_params.frames):
+        boxes = np.array([(1, i, 0, i + 2, 2, 0.0)], dtype=BOX_DTYPE)
+        writer.write({"rgb": np.zeros((4, 4, 4), dtype=np.uint8),
+                      "bounding_box_2d_tight": {"data": boxes, "info": {"idToLabels": {"1": {"class": "defect_mesh"}}}}})
+    writer.on_final_frame()
+    return writer
+
+@pytest.mark.parametrize("frames", [2, 3])
+def test_a_second_run_of_the_graph_gets_a_new_writer(stage, tmp_path, frames):
+    first = _run(_rep_params(tmp_path / "out", 2))
+    second = _run(_rep_params(tmp_path / "out", frames))
+    assert second is not first
+    assert second.frame_id == frames
+    jsonl = tmp_path / "out" / "annotations_0000.jsonl"
+    for frame_id in range(frames):
+        assert read_record(str(jsonl), frame_id)["boxes"][0]["bbox"] == [frame_id, 0, frame_id + 2, 2]
+    checkpoint = read_checkpoint(str(tmp_path / "out"))
+    assert (checkpoint.last_frame, checkpoint.end_frame, checkpoint.complete) == (frames - 1, frames, True)
+
+def test_rebuilds_for_the_same_target_replace_the_graph(stage, tmp_path):
+    # A new seed rebuilds the Defect layer and keeps the pool of the unchanged target
+    for seed in (1, 2, 3):
+        rep_params = dataclasses.replace(_rep_params(tmp_path / "out", 1), seed=seed)
+        replicator_defect.sync_defect_layer(DefectConfig(texture_resolution=-1), ObjectConfig(target_prim=TARGET_PATH), rep_params)
+    assert not stage.inactive
+    assert [p for p in stage.children["/Replicator"] if p.startswith("/Replicator/Light")] == ["/Replicator/Light_0"]
+    assert len(defect_pool.get_pool(TARGET_PATH).entries) == 1
+
+@pytest.mark.parametrize("name", [replicator_defect.BUILD_TIMINGS_FILE, MANIFEST_FILE])
+def test_run_records_are_written_when_a_run_starts(stage, tmp_path, name):
+    rep_params = _rep_params(tmp_path / "out", 1)
+    replicator_defect.create_defect_layer(DefectConfig(texture_resolution=-1), ObjectConfig(target_prim=TARGET_PATH), rep_params)
+    assert not (tmp_path / "out" / name).exists()
+    _run(rep_params)
+    assert (tmp_path / "out" / name).exists()
+
+def test_unwritable_build_timings_are_only_logged(stage, tmp_path):
+    replicator_defect.create_defect_layer(DefectConfig(texture_resolution=-1), ObjectConfig(target_prim=TARGET_PATH),
+                                          _rep_params(tmp_path / "out", 1))
+    graph = replicator_defect._defect_graph
+    # A file where the output directory should be
+    (tmp_path / "file").write_text("")
+    graph.rep_params.output_dir = str(tmp_path / "file")
+    replicator_defect.write_build_timings(graph)
+
+def test_a_checkpoint_past_the_end_of_the_run_is_complete(stage, tmp_path):
+    defect, obj = DefectConfig(texture_resolution=-1), ObjectConfig(target_prim=TARGET_PATH)
+    rep_params = dataclasses.replace(_rep_params(tmp_path / "out", 4), resume=True)
+    # Every frame was written, the writer did not get to mark the run complete
+    Checkpoint(str(tmp_path / "out"), None, config_hash(defect, obj, rep_params), 0, 4, last_frame=3).write()
+    replicator_defect.sync_defect_layer(defect, obj, rep_params)
+    assert replicator_defect._defect_graph is None
+    assert "trigger.on_frame" not in recording_stub.recorder.nodes
+    assert read_checkpoint(str(tmp_path / "out")).complete
+
+def test_planned_runs_resume_with_the_same_frame_count(stage, tmp_path):
+    defect, obj = DefectConfig(texture_resolution=-1, placement="planned"), ObjectConfig(target_prim=TARGET_PATH)
+    rep_params = dataclasses.replace(_rep_params(tmp_path / "out", 8), resume=True, seed=3)
+    params = replicator_defect.checkpoint_params(defect, obj, rep_params, 8)
+    Checkpoint(str(tmp_path / "out"), last_frame=3, **params).write()
+    assert replicator_defect.get_resume_frame(defect, obj, rep_params) == 4
+    assert replicator_defect.get_resume_frame(defect, obj, dataclasses.replace(rep_params, frames=10)) is None
+    # Scattered frames do not depend on the frame count
+    scatter = DefectConfig(texture_resolution=-1)
+    Checkpoint(str(tmp_path / "out"), last_frame=3, **replicator_defect.checkpoint_params(scatter, obj, rep_params, 8)).write()
+    assert replicator_defect.get_resume_frame(scatter, obj, dataclasses.replace(rep_params, frames=10)) == 4
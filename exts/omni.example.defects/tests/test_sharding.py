@@ -0,0 +1,109 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import sys
+import pytest
+from omni.example.defects.sharding import SHARDS_MANIFEST, ShardRunner, merge_shards, plan_shards
+
+# Writes the frames of a shard job like BasicWriter, numbered from 0, each holding "<seed>:<local index>"
+WORKER = """
+import json, os, sys
+with open(sys.argv[1]) as f:
+    replicator = json.load(f)["replicator"]
+os.makedirs(replicator["output_dir"], exist_ok=True)
+for i in range(replicator["frames"]):
+    for name in (f"rgb_{i:04d}.png", f"bounding_box_2d_tight_{i:04d}.npy"):
+        with open(os.path.join(replicator["output_dir"], name), "w") as f:
+            f.write(f"{replicator['seed']}:{i}")
+with open(os.path.join(replicator["output_dir"], "metadata.txt"), "w") as f:
+    f.write(str(replicator["seed"]))
+print("done", replicator["frames"])
+"""
+
+def _write_jobs(shards, jobs_dir):
+    os.makedirs(jobs_dir, exist_ok=True)
+    job_files = []
+    for shard in shards:
+        job_file = os.path.join(jobs_dir, f"{shard.name}.json")
+        with open(job_file, "w") as f:
+            json.dump({"replicator": {"frames": shard.frames, "output_dir": shard.output_dir, "seed": shard.seed,
+                                      "frame_offset": shard.frame_offset}}, f)
+        job_files.append(job_file)
+    return job_files
+
+@pytest.mark.parametrize("total, num_shards", [(1, 1), (10, 3), (100, 7), (5, 8), (1000, 16)])
+def test_plan_covers_every_frame_once(total, num_shards):
+    shards = plan_shards(total, num_shards, "out", base_seed=3)
+    assert len(shards) == min(total, num_shards)
+    frames = [frame for shard in shards for frame in range(shard.frame_offset, shard.frame_offset + shard.frames)]
+    assert frames == list(range(total))
+    assert max(s.frames for s in shards) - min(s.frames for s in shards) <= 1
+    assert len({s.seed for s in shards}) == len(shards)
+    assert len({s.output_dir for s in shards}) == len(shards)
+
+def test_seeds_depend_on_the_base_seed_only():
+    assert [s.seed for s in plan_shards(40, 4, "a", base_seed=1)] == [s.seed for s in plan_shards(40, 4, "b", base_seed=1)]
+    assert {s.seed for s in plan_shards(40, 4, "a", base_seed=1)}.isdisjoint(s.seed for s in plan_shards(40, 4, "a", base_seed=2))
+
+def test_plan_rejects_empty_runs():
+    with pytest.raises(ValueError):
+        plan_shards(0, 2, "out")
+
+def test_run_and_merge(tmp_path):
+    output_dir = str(tmp_path / "out")
+    shards = plan_shards(10, 3, output_dir, base_seed=5)
+    jobs_dir = str(tmp_path / "jobs")
+    runner = ShardRunner(shards, _write_jobs(shards, jobs_dir), [sys.executable, "-c", WORKER, "{job_file}"], max_workers=2)
+    assert runner.run(poll_interval=0.01) == []
+    assert runner.return_codes == {0: 0, 1: 0, 2: 0}
+    for shard in shards:
+        with open(os.path.join(jobs_dir, f"{shard.name}.log")) as f:
+            assert f.read().strip() == f"done {shard.frames}"
+
+    moved = merge_shards(shards, output_dir)
+    assert moved == 2 * 10 + 3
+    names = sorted(os.listdir(output_dir))
+    assert [n for n in names if n.startswith("rgb_")] == [f"rgb_{i:04d}.png" for i in range(10)]
+    assert [n for n in names if n.startswith("bounding_box")] == [f"bounding_box_2d_tight_{i:04d}.npy" for i in range(10)]
+    # Frame i is the (i - offset)-th frame of the shard it falls in
+    for shard in shards:
+        for i in range(shard.frames):
+            with open(os.path.join(output_dir, f"rgb_{shard.frame_offset + i:04d}.png")) as f:
+                assert f.read() == f"{shard.seed}:{i}"
+    # Other files keep their name, later shards are prefixed instead of overwriting it
+    assert "metadata.txt" in names and "shard_001_metadata.txt" in names and "shard_002_metadata.txt" in names
+    with open(os.path.join(output_dir, SHARDS_MANIFEST)) as f:
+        manifest = json.load(f)
+    assert manifest["padding"] == 4
+    assert [s["frame_offset"] for s in manifest["shards"]] == [s.frame_offset for s in shards]
+
+def test_merge_keeps_numbers_of_offset_writers(tmp_path):
+    output_dir = str(tmp_path / "out")
+    shards = plan_shards(4, 2, output_dir)
+    for shard in shards:
+        os.makedirs(shard.output_dir)
+        for i in range(shard.frame_offset, shard.frame_offset + shard.frames):
+            open(os.path.join(shard.output_dir, f"rgb_{i:04d}.png"), "w").close()
+    merge_shards(shards, output_dir, renumber=False)
+    assert sorted(n for n in os.listdir(output_dir) if n.startswith("rgb_")) == [f"rgb_{i:04d}.png" for i in range(4)]
+
+def test_failed_shards_are_reported(tmp_path):
+    shards = plan_shards(6, 3, str(tmp_path / "out"))
+    script = "import sys; sys.exit(3 if sys.argv[1].endswith('shard_001.json') else 0)"
+    runner = ShardRunner(shards, _write_jobs(shards, str(tmp_path / "jobs")), [sys.executable, "-c", script, "{job_file}"])
+    assert runner.run(poll_interval=0.01) == [1]
+    assert runner.return_codes[1] == 3
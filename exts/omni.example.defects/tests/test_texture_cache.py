@@ -0,0 +1,53 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import numpy as np
+from PIL import Image
+from omni.example.defects.texture_cache import TextureCache
+from omni.example.defects.texture_catalog import scan_directory
+
+def _write_png(path, value: int, size: int = 64):
+    Image.fromarray(np.full((size, size, 3), value, dtype=np.uint8)).save(path)
+
+def _catalog(directory):
+    for suffix in ("D", "N", "R"):
+        _write_png(directory / f"scratch_{suffix}.png", 128)
+    return scan_directory(str(directory), os.stat(directory).st_mtime_ns)
+
+def test_prepared_textures_are_reused(tmp_path):
+    (tmp_path / "textures").mkdir()
+    catalog = _catalog(tmp_path / "textures")
+    cache = TextureCache(tmp_path / "cache")
+    prepared = cache.prepare(catalog, 32)
+    assert Image.open(prepared.texture_sets[0].diffuse).size == (32, 32)
+    assert cache.prepare(catalog, 32) is prepared
+
+def test_a_source_edited_in_place_is_prepared_again(tmp_path):
+    directory = tmp_path / "textures"
+    directory.mkdir()
+    catalog = _catalog(directory)
+    cache = TextureCache(tmp_path / "cache")
+    before = cache.prepare(catalog, 32).texture_sets[0].diffuse
+    mtime_ns = os.stat(directory).st_mtime_ns
+    diffuse = directory / "scratch_D.png"
+    _write_png(diffuse, 200)
+    # Same folder, only the file changed
+    stat = os.stat(diffuse)
+    os.utime(diffuse, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert os.stat(directory).st_mtime_ns == mtime_ns
+    after = cache.prepare(catalog, 32).texture_sets[0].diffuse
+    assert after != before
+    assert np.asarray(Image.open(after))[0, 0, 0] == 200
@@ -0,0 +1,72 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+from omni.example.defects import texture_catalog
+from omni.example.defects.texture_catalog import combined_hash, load_catalog, scan_directory, validate_folder
+
+def _make_folder(directory, sets: int = 3):
+    directory.mkdir()
+    for i in range(sets):
+        for suffix in ("D", "N", "R"):
+            (directory / f"defect_{i}_{suffix}.png").write_bytes(b"png")
+
+def _scan(directory):
+    return scan_directory(str(directory), os.stat(directory).st_mtime_ns)
+
+def test_content_hash_follows_files_edited_in_place(tmp_path):
+    for suffix in ("D", "N", "R"):
+        (tmp_path / f"scratch_{suffix}.png").write_bytes(b"png")
+    catalog = _scan(tmp_path)
+    before = catalog.content_hash
+    assert _scan(tmp_path).content_hash == before
+    (tmp_path / "scratch_N.png").write_bytes(b"other png")
+    assert catalog.content_hash != before
+    assert combined_hash([catalog]) == catalog.content_hash
+
+def test_a_cancelled_validation_stops_in_the_scan(tmp_path):
+    _make_folder(tmp_path / "textures")
+    cancel_event = threading.Event()
+    cancel_event.set()
+    assert validate_folder(str(tmp_path / "textures"), cancel_event=cancel_event, index_dir=tmp_path / "index") is None
+    assert (tmp_path / "textures").as_posix() not in texture_catalog._catalogs
+    assert not (tmp_path / "index").exists()
+
+def test_a_scan_does_not_block_other_folders(tmp_path, monkeypatch):
+    _make_folder(tmp_path / "slow")
+    _make_folder(tmp_path / "fast")
+    scanning, release = threading.Event(), threading.Event()
+    scan = texture_catalog.scan_directory
+    def slow_scan(directory, *args):
+        if directory.endswith("slow"):
+            scanning.set()
+            release.wait(10)
+        return scan(directory, *args)
+    monkeypatch.setattr(texture_catalog, "scan_directory", slow_scan)
+    worker = threading.Thread(target=load_catalog, args=(str(tmp_path / "slow"), tmp_path / "index"))
+    worker.start()
+    try:
+        assert scanning.wait(10)
+        # The folder validation of the worker must not hold up a graph build on another thread
+        loaded = []
+        build = threading.Thread(target=lambda: loaded.append(load_catalog(str(tmp_path / "fast"), index_dir=tmp_path / "index")))
+        build.start()
+        build.join(5)
+        assert loaded and len(loaded[0]) == 3
+    finally:
+        release.set()
+        worker.join()
+    assert len(texture_catalog._catalogs[(tmp_path / "slow").as_posix()]) == 3
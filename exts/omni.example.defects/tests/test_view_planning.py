@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import numpy as np
+import pytest
+from omni.example.defects.params import Range
+from omni.example.defects.placement import PlacementPlan
+from omni.example.defects.view_planning import hemisphere_directions, look_at, plan_views, projected_pixel_areas
+
+HFOV = math.radians(60.0)
+RESOLUTION = (640, 480)
+FOCAL = 0.5 * RESOLUTION[0] / math.tan(0.5 * HFOV)
+
+def _elevations(directions: np.ndarray, axis) -> np.ndarray:
+    axis = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    return np.degrees(np.arcsin(np.clip(directions @ axis, -1.0, 1.0)))
+
+@pytest.mark.parametrize("axis", [(0, 1, 0), (0, 0, 1), (1, 0, 0), (1, 2, -1)])
+@pytest.mark.parametrize("min_elevation, max_elevation", [(0.0, 90.0), (20.0, 60.0), (45.0, 45.0)])
+def test_hemisphere_directions_stay_in_the_band(axis, min_elevation, max_elevation):
+    directions = hemisphere_directions(5000, np.random.default_rng(1), axis, min_elevation, max_elevation)
+    assert directions.shape == (5000, 3)
+    assert np.allclose(np.linalg.norm(directions, axis=1), 1.0)
+    elevations = _elevations(directions, axis)
+    assert elevations.min() >= min_elevation - 1e-6
+    assert elevations.max() <= max_elevation + 1e-6
+
+def test_hemisphere_directions_are_uniform_over_the_area():
+    directions = hemisphere_directions(200000, np.random.default_rng(2), (0, 0, 1))
+    # Equal-area bands of the hemisphere get the same share of the directions
+    counts, _ = np.histogram(directions[:, 2], bins=4, range=(0.0, 1.0))
+    assert np.allclose(counts / len(directions), 0.25, atol=0.01)
+    azimuth_counts, _ = np.histogram(np.arctan2(directions[:, 1], directions[:, 0]), bins=8, range=(-math.pi, math.pi))
+    assert np.allclose(azimuth_counts / len(directions), 0.125, atol=0.01)
+
+def test_hemisphere_directions_are_seeded():
+    first = hemisphere_directions(10, np.random.default_rng(3), (0, 1, 0))
+    assert np.array_equal(first, hemisphere_directions(10, np.random.default_rng(3), (0, 1, 0)))
+
+def test_look_at_gives_orthonormal_bases():
+    eyes = np.array([[0.0, 0.0, 10.0], [5.0, 3.0, -2.0], [0.0, 10.0, 0.0]])
+    forward, right, up = look_at(eyes, (0.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+    assert np.allclose(forward, -eyes / np.linalg.norm(eyes, axis=1, keepdims=True))
+    for a, b in ((forward, right), (forward, up), (right, up)):
+        assert np.allclose(np.einsum("ij,ij->i", a, b), 0.0)
+    for v in (forward, right, up):
+        assert np.allclose(np.linalg.norm(v, axis=1), 1.0)
+    # The camera straight above the target still gets a basis
+    assert np.isfinite(right[2]).all()
+
+def _project(eye, point, normal, area=1.0):
+    eyes = np.array([eye], dtype=np.float64)
+    forward, right, up = look_at(eyes, (0.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+    return projected_pixel_areas(eyes, forward, right, up, np.array([point], dtype=np.float64),
+                                 np.array([normal], dtype=np.float64), np.array([area]), HFOV, RESOLUTION)[0]
+
+def test_projected_area_of_a_facing_patch():
+    # A patch at the image center facing the camera covers area * focal^2 / distance^2 pixels
+    assert _project((0, 0, 100), (0, 0, 0), (0, 0, 1), area=4.0) == pytest.approx(4.0 * FOCAL ** 2 / 100.0 ** 2)
+    assert _project((0, 0, 200), (0, 0, 0), (0, 0, 1)) == pytest.approx(_project((0, 0, 100), (0, 0, 0), (0, 0, 1)) / 4)
+
+def test_projected_area_follows_the_patch_angle():
+    tilted = (0.0, math.sin(math.radians(60.0)), math.cos(math.radians(60.0)))
+    assert _project((0, 0, 100), (0, 0, 0), tilted) == pytest.approx(0.5 * _project((0, 0, 100), (0, 0, 0), (0, 0, 1)))
+
+@pytest.mark.parametrize("point, normal", [
+    ((0, 0, 0), (0, 0, -1)),     # facing away
+    ((0, 0, 150), (0, 0, 1)),    # behind the camera
+    ((0, 0, 99.5), (0, 0, 1)),   # closer than the near clip
+    ((500, 0, 0), (0, 0, 1)),    # outside the image
+])
+def test_hidden_patches_cover_no_pixels(point, normal):
+    assert _project((0, 0, 100), point, normal) == 0.0
+
+def _plan(frames: int, count: int, scale: float = 0.5) -> PlacementPlan:
+    poses = frames * count
+    positions = np.zeros((poses, 3))
+    normals = np.tile([0.0, 1.0, 0.0], (poses, 1))
+    return PlacementPlan(frames, count, positions, normals, np.zeros((poses, 3)), np.full((poses, 3), scale), 0)
+
+def test_planned_views_stay_in_bounds():
+    views = plan_views(_plan(200, 2), (0, 0, 0), (0, 1, 0), Range(500.0, 800.0), HFOV, RESOLUTION,
+                       min_elevation=30.0, max_elevation=80.0, min_visible_pixels=1.0, seed=4)
+    assert len(views) == 200 and views.dropped == 0
+    assert np.array_equal(views.frames, np.arange(200))
+    distances = np.linalg.norm(views.positions, axis=1)
+    assert distances.min() >= 500.0 - 1e-6 and distances.max() <= 800.0 + 1e-6
+    elevations = _elevations(views.positions / distances[:, None], (0, 1, 0))
+    assert elevations.min() >= 30.0 - 1e-6 and elevations.max() <= 80.0 + 1e-6
+    assert (views.visible_pixels >= 1.0).all()
+    assert len(views.sequence()) == 200
+
+def test_frames_without_a_good_view_are_dropped():
+    plan = _plan(50, 1)
+    views = plan_views(plan, (0, 0, 0), (0, 1, 0), Range(1000.0, 1000.0), HFOV, RESOLUTION, min_visible_pixels=1e9, seed=5)
+    assert len(views) == 0 and views.dropped == 50
+    # Views above 60 degrees of elevation see the upward facing defect at more than sin(60) of its full area,
+    # one attempt keeps only those frames, the same ones for the same seed
+    threshold = 100.0 ** 2 * 0.25 * FOCAL ** 2 / 1000.0 ** 2 * math.sin(math.radians(60.0))
+    first = plan_views(plan, (0, 0, 0), (0, 1, 0), Range(1000.0, 1000.0), HFOV, RESOLUTION, min_visible_pixels=threshold, max_attempts=1, seed=6)
+    again = plan_views(plan, (0, 0, 0), (0, 1, 0), Range(1000.0, 1000.0), HFOV, RESOLUTION, min_visible_pixels=threshold, max_attempts=1, seed=6)
+    assert 0 < len(first) < 50 and len(first) + first.dropped == 50
+    assert np.array_equal(first.frames, again.frames)